@@ -8,9 +8,45 @@ Requires Python >= 2.6 (including Python 3.x).
 
 from _common import (MICROSECONDS_IN_SECOND, MICROSECONDS_IN_MINUTE,
                      MICROSECONDS_IN_HOUR, MICROSECONDS_IN_DAY,
-                     t_to_mus, mus_to_t, td_to_mus, mus_to_td)
-from _timeex import TimeEx
+                     t_to_mus, mus_to_t, td_to_mus, mus_to_td,
+                     dt_to_mus, mus_to_dt, _PY3K)
+from _dateex import DateEx
+from _datetimeex import DateTimeEx, mus_to_datetimes
+from _timeex import TimeEx, sub_times_mus
 from _timedeltaex import TimeDeltaEx
+from _calendardeltaex import (CalendarDeltaEx, add_calendar_delta_ordinals,
+                              add_calendar_delta_mus)
+from _business import BusinessCalendar
+from _clock import CoarseClock, FakeClock
+from _expiringdict import ExpiringDict
+from _fields import (ordinals_mus, date_fields_ordinals,
+                     ordinals_from_date_fields, weekdays_ordinals,
+                     isocalendar_ordinals, time_fields_mus)
+from _histogram import DurationHistogram
+from _instrument import (OperatorStats, enable_instrumentation,
+                         disable_instrumentation, instrumentation_enabled,
+                         reset_instrumentation, instrumentation_report,
+                         print_instrumentation_report)
+from _join import (asof_join, asof_indices_mus,
+                   window_join, window_indices_mus)
+from _ratelimit import TokenBucket, SlidingLogRateLimiter
+from _recurrence import IntervalRule, next_fire_times
+from _reorder import ReorderBuffer, reorder
+from _resample import resample, resample_mus
+from _sessions import (Session, sessionize, sessionize_by_key,
+                       session_starts_mus, sessions_mus)
+from _sketch import DurationSketch
+from _sorting import (mus_key, keys_mus, sort_by_mus, radix_argsort_mus,
+                      radix_sort_mus, searchsorted_mus, merge_sorted)
+from _stopwatch import (TimingStats, TimingRegistry, default_registry,
+                        Stopwatch, timed)
+from _timingwheel import TimerHandle, TimingWheel
+from _tzinfo import (FixedOffset, fixed_offset, intern_tzinfo, utcoffset_mus,
+                     TZInfoTable)
+
+if _PY3K:
+    from _aio import (sleep, sleep_until, Deadline, BatchedSleeper,
+                      throttle, drive_timing_wheel)
 
 
 
@@ -20,6 +56,16 @@ if __name__ == "__main__":
     # Test this module
     doctest.testmod()
     # Test all the imported modules
-    for modname in ("_common", "_datetimeex", "_timeex", "_timedeltaex"):
+    for modname in ("_common", "_dateex", "_datetimeex", "_timeex",
+                    "_timedeltaex", "_calendardeltaex", "_business",
+                    "_clock", "_expiringdict", "_fields", "_histogram",
+                    "_instrument", "_join", "_ratelimit", "_recurrence",
+                    "_reorder", "_resample", "_sessions", "_sketch",
+                    "_sorting", "_stopwatch", "_timingwheel", "_tzinfo"):
         mod = __import__(modname)
         doctest.testmod(mod)
+    # Test the Python 3.x-only modules
+    if _PY3K:
+        for modname in ("_aio",):
+            mod = __import__(modname)
+            doctest.testmod(mod)
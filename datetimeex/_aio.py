@@ -0,0 +1,311 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+The asyncio integration for the datetimeex classes.
+
+Requires Python 3.x with asyncio.
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+from _common import MICROSECONDS_IN_SECOND, td_to_mus, _monotonic_mus
+from _datetimeex import DateTimeEx
+from _ratelimit import TokenBucket, SlidingLogRateLimiter
+from _timedeltaex import TimeDeltaEx
+from _timingwheel import TimingWheel
+
+
+
+def _to_seconds(td):
+    """
+    Convert the datetime.timedelta to the float number of seconds,
+    as asyncio expects (avoiding the Fraction of TimeDeltaEx.in_seconds).
+
+    @type td: timedelta
+    @rtype: float
+    """
+    return td_to_mus(td) / MICROSECONDS_IN_SECOND
+
+
+async def sleep(delay, result=None):
+    """
+    Like asyncio.sleep(), but the delay is a datetime.timedelta
+    (or TimeDeltaEx).
+
+    >>> asyncio.run(sleep(TimeDeltaEx(milliseconds=1), "done"))
+    'done'
+
+    @type delay: timedelta
+    """
+    assert isinstance(delay, timedelta), repr(delay)
+
+    return await asyncio.sleep(_to_seconds(delay), result)
+
+
+async def sleep_until(when, result=None):
+    """
+    Sleep until the wall clock reaches the given datetime.datetime
+    (or DateTimeEx); the naive datetime is treated as the local time.
+    Returns immediately if the time is in the past.
+
+    >>> asyncio.run(sleep_until(DateTimeEx(2011, 3, 14), "done"))
+    'done'
+
+    @type when: datetime
+    """
+    assert isinstance(when, datetime), repr(when)
+
+    now = datetime.now() if when.utcoffset() is None else datetime.now(when.tzinfo)
+    return await asyncio.sleep(max(_to_seconds(when - now), 0), result)
+
+
+class Deadline(object):
+    """
+    The deadline for a chain of nested calls.
+
+    The deadline is created once (from the timeout), and then passed
+    down to the nested calls, each of which may take the remaining time
+    or create a child deadline with a tighter timeout of its own.
+    The expiration instant is stored as an integer on the monotonic
+    clock of the event loop, so checking the remaining time is cheap.
+
+    >>> deadline = Deadline(TimeDeltaEx(seconds=10))
+    >>> deadline.expired, TimeDeltaEx(seconds=9) < deadline.remaining <= TimeDeltaEx(seconds=10)
+    (False, True)
+    >>> child = deadline.child(TimeDeltaEx(seconds=1))
+    >>> child.remaining <= TimeDeltaEx(seconds=1)
+    True
+    >>> deadline.child(TimeDeltaEx(days=1)).remaining <= TimeDeltaEx(seconds=10)
+    True
+    >>> Deadline(TimeDeltaEx(0)).expired
+    True
+    >>> Deadline().remaining is None
+    True
+
+    >>> async def slow():
+    ...     await asyncio.sleep(1)
+    >>> try:
+    ...     asyncio.run(Deadline(TimeDeltaEx(milliseconds=1)).wait_for(slow()))
+    ... except asyncio.TimeoutError:
+    ...     print("Timed out")
+    Timed out
+    """
+    __slots__ = ("_expires",)
+
+
+    def __init__(self, timeout=None):
+        """
+        @param timeout: the time till the deadline,
+            or None for no deadline at all.
+        @type timeout: NoneType, timedelta
+        """
+        assert timeout is None or isinstance(timeout, timedelta), repr(timeout)
+
+        self._expires = None if timeout is None \
+                             else _monotonic_mus() + td_to_mus(timeout)
+
+
+    def __repr__(self):
+        return "<Deadline: {0!r} remaining>".format(self.remaining)
+
+
+    @property
+    def remaining(self):
+        """
+        The time remaining till the deadline (never negative),
+        or None if there is no deadline.
+
+        @rtype: NoneType, TimeDeltaEx
+        """
+        if self._expires is None:
+            return None
+        else:
+            return TimeDeltaEx.from_microseconds(
+                       max(self._expires - _monotonic_mus(), 0))
+
+
+    @property
+    def remaining_seconds(self):
+        """
+        The time remaining till the deadline, as the float number
+        of seconds (never negative), or None if there is no deadline;
+        suitable for the timeout arguments of asyncio.
+
+        @rtype: NoneType, float
+        """
+        if self._expires is None:
+            return None
+        else:
+            return max(self._expires - _monotonic_mus(), 0) / MICROSECONDS_IN_SECOND
+
+
+    @property
+    def expired(self):
+        """
+        Whether the deadline has been reached.
+
+        @rtype: bool
+        """
+        return self._expires is not None and self._expires <= _monotonic_mus()
+
+
+    def child(self, timeout=None):
+        """
+        Create the deadline for a nested call, which expires
+        after the timeout, but not later than this deadline.
+
+        @type timeout: NoneType, timedelta
+        @rtype: Deadline
+        """
+        deadline = Deadline(timeout)
+        if deadline._expires is None or \
+           (self._expires is not None and self._expires < deadline._expires):
+            deadline._expires = self._expires
+        return deadline
+
+
+    async def wait_for(self, aw):
+        """
+        Wait for the awaitable, but not longer than till the deadline;
+        like asyncio.wait_for(), raises asyncio.TimeoutError on the timeout.
+        """
+        return await asyncio.wait_for(aw, self.remaining_seconds)
+
+
+class BatchedSleeper(object):
+    """
+    The source of the sleeps, which coalesces the wakeups
+    falling into the same scheduler tick (of the given resolution),
+    so that a single event loop timer wakes all of them at once.
+
+    The wakeup instants are rounded up to the tick boundary,
+    so each sleep may last up to one tick longer than requested.
+    A single BatchedSleeper must be used from a single event loop.
+
+    >>> async def main():
+    ...     sleeper = BatchedSleeper(TimeDeltaEx(milliseconds=50))
+    ...     sleeps = [sleeper.sleep(TimeDeltaEx(microseconds=mus), mus)
+    ...                   for mus in range(1000, 3000)]
+    ...     # Usually 1 timer, but the sleeps may straddle a tick boundary
+    ...     pending = sleeper.pending_timers
+    ...     return await asyncio.gather(*sleeps) == list(range(1000, 3000)), pending <= 2
+    >>> asyncio.run(main())
+    (True, True)
+    """
+
+    def __init__(self, resolution=TimeDeltaEx(milliseconds=1)):
+        """
+        @type resolution: timedelta
+        """
+        assert isinstance(resolution, timedelta) and resolution > timedelta(0), \
+               repr(resolution)
+
+        self.resolution = TimeDeltaEx.from_timedelta(resolution)
+        self._resolution_mus = td_to_mus(resolution)
+        # The futures to wake, for every tick (on the event loop clock).
+        self._batches = {}
+
+
+    @property
+    def pending_timers(self):
+        """
+        The number of the event loop timers pending.
+
+        @rtype: int
+        """
+        return len(self._batches)
+
+
+    def sleep(self, delay, result=None):
+        """
+        Sleep for (at least) the delay; unlike asyncio.sleep(),
+        returns the future rather than the coroutine
+        (so it must be called with the event loop running).
+
+        @type delay: timedelta
+        @rtype: asyncio.Future
+        """
+        assert isinstance(delay, timedelta), repr(delay)
+
+        loop = asyncio.get_running_loop()
+        wake_mus = int(loop.time() * MICROSECONDS_IN_SECOND) + td_to_mus(delay)
+        tick = -(-wake_mus // self._resolution_mus)
+        try:
+            batch = self._batches[tick]
+        except KeyError:
+            batch = self._batches[tick] = []
+            loop.call_at(tick * self._resolution_mus / MICROSECONDS_IN_SECOND,
+                         self._wake, tick)
+        future = loop.create_future()
+        batch.append((future, result))
+        return future
+
+
+    def _wake(self, tick):
+        for future, result in self._batches.pop(tick):
+            if not future.done():
+                future.set_result(result)
+
+
+async def throttle(limiter, key, *args):
+    """
+    Wait until the rate limiter (TokenBucket or SlidingLogRateLimiter)
+    allows the event for the key, and register it.
+    The extra args (e.g. the number of tokens) are passed
+    to the acquire() and retry_after() methods of the limiter.
+
+    >>> async def main():
+    ...     limiter = TokenBucket(1, TimeDeltaEx(milliseconds=10))
+    ...     for i in range(3):
+    ...         await throttle(limiter, "alice")
+    ...     return limiter.acquire("alice")
+    >>> asyncio.run(main())
+    False
+
+    @type limiter: TokenBucket, SlidingLogRateLimiter
+    """
+    while not limiter.acquire(key, *args):
+        await asyncio.sleep(_to_seconds(limiter.retry_after(key, *args)))
+
+
+async def drive_timing_wheel(wheel):
+    """
+    Advance the TimingWheel in real time by the running event loop,
+    firing its timers from the loop; runs until cancelled.
+
+    If the loop is late, the wheel catches up by advancing
+    several ticks at once, so it never drifts from the loop clock.
+
+    >>> async def main():
+    ...     wheel = TimingWheel(tick=TimeDeltaEx(milliseconds=1))
+    ...     fired = asyncio.Event()
+    ...     wheel.schedule(TimeDeltaEx(milliseconds=5), fired.set)
+    ...     driver = asyncio.ensure_future(drive_timing_wheel(wheel))
+    ...     await asyncio.wait_for(fired.wait(), 1)
+    ...     driver.cancel()
+    ...     return wheel.ticks >= 5
+    >>> asyncio.run(main())
+    True
+
+    @type wheel: TimingWheel
+    """
+    assert isinstance(wheel, TimingWheel), repr(wheel)
+
+    loop = asyncio.get_running_loop()
+    tick_mus = wheel.tick.in_microseconds
+    tick_seconds = tick_mus / MICROSECONDS_IN_SECOND
+    start_ticks = wheel.ticks
+    start = loop.time()
+    while True:
+        await asyncio.sleep(tick_seconds)
+        elapsed_mus = int((loop.time() - start) * MICROSECONDS_IN_SECOND)
+        due = start_ticks + elapsed_mus // tick_mus - wheel.ticks
+        if due > 0:
+            wheel.advance(due)
+
+
+# Run unittests, if executed directly.
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
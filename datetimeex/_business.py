@@ -0,0 +1,194 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, time, timedelta
+
+from _common import (MICROSECONDS_IN_DAY,
+                     t_to_mus, td_to_mus, dt_to_mus, _MUS_TYPECODE)
+from _datetimeex import DateTimeEx
+from _timeex import TimeEx
+from _timedeltaex import TimeDeltaEx
+
+
+
+class BusinessCalendar(object):
+    """
+    The calendar of the working hours, for the arithmetic
+    on the business time (e.g. the SLA deadlines).
+
+    The working time is defined by the weekly working windows
+    and the list of holidays (when there is no working time at all),
+    for the days from first to last (inclusive).
+    The cumulative working time before every day is precomputed,
+    so adding the business time or measuring it between two instants
+    takes O(log n) for n days in the calendar.
+
+    The instants are interpreted by their wall clock readings;
+    the tzinfo of the instant is preserved in the result.
+
+    >>> workday = [(TimeEx(9), TimeEx(13)), (TimeEx(14), TimeEx(18))]
+    >>> calendar = BusinessCalendar(dict((weekday, workday) for weekday in range(5)),
+    ...                             date(2011, 3, 1), date(2011, 3, 31),
+    ...                             holidays=[date(2011, 3, 15)])
+
+    >>> # Monday, then the holiday on Tuesday
+    >>> calendar.add_business(DateTimeEx(2011, 3, 14, 16), TimeDeltaEx(hours=4))
+    DateTimeEx(2011, 3, 16, 11, 0)
+    >>> calendar.add_business(DateTimeEx(2011, 3, 16, 11), -TimeDeltaEx(hours=4))
+    DateTimeEx(2011, 3, 14, 16, 0)
+    >>> calendar.business_between(DateTimeEx(2011, 3, 14, 16),
+    ...                           DateTimeEx(2011, 3, 16, 11))
+    TimeDeltaEx(0, 14400)
+
+    >>> # Friday, then the weekend
+    >>> calendar.add_business(DateTimeEx(2011, 3, 18, 14), TimeDeltaEx(hours=8))
+    DateTimeEx(2011, 3, 21, 13, 0)
+    >>> calendar.add_business(DateTimeEx(2011, 3, 18, 17, 30), TimeDeltaEx(hours=1))
+    DateTimeEx(2011, 3, 21, 9, 30)
+    """
+
+    def __init__(self, windows, first, last, holidays=()):
+        """
+        @param windows: the working windows for every weekday,
+            as a mapping from the weekday number (0 for Monday,
+            like in date.weekday()) to the sequence of (start, end) pairs
+            of datetime.time; the end time of 00:00 stands for the midnight
+            at the end of the day.
+            The windows of a day must not overlap.
+        @type windows: collections.Mapping
+        @param first: the first day of the calendar.
+        @type first: date
+        @param last: the last day of the calendar (inclusive).
+        @type last: date
+        @type holidays: collections.Iterable
+        """
+        assert isinstance(first, date) and isinstance(last, date) and \
+               first <= last, \
+               (first, last)
+
+        # The (start, end) windows in microseconds, for every weekday.
+        self._windows = [[] for weekday in range(7)]
+        for weekday, day_windows in windows.items():
+            assert 0 <= weekday < 7, repr(weekday)
+            for start, end in sorted(day_windows):
+                assert isinstance(start, time) and isinstance(end, time), \
+                       (start, end)
+                start_mus = t_to_mus(start)
+                end_mus = t_to_mus(end) or MICROSECONDS_IN_DAY
+                assert start_mus < end_mus, (start, end)
+                assert not self._windows[weekday] or \
+                       self._windows[weekday][-1][1] <= start_mus, \
+                       repr(day_windows)
+                self._windows[weekday].append((start_mus, end_mus))
+        self._holidays = frozenset(d.toordinal() for d in holidays)
+
+        self.first = first
+        self.last = last
+        self._first_ordinal = first.toordinal()
+        weekday_totals = [sum(end - start for start, end in day_windows)
+                              for day_windows in self._windows]
+
+        # The working time before every day, and before the day after last.
+        self._prefix = array(_MUS_TYPECODE, [0])
+        total = 0
+        for ordinal in range(self._first_ordinal, last.toordinal() + 1):
+            if ordinal not in self._holidays:
+                # date.fromordinal(1) is a Monday.
+                total += weekday_totals[(ordinal - 1) % 7]
+            self._prefix.append(total)
+
+
+    def add_business(self, instant, td):
+        """
+        Add the business time to the instant.
+
+        For the positive durations, the result is the earliest instant
+        when the business time is reached (so it may be the end
+        of the working window); for the negative durations,
+        the result is the latest one (so it may be the start
+        of the working window).
+
+        @type instant: datetime
+        @type td: timedelta
+        @rtype: DateTimeEx
+        """
+        assert isinstance(instant, datetime), repr(instant)
+        assert isinstance(td, timedelta), repr(td)
+
+        td_mus = td_to_mus(td)
+        if not td_mus:
+            return DateTimeEx.from_datetime(instant)
+
+        target = self._business_before(dt_to_mus(instant)) + td_mus
+        prefix = self._prefix
+        if td_mus > 0:
+            # The earliest day when the target is reached.
+            i = bisect_left(prefix, target) - 1
+        else:
+            # The latest day when the target is not exceeded.
+            i = bisect_right(prefix, target) - 1
+        if not 0 <= i < len(prefix) - 1:
+            raise ValueError("{0!r} + {1!r} is out of the calendar range"
+                                 .format(instant, td))
+
+        ordinal = self._first_ordinal + i
+        remaining = target - prefix[i]
+        for start, end in self._windows[(ordinal - 1) % 7]:
+            if remaining < end - start or \
+               (td_mus > 0 and remaining == end - start):
+                break
+            remaining -= end - start
+        return DateTimeEx.from_microseconds((ordinal - 1) * MICROSECONDS_IN_DAY +
+                                            start + remaining,
+                                            tzinfo=instant.tzinfo)
+
+
+    def business_between(self, start, end):
+        """
+        Find how much business time is between the two instants
+        (negative, if the end is before the start).
+
+        @type start: datetime
+        @type end: datetime
+        @rtype: TimeDeltaEx
+        """
+        assert isinstance(start, datetime), repr(start)
+        assert isinstance(end, datetime), repr(end)
+
+        return TimeDeltaEx.from_microseconds(
+                   self._business_before(dt_to_mus(end)) -
+                   self._business_before(dt_to_mus(start)))
+
+
+    def _business_before(self, microseconds):
+        """
+        The business time (in microseconds) from the beginning
+        of the calendar till the instant (in microseconds elapsed
+        Anno Domini).
+
+        @type microseconds: numbers.Integral
+        @rtype: numbers.Integral
+        """
+        days, day_mus = divmod(microseconds, MICROSECONDS_IN_DAY)
+        ordinal = days + 1
+        i = ordinal - self._first_ordinal
+        if not 0 <= i < len(self._prefix) - 1:
+            raise ValueError("{0!r} is out of the calendar range"
+                                 .format(DateTimeEx.from_microseconds(microseconds)))
+
+        business = self._prefix[i]
+        if ordinal not in self._holidays:
+            for start, end in self._windows[(ordinal - 1) % 7]:
+                if day_mus <= start:
+                    break
+                business += min(day_mus, end) - start
+        return business
+
+
+# Run unittests, if executed directly.
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,484 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+import numbers
+from array import array
+from bisect import bisect_right
+from datetime import date, datetime, timedelta
+
+from _common import (MICROSECONDS_IN_DAY, td_to_mus, dt_to_mus,
+                     _MUS_TYPECODE, _TypeDispatch, _unsupported, DummyTZInfo)
+from _dateex import DateEx
+from _datetimeex import DateTimeEx
+from _timedeltaex import TimeDeltaEx
+
+
+
+# The number of days before every month (and after the last one),
+# in the common and in the leap year.
+_DAYS_BEFORE_MONTH = ((0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334, 365),
+                      (0, 31, 60, 91, 121, 152, 182, 213, 244, 274, 305, 335, 366))
+
+_MIN_MONTH_INDEX = 1 * 12
+_MAX_MONTH_INDEX = 9999 * 12 + 11
+
+
+def _month(index):
+    """
+    The year, the month and the number of days in the month,
+    given its index (year * 12 + month - 1).
+
+    >>> _month(2012 * 12 + 1)
+    (2012, 2, 29)
+
+    @type index: numbers.Integral
+    @rtype: tuple
+    """
+    if not _MIN_MONTH_INDEX <= index <= _MAX_MONTH_INDEX:
+        raise OverflowError("date value out of range")
+    year, month0 = divmod(index, 12)
+    before = _DAYS_BEFORE_MONTH[year % 4 == 0 and
+                                (year % 100 != 0 or year % 400 == 0)]
+    return (year, month0 + 1, before[month0 + 1] - before[month0])
+
+
+def _month_bounds(index):
+    """
+    The ordinals of the first and the last days of the month,
+    given its index (year * 12 + month - 1).
+
+    >>> _month_bounds(2011 * 12 + 1), _month_bounds(2012 * 12 + 1)
+    ((734169, 734196), (734534, 734562))
+    >>> date.fromordinal(734562)
+    datetime.date(2012, 2, 29)
+
+    @type index: numbers.Integral
+    @rtype: tuple
+    """
+    if not _MIN_MONTH_INDEX <= index <= _MAX_MONTH_INDEX:
+        raise OverflowError("date value out of range")
+    year, month0 = divmod(index, 12)
+    before = _DAYS_BEFORE_MONTH[year % 4 == 0 and
+                                (year % 100 != 0 or year % 400 == 0)]
+    y = year - 1
+    first = y * 365 + y // 4 - y // 100 + y // 400 + before[month0] + 1
+    return (first, first + before[month0 + 1] - before[month0] - 1)
+
+
+class CalendarDeltaEx(object):
+    """
+    The calendar-aware time interval: the number of years and months,
+    plus the fixed-length TimeDeltaEx part (like "1 month and 2 days").
+
+    Being added to a date or a datetime, the years and months are
+    added first, clipping the day to the end of the month if needed
+    (so 2011-01-31 + 1 month is 2011-02-28), and then the TimeDeltaEx
+    part is added, by the wall clock.
+    Only the whole days of the TimeDeltaEx part are added
+    to the datetime.date, as date + timedelta does.
+
+    The months are shifted on the integer month index (year * 12 + month),
+    the month lengths being taken from the precomputed tables
+    of the cumulative month lengths; see also add_calendar_delta_ordinals()
+    and add_calendar_delta_mus() for the bulk versions, working
+    on the integer ordinals.
+
+    >>> date(2011, 1, 31) + CalendarDeltaEx(months=1)
+    DateEx(2011, 2, 28)
+    >>> DateTimeEx(2011, 3, 14, 22, 30) + CalendarDeltaEx(1, 1, TimeDeltaEx(hours=3))
+    DateTimeEx(2012, 4, 15, 1, 30)
+    >>> datetime(2012, 2, 29, 12, 0) - CalendarDeltaEx(years=1)
+    DateTimeEx(2011, 2, 28, 12, 0)
+    >>> CalendarDeltaEx(months=14) * 2 + timedelta(days=1)
+    CalendarDeltaEx(2, 4, TimeDeltaEx(1))
+    >>> -CalendarDeltaEx(months=14)
+    CalendarDeltaEx(-1, -2)
+    """
+    __slots__ = ("_months", "_delta")
+
+
+    def __init__(self, years=0, months=0, delta=timedelta(0)):
+        """
+        @type years: numbers.Integral
+        @type months: numbers.Integral
+        @param delta: the fixed-length part.
+        @type delta: timedelta
+        """
+        assert isinstance(years, numbers.Integral), repr(years)
+        assert isinstance(months, numbers.Integral), repr(months)
+        assert isinstance(delta, timedelta), repr(delta)
+
+        self._months = years * 12 + months
+        self._delta = delta if isinstance(delta, TimeDeltaEx) \
+                            else TimeDeltaEx.from_timedelta(delta)
+
+
+    def __repr__(self):
+        """
+        >>> CalendarDeltaEx(months=3)
+        CalendarDeltaEx(0, 3)
+        >>> CalendarDeltaEx(months=-3, delta=TimeDeltaEx(seconds=5))
+        CalendarDeltaEx(0, -3, TimeDeltaEx(0, 5))
+        """
+        if not self._delta:
+            return "CalendarDeltaEx({0:d}, {1:d})"\
+                       .format(self.years, self.months)
+        else:
+            return "CalendarDeltaEx({0:d}, {1:d}, {2!r})"\
+                       .format(self.years, self.months, self._delta)
+
+
+    @property
+    def years(self):
+        """
+        The number of whole years; it has the same sign
+        as the total number of months.
+
+        @rtype: numbers.Integral
+        """
+        return -(-self._months // 12) if self._months < 0 \
+                                      else self._months // 12
+
+
+    @property
+    def months(self):
+        """
+        The number of months besides the whole years (from -11 to 11).
+
+        >>> CalendarDeltaEx(1, -14).years, CalendarDeltaEx(1, -14).months
+        (0, -2)
+
+        @rtype: numbers.Integral
+        """
+        return self._months - self.years * 12
+
+
+    @property
+    def total_months(self):
+        """
+        The total number of months (the years included).
+
+        @rtype: numbers.Integral
+        """
+        return self._months
+
+
+    @property
+    def delta(self):
+        """
+        The fixed-length part.
+
+        @rtype: TimeDeltaEx
+        """
+        return self._delta
+
+
+    def __eq__(self, other):
+        """
+        >>> CalendarDeltaEx(1) == CalendarDeltaEx(months=12)
+        True
+        >>> CalendarDeltaEx(delta=TimeDeltaEx(1)) == TimeDeltaEx(1)
+        False
+        """
+        if isinstance(other, CalendarDeltaEx):
+            return self._months == other._months and \
+                   self._delta == other._delta
+        else:
+            return NotImplemented
+
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+
+    def __hash__(self):
+        return hash((self._months, self._delta))
+
+
+    def __bool__(self):
+        return bool(self._months or self._delta)
+
+    __nonzero__ = __bool__
+
+
+    def __neg__(self):
+        return CalendarDeltaEx(months=-self._months, delta=-self._delta)
+
+
+    def __pos__(self):
+        return self
+
+
+    def __mul__(self, n):
+        """
+        Multiply the CalendarDeltaEx by an integer.
+
+        >>> CalendarDeltaEx(0, 5, TimeDeltaEx(1)) * 3
+        CalendarDeltaEx(1, 3, TimeDeltaEx(3))
+
+        @type n: numbers.Integral
+        @rtype: CalendarDeltaEx
+        """
+        if isinstance(n, numbers.Integral):
+            return CalendarDeltaEx(months=self._months * n,
+                                   delta=self._delta * n)
+        else:
+            raise NotImplementedError("{0!r} * {1!r}".format(self, n))
+
+    __rmul__ = __mul__
+
+
+    def __add__(self, summand):
+        """
+        Add this CalendarDeltaEx to the datetime.date, datetime.datetime,
+        datetime.timedelta or another CalendarDeltaEx.
+
+        Whenever another summand is the datetime.date,
+        the result is automatically enhanced from datetime.date to DateEx.
+
+        Whenever another summand is the datetime.datetime,
+        the result is automatically enhanced from datetime.datetime to DateTimeEx.
+
+        >>> CalendarDeltaEx(months=1) + DateTimeEx(2011, 3, 31, tzinfo=DummyTZInfo())
+        DateTimeEx(2011, 4, 30, 0, 0, tzinfo=<DummyTZInfo>)
+        >>> CalendarDeltaEx(months=1, delta=TimeDeltaEx(hours=25)) + date(2011, 3, 31)
+        DateEx(2011, 5, 1)
+        >>> CalendarDeltaEx(years=1) + CalendarDeltaEx(months=-1)
+        CalendarDeltaEx(0, 11)
+        >>> TimeDeltaEx(days=1) + CalendarDeltaEx(months=1)
+        CalendarDeltaEx(0, 1, TimeDeltaEx(1))
+        >>> CalendarDeltaEx(years=1) + 1
+        Traceback (most recent call last):
+          ...
+        TypeError: unsupported operand type(s) for +: 'CalendarDeltaEx' and 'int'
+
+        @type summand: date, datetime, timedelta, CalendarDeltaEx
+        @rtype: date, datetime, CalendarDeltaEx
+        """
+        return _ADD[type(summand)](self, summand)
+
+    __radd__ = __add__
+
+
+    def __sub__(self, subtrahend):
+        """
+        Subtract a datetime.timedelta or another CalendarDeltaEx
+        from this CalendarDeltaEx.
+
+        >>> CalendarDeltaEx(years=1) - timedelta(hours=1)
+        CalendarDeltaEx(1, 0, TimeDeltaEx(-1, 82800))
+
+        @type subtrahend: timedelta, CalendarDeltaEx
+        @rtype: CalendarDeltaEx
+        """
+        return _SUB[type(subtrahend)](self, subtrahend)
+
+
+    def __rsub__(self, minuend):
+        """
+        This CalendarDeltaEx is subtracted from the datetime.date,
+        datetime.datetime or datetime.timedelta;
+        the same as adding the negated one.
+
+        >>> date(2011, 3, 31) - CalendarDeltaEx(months=1)
+        DateEx(2011, 2, 28)
+        >>> timedelta(days=1) - CalendarDeltaEx(months=1)
+        CalendarDeltaEx(0, -1, TimeDeltaEx(1))
+        >>> TimeDeltaEx(days=1) - CalendarDeltaEx(months=1)
+        CalendarDeltaEx(0, -1, TimeDeltaEx(1))
+
+        @type minuend: date, datetime, timedelta
+        @rtype: date, datetime, CalendarDeltaEx
+        """
+        return _RSUB[type(minuend)](self, minuend)
+
+
+# The handlers of the CalendarDeltaEx operators, per the operand type.
+# Every handler gets the CalendarDeltaEx first, and the operand second.
+
+def _add_datetime(cd, dt):
+    # The fields are shifted directly, so that a single object is created
+    # (unless the fixed-length part is added by the C code then).
+    if cd._months:
+        year, month, days = _month(dt.year * 12 + dt.month - 1 + cd._months)
+        day = min(dt.day, days)
+    else:
+        year, month, day = dt.year, dt.month, dt.day
+    if cd._delta:
+        return DateTimeEx.from_datetime(
+                   datetime(year, month, day,
+                            dt.hour, dt.minute, dt.second, dt.microsecond,
+                            dt.tzinfo) + cd._delta)
+    else:
+        return DateTimeEx(year, month, day,
+                          dt.hour, dt.minute, dt.second, dt.microsecond,
+                          dt.tzinfo)
+
+
+def _add_date(cd, d):
+    if cd._months:
+        year, month, days = _month(d.year * 12 + d.month - 1 + cd._months)
+        d = DateEx(year, month, min(d.day, days))
+    if cd._delta.days:
+        return DateEx.fromordinal(d.toordinal() + cd._delta.days)
+    else:
+        return d if type(d) is DateEx else DateEx.from_date(d)
+
+
+def _add_timedelta(cd, td):
+    return CalendarDeltaEx(months=cd._months, delta=cd._delta + td)
+
+
+def _add_calendardelta(cd, other):
+    return CalendarDeltaEx(months=cd._months + other._months,
+                           delta=cd._delta + other._delta)
+
+
+def _sub_timedelta(cd, td):
+    return CalendarDeltaEx(months=cd._months, delta=cd._delta - td)
+
+
+def _sub_calendardelta(cd, other):
+    return CalendarDeltaEx(months=cd._months - other._months,
+                           delta=cd._delta - other._delta)
+
+
+def _rsub_datetime(cd, dt):
+    return _add_datetime(-cd, dt)
+
+
+def _rsub_date(cd, d):
+    return _add_date(-cd, d)
+
+
+def _rsub_timedelta(cd, td):
+    return _add_timedelta(-cd, td)
+
+
+# datetime.datetime is a subclass of datetime.date, so it goes first.
+_ADD = _TypeDispatch([(datetime, _add_datetime),
+                      (date, _add_date),
+                      (timedelta, _add_timedelta),
+                      (CalendarDeltaEx, _add_calendardelta)],
+                     _unsupported)
+_SUB = _TypeDispatch([(timedelta, _sub_timedelta),
+                      (CalendarDeltaEx, _sub_calendardelta)],
+                     _unsupported)
+_RSUB = _TypeDispatch([(datetime, _rsub_datetime),
+                       (date, _rsub_date),
+                       (timedelta, _rsub_timedelta)],
+                      _unsupported)
+
+
+def _month_shift_table(first_ordinal, last_ordinal, months):
+    """
+    The tables for shifting the ordinals from first_ordinal
+    to last_ordinal by the number of months: for every month
+    of the span, the ordinal of its first day, the difference
+    between it and the first day of the shifted month,
+    and the ordinal of the last day of the shifted month.
+
+    >>> _month_shift_table(734168, 734169, 1)
+    ([734138, 734169], [31, 28], [734196, 734227])
+    """
+    first = date.fromordinal(first_ordinal)
+    last = date.fromordinal(last_ordinal)
+    starts = []
+    shifts = []
+    ends = []
+    for index in range(first.year * 12 + first.month - 1,
+                       last.year * 12 + last.month):
+        start = _month_bounds(index)[0]
+        shifted_start, shifted_end = _month_bounds(index + months)
+        starts.append(start)
+        shifts.append(shifted_start - start)
+        ends.append(shifted_end)
+    return starts, shifts, ends
+
+
+def add_calendar_delta_ordinals(ordinals, delta):
+    """
+    Add the CalendarDeltaEx to the dates in bulk, given as the integer
+    ordinals (see date.toordinal()), getting the array of the ordinals;
+    the same as adding it to every date, but without creating
+    any intermediate objects.
+
+    The month shift is looked up once per every month
+    the dates span; every date is then shifted with a binary search
+    and a couple of integer operations.
+
+    >>> ordinals = [date(2011, 1, 31).toordinal(), date(2012, 1, 15).toordinal()]
+    >>> [date.fromordinal(o)
+    ...      for o in add_calendar_delta_ordinals(ordinals,
+    ...                                           CalendarDeltaEx(months=1))]
+    [datetime.date(2011, 2, 28), datetime.date(2012, 2, 15)]
+
+    @type ordinals: collections.Sequence
+    @type delta: CalendarDeltaEx
+    @rtype: array
+    """
+    assert isinstance(delta, CalendarDeltaEx), repr(delta)
+
+    days = delta.delta.days
+    if not delta.total_months or not len(ordinals):
+        return array(_MUS_TYPECODE, [o + days for o in ordinals])
+
+    starts, shifts, ends = _month_shift_table(min(ordinals), max(ordinals),
+                                              delta.total_months)
+    result = array(_MUS_TYPECODE)
+    append = result.append
+    for o in ordinals:
+        i = bisect_right(starts, o) - 1
+        shifted = o + shifts[i]
+        append((shifted if shifted < ends[i] else ends[i]) + days)
+    return result
+
+
+def add_calendar_delta_mus(keys, delta):
+    """
+    Add the CalendarDeltaEx to the datetime objects in bulk,
+    given as the integer microseconds Anno Domini (see dt_to_mus()),
+    getting the array of the microseconds;
+    see add_calendar_delta_ordinals().
+
+    >>> keys = [dt_to_mus(DateTimeEx(2011, 1, 31, 12, 0))]
+    >>> [DateTimeEx.from_microseconds(mus)
+    ...      for mus in add_calendar_delta_mus(keys,
+    ...                                        CalendarDeltaEx(0, 1, TimeDeltaEx(hours=13)))]
+    [DateTimeEx(2011, 3, 1, 1, 0)]
+
+    @type keys: collections.Sequence
+    @type delta: CalendarDeltaEx
+    @rtype: array
+    """
+    assert isinstance(delta, CalendarDeltaEx), repr(delta)
+
+    delta_mus = td_to_mus(delta.delta)
+    if not delta.total_months or not len(keys):
+        return array(_MUS_TYPECODE, [mus + delta_mus for mus in keys])
+
+    # The microseconds Anno Domini of 0001-01-01 are 0,
+    # while its ordinal is 1.
+    starts, shifts, ends = _month_shift_table(
+                               min(keys) // MICROSECONDS_IN_DAY + 1,
+                               max(keys) // MICROSECONDS_IN_DAY + 1,
+                               delta.total_months)
+    result = array(_MUS_TYPECODE)
+    append = result.append
+    for mus in keys:
+        day, time_mus = divmod(mus, MICROSECONDS_IN_DAY)
+        o = day + 1
+        i = bisect_right(starts, o) - 1
+        shifted = o + shifts[i]
+        append(((shifted if shifted < ends[i] else ends[i]) - 1) *
+                   MICROSECONDS_IN_DAY +
+               time_mus + delta_mus)
+    return result
+
+
+# Run unittests, if executed directly.
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,238 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+import threading
+from datetime import datetime, timedelta, tzinfo as tzinfo_class
+
+from _common import (MICROSECONDS_IN_SECOND, MICROSECONDS_IN_DAY,
+                     td_to_mus, dt_to_mus, _monotonic_mus)
+from _datetimeex import DateTimeEx
+from _timeex import TimeEx
+from _timedeltaex import TimeDeltaEx
+
+
+
+class CoarseClock(object):
+    """
+    The clock which caches "now", refreshing it not more often
+    than once per resolution; for the hot paths which need
+    the current time many times per request, but not precisely.
+
+    By default, the cache is refreshed lazily: every reading
+    checks the monotonic clock, and only if the resolution has passed,
+    the wall clock is read and the new DateTimeEx is created.
+    With background=True, a daemon thread refreshes the cache instead
+    (until stop() is called), so the readings do not touch the clocks at all.
+
+    Calling the clock returns the (coarse) monotonic time in the integer
+    microseconds, so it may be used as the clock for TokenBucket,
+    ExpiringDict and the like.
+
+    >>> clock = CoarseClock(TimeDeltaEx(milliseconds=10))
+    >>> now = clock.now()
+    >>> isinstance(now, DateTimeEx), abs(now - DateTimeEx.now()) < TimeDeltaEx(seconds=1)
+    (True, True)
+    >>> clock.now() is now or clock.now() >= now
+    True
+    >>> clock.now_mus() == now.in_microseconds or clock.now_mus() > now.in_microseconds
+    True
+    """
+
+    def __init__(self, resolution=TimeDeltaEx(milliseconds=1), tzinfo=None,
+                 background=False):
+        """
+        @type resolution: timedelta
+        @param tzinfo: the time zone of "now"; None for the naive local time
+            (like datetime.now() does).
+        @type tzinfo: NoneType, tzinfo
+        @type background: bool
+        """
+        assert isinstance(resolution, timedelta) and \
+               resolution > timedelta(0), \
+               repr(resolution)
+        assert tzinfo is None or isinstance(tzinfo, tzinfo_class), repr(tzinfo)
+
+        self.resolution = TimeDeltaEx.from_timedelta(resolution)
+        self.tzinfo = tzinfo
+        self._resolution_mus = td_to_mus(resolution)
+        self._refresh()
+
+        self._stopped = None
+        if background:
+            self._stopped = threading.Event()
+            thread = threading.Thread(target=self._run,
+                                      name="CoarseClock refresher")
+            thread.daemon = True
+            thread.start()
+
+
+    def __call__(self):
+        """
+        The monotonic time, in the integer microseconds.
+
+        @rtype: numbers.Integral
+        """
+        return self._current()[0]
+
+
+    def now(self):
+        """
+        The current date and time.
+
+        @rtype: DateTimeEx
+        """
+        return self._current()[2]
+
+
+    def now_mus(self):
+        """
+        The current date and time, in the microseconds elapsed Anno Domini
+        (by the wall clock readings).
+
+        @rtype: numbers.Integral
+        """
+        return self._current()[1]
+
+
+    def time(self):
+        """
+        The current time of the day.
+
+        @rtype: TimeEx
+        """
+        return TimeEx.from_microseconds(self.now_mus() % MICROSECONDS_IN_DAY,
+                                        tzinfo=self.tzinfo)
+
+
+    def stop(self):
+        """
+        Stop the background refreshing, switching to the lazy one.
+        """
+        if self._stopped is not None:
+            self._stopped.set()
+            self._stopped = None
+
+
+    def _current(self):
+        """
+        The snapshot of the cache, refreshed first if needed.
+
+        @return: the (monotonic time, microseconds Anno Domini, DateTimeEx)
+            tuple, all the three being read together.
+        @rtype: tuple
+        """
+        snapshot = self._snapshot
+        if self._stopped is None and \
+           _monotonic_mus() - snapshot[0] >= self._resolution_mus:
+            snapshot = self._refresh()
+        return snapshot
+
+
+    def _refresh(self):
+        # The whole snapshot is published by a single assignment,
+        # so a reader in another thread never sees the mixed one.
+        now = DateTimeEx.now(self.tzinfo)
+        self._snapshot = snapshot = (_monotonic_mus(), dt_to_mus(now), now)
+        return snapshot
+
+
+    def _run(self):
+        stopped = self._stopped
+        seconds = self._resolution_mus / MICROSECONDS_IN_SECOND
+        while not stopped.wait(seconds):
+            self._refresh()
+
+
+class FakeClock(object):
+    """
+    The manually advanced clock, with the same interface as CoarseClock,
+    for the deterministic tests and benchmarks.
+
+    >>> clock = FakeClock(DateTimeEx(2011, 3, 14, 15, 9, 26))
+    >>> clock.now(), clock()
+    (DateTimeEx(2011, 3, 14, 15, 9, 26), 0)
+    >>> clock.advance(TimeDeltaEx(milliseconds=500))
+    >>> clock.now(), clock.time(), clock()
+    (DateTimeEx(2011, 3, 14, 15, 9, 26, 500000), TimeEx(15, 9, 26, 500000), 500000)
+
+    >>> # The wall clock may be set backwards, unlike the monotonic one
+    >>> clock.set(DateTimeEx(2011, 3, 14))
+    >>> clock.now(), clock()
+    (DateTimeEx(2011, 3, 14, 0, 0), 500000)
+    """
+
+    def __init__(self, start=DateTimeEx(2000, 1, 1), monotonic=0):
+        """
+        @param start: the initial date and time (its tzinfo is kept).
+        @type start: datetime
+        @param monotonic: the initial monotonic time, in microseconds.
+        @type monotonic: numbers.Integral
+        """
+        assert isinstance(start, datetime), repr(start)
+
+        self.tzinfo = start.tzinfo
+        self._now_mus = dt_to_mus(start)
+        self._monotonic = monotonic
+
+
+    def __call__(self):
+        """
+        The monotonic time, in the integer microseconds.
+
+        @rtype: numbers.Integral
+        """
+        return self._monotonic
+
+
+    def now(self):
+        """
+        @rtype: DateTimeEx
+        """
+        return DateTimeEx.from_microseconds(self._now_mus, tzinfo=self.tzinfo)
+
+
+    def now_mus(self):
+        """
+        @rtype: numbers.Integral
+        """
+        return self._now_mus
+
+
+    def time(self):
+        """
+        @rtype: TimeEx
+        """
+        return TimeEx.from_microseconds(self._now_mus % MICROSECONDS_IN_DAY,
+                                        tzinfo=self.tzinfo)
+
+
+    def advance(self, td):
+        """
+        Advance both the wall and the monotonic clocks.
+
+        @type td: timedelta
+        """
+        assert isinstance(td, timedelta) and td >= timedelta(0), repr(td)
+
+        td_mus = td_to_mus(td)
+        self._now_mus += td_mus
+        self._monotonic += td_mus
+
+
+    def set(self, dt):
+        """
+        Set the wall clock (the monotonic clock is not affected).
+
+        @type dt: datetime
+        """
+        assert isinstance(dt, datetime), repr(dt)
+
+        self.tzinfo = dt.tzinfo
+        self._now_mus = dt_to_mus(dt)
+
+
+# Run unittests, if executed directly.
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -2,6 +2,8 @@
 # -*- coding: utf-8 -*-
 
 import numbers, sys
+from array import array
+from collections import OrderedDict
 from datetime import date, datetime, time, timedelta, tzinfo as tzinfo_class
 
 MICROSECONDS_IN_SECOND = 1000000
@@ -11,6 +13,15 @@ MICROSECONDS_IN_DAY = MICROSECONDS_IN_HOUR * 24
 
 _PY3K = (sys.version_info.major >= 3)
 
+# The array typecode for the arrays of microseconds (64-bit signed integers);
+# "q" is not available before Python 3.3, while "l" is 64-bit on most Unices.
+try:
+    array("q")
+except ValueError:
+    _MUS_TYPECODE = "l"
+else:
+    _MUS_TYPECODE = "q"
+
 
 def t_to_mus(t):
     """
@@ -132,6 +143,191 @@ if _PY3K:
     exec("µs_to_td = mus_to_td")
 
 
+def dt_to_mus(dt):
+    """
+    Convert a datetime.datetime to microseconds elapsed Anno Domini
+    (i.e. since 0001-01-01 00:00:00), by its wall clock readings;
+    the tzinfo, if any, is ignored.
+
+    Under Python 3.x, this function has two synonims:
+    dt_to_mus() and dt_to_µs().
+
+    >>> dt_to_mus(datetime(1, 1, 1))
+    0
+    >>> dt_to_mus(datetime(2011, 3, 14, 15, 9, 26, 535897))
+    63435712166535897
+
+    >>> # Test dt_to_µs() in Python 3.x only
+    >>> not _PY3K or eval("dt_to_µs(datetime(1, 1, 2)) == MICROSECONDS_IN_DAY")
+    True
+    """
+    assert isinstance(dt, datetime), repr(dt)
+
+    return ((dt.toordinal() - 1) * MICROSECONDS_IN_DAY +
+            dt.hour * MICROSECONDS_IN_HOUR +
+            dt.minute * MICROSECONDS_IN_MINUTE +
+            dt.second * MICROSECONDS_IN_SECOND +
+            dt.microsecond)
+
+if _PY3K:
+    exec("dt_to_µs = dt_to_mus")
+
+
+def mus_to_dt(microseconds, tzinfo=None):
+    """
+    Convert the number of microseconds elapsed Anno Domini
+    (i.e. since 0001-01-01 00:00:00) to datetime.datetime.
+    If tzinfo argument is passed, it is written as is to the datetime.datetime.
+
+    Sub-microsecond precision may be lost due to inherent storage limitations.
+    The calendar date of the last day converted is cached,
+    so the consecutive timestamps of the same day are converted faster.
+
+    Under Python 3.x, this function has two synonims:
+    mus_to_dt() and µs_to_dt().
+
+    >>> mus_to_dt(63435712166535897)
+    datetime.datetime(2011, 3, 14, 15, 9, 26, 535897)
+
+    >>> mus_to_dt(63435712166535897, tzinfo=DummyTZInfo())
+    datetime.datetime(2011, 3, 14, 15, 9, 26, 535897, tzinfo=<DummyTZInfo>)
+
+    >>> # Test µs_to_dt() in Python 3.x only
+    >>> not _PY3K or eval("µs_to_dt(0) == datetime(1, 1, 1)")
+    True
+    """
+    assert isinstance(microseconds, numbers.Number), repr(microseconds)
+    assert tzinfo is None or isinstance(tzinfo, tzinfo_class), repr(tzinfo)
+
+    return datetime(*_mus_to_dt_fields(microseconds), tzinfo = tzinfo)
+
+if _PY3K:
+    exec("µs_to_dt = mus_to_dt")
+
+
+# The last day converted by _mus_to_dt_fields(), as the tuple
+# (days Anno Domini, year, month, day); a single tuple is replaced
+# atomically, so the cache is thread-safe.
+_last_day = (0, 1, 1, 1)
+
+
+def _mus_to_dt_fields(microseconds):
+    """
+    Convert the number of microseconds elapsed Anno Domini
+    to the (year, month, day, hour, minute, second, microsecond) tuple,
+    as mus_to_dt() needs it.
+
+    The consecutive timestamps are usually of the same day,
+    so the calendar date of the last day converted is cached;
+    only the time of day is calculated for them.
+
+    >>> _mus_to_dt_fields(63435712166535897)
+    (2011, 3, 14, 15, 9, 26, 535897)
+    >>> _mus_to_dt_fields(63435712166535898)
+    (2011, 3, 14, 15, 9, 26, 535898)
+    >>> _mus_to_dt_fields(0)
+    (1, 1, 1, 0, 0, 0, 0)
+    """
+    global _last_day
+
+    days, day_mus = divmod(int(microseconds), MICROSECONDS_IN_DAY)
+    last_day = _last_day
+    if last_day[0] != days:
+        d = date.fromordinal(days + 1)
+        _last_day = last_day = (days, d.year, d.month, d.day)
+
+    s, _ms = divmod(day_mus, MICROSECONDS_IN_SECOND)
+    m, _s = divmod(s, 60) # 60 seconds in a minute
+    _h, _m = divmod(m, 60) # 60 minutes in an hour
+
+    return (last_day[1], last_day[2], last_day[3], _h, _m, _s, _ms)
+
+
+# The monotonic clock (in integer microseconds), for measuring the intervals;
+# the same clock as the asyncio event loop uses by default.
+# Python 2.x has no monotonic clock, so the wall clock is used instead.
+try:
+    from time import monotonic_ns as _monotonic_ns
+except ImportError:
+    try:
+        from time import monotonic as _monotonic
+    except ImportError:
+        from time import time as _monotonic
+
+    def _monotonic_mus():
+        return int(_monotonic() * MICROSECONDS_IN_SECOND)
+else:
+    def _monotonic_mus():
+        return _monotonic_ns() // 1000
+
+
+# Move the key of the OrderedDict to its end (the most recent position),
+# in O(1) time; Python 2.x has no OrderedDict.move_to_end(),
+# so the item is reinserted instead.
+if hasattr(OrderedDict, "move_to_end"):
+    _move_to_end = OrderedDict.move_to_end
+else:
+    # Python 2.x
+    def _move_to_end(d, key):
+        d[key] = d.pop(key)
+
+
+class _TypeDispatch(dict):
+    """
+    The table of the handlers of an operator, per the exact type
+    of the operand; so that the arithmetic on the mixed types
+    does not run through the chain of isinstance() checks every time.
+
+    For the type not met before, the handler is found (once)
+    by checking the rules in order with issubclass()
+    (so the ABCs like numbers.Number are supported too), and memoized.
+    Therefore, the more specific types must go first; and the types
+    registered to the ABCs after the first use are not noticed.
+
+    >>> dispatch = _TypeDispatch([(datetime, "datetime"), (date, "date"),
+    ...                           (numbers.Integral, "integral")],
+    ...                          "other")
+    >>> dispatch[datetime], dispatch[date], dispatch[bool], dispatch[float]
+    ('datetime', 'date', 'integral', 'other')
+    >>> sorted(t.__name__ for t in dispatch)
+    ['bool', 'date', 'datetime', 'float']
+    """
+    __slots__ = ("_rules", "_default")
+
+
+    def __init__(self, rules, default):
+        """
+        @param rules: the sequence of (type, handler) pairs.
+        @type rules: collections.Iterable
+        @param default: the handler for the types matching no rule.
+        """
+        dict.__init__(self)
+        self._rules = tuple(rules)
+        self._default = default
+
+
+    def __missing__(self, cls):
+        for base, handler in self._rules:
+            if issubclass(cls, base):
+                break
+        else:
+            handler = self._default
+        self[cls] = handler
+        return handler
+
+
+def _unsupported(a, b):
+    """
+    The default handler of _TypeDispatch for the operators,
+    for the operand types not supported.
+
+    NotImplemented is returned (rather than NotImplementedError raised),
+    so that Python tries the reflected operator of the other operand,
+    and raises TypeError if there is none.
+    """
+    return NotImplemented
+
+
 class DummyTZInfo(tzinfo_class):
     def __repr__(self):
         return "<DummyTZInfo>"
@@ -0,0 +1,62 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from datetime import date
+
+
+
+class DateEx(date):
+    """
+    Enhanced datetime.date, with various additional operations.
+    """
+    __slots__ = ()
+
+
+    def __repr__(self):
+        """
+        >>> DateEx(314, 1, 5)
+        DateEx(314, 1, 5)
+        """
+        return "DateEx({0:d}, {1:d}, {2:d})"\
+                   .format(self.year, self.month, self.day)
+
+
+    def as_date(self):
+        """
+        Convert the DateEx to the new datetime.date
+        (even though DateEx is its subclass and can be used instead
+        almost anywhere).
+
+        This is not a property, to reflect a fact that a new datetime.date
+        is created rather than the access to the internals of DateEx.
+
+        >>> DateEx(314, 1, 5).as_date()
+        datetime.date(314, 1, 5)
+
+        @rtype: date
+        """
+        return date(self.year, self.month, self.day)
+
+
+    @classmethod
+    def from_date(cls, d):
+        """
+        Create a new DateEx from a basic datetime.date
+        (or from the date part of datetime.datetime).
+
+        >>> DateEx.from_date(date(314, 1, 5))
+        DateEx(314, 1, 5)
+
+        @type d: date
+        @rtype: DateEx
+        """
+        assert isinstance(d, date), repr(d)
+
+        return cls(d.year, d.month, d.day)
+
+
+# Run unittests, if executed directly.
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
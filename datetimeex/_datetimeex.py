@@ -3,13 +3,14 @@
 
 from __future__ import division
 import numbers
-from datetime import date, datetime, time, timedelta
+from datetime import date, datetime, time, timedelta, tzinfo as tzinfo_class
 from fractions import Fraction
 
 from _common import (MICROSECONDS_IN_SECOND, MICROSECONDS_IN_MINUTE,
                      MICROSECONDS_IN_HOUR, MICROSECONDS_IN_DAY,
                      t_to_mus, mus_to_t, td_to_mus, mus_to_td,
-                     _PY3K, DummyTZInfo)
+                     dt_to_mus, mus_to_dt,
+                     _PY3K, _mus_to_dt_fields, DummyTZInfo)
 
 
 
@@ -100,67 +101,114 @@ class DateTimeEx(datetime):
                    dt.tzinfo)
 
 
-'''
     @property
     def in_microseconds(self):
         """
-        The number of microseconds elapsed Anno Domini.
+        The number of microseconds elapsed Anno Domini
+        (i.e. since 0001-01-01 00:00:00), by the wall clock;
+        the tzinfo, if any, is ignored.
 
         The number is always integer, due to the storage limitation.
 
         Under Python 3.x, this property has two synonims:
         in_microseconds and in_µs.
 
-        >>> DateTimeEx(3, 14, 15, 92).in_microseconds
-        11655000092
+        >>> DateTimeEx(314, 1, 5, 9, 26, 53, 5897).in_microseconds
+        9877627613005897
 
-        >>> # Test µs_to_td() in Python 3.x only
-        >>> not _PY3K or eval("DateTimeEx(3, 14, 15, 92).in_µs == 11655000092")
+        >>> # Test in_µs in Python 3.x only
+        >>> not _PY3K or eval("DateTimeEx(314, 1, 5, 9, 26, 53, 5897).in_µs == \
+            9877627613005897")
         True
 
         @rtype: numbers.Number
         """
-        return t_to_mus(self)
+        return dt_to_mus(self)
 
     if _PY3K:
         exec("in_µs = in_microseconds")
 
 
     @classmethod
-    def from_microseconds(cls, microseconds):
+    def from_microseconds(cls, microseconds, tzinfo=None):
         """
-        Given the number of microseconds elapsed since the midnight,
-        create the appropriate TimeEx object.
+        Given the number of microseconds elapsed Anno Domini
+        (i.e. since 0001-01-01 00:00:00), create the appropriate
+        DateTimeEx object. If tzinfo argument is passed,
+        it is written as is to the DateTimeEx.
 
         Sub-microsecond precision may be lost due to inherent storage limitations.
-        Also, if the number of microseconds is higher than the number of microseconds
-        in a typical Earth day, the modulo is taken automatically.
+        The calendar date of the last day converted is cached
+        (see mus_to_dt()), so the consecutive timestamps of the same day
+        are converted faster; see also mus_to_datetimes() for the bulk
+        conversion.
 
         Under Python 3.x, this function has two synonims:
         from_microseconds() and from_µs().
 
-        >>> TimeEx.from_microseconds(11655000092)
-        TimeEx(3, 14, 15, 92)
-        >>> TimeEx.from_microseconds(11655000092.003)
-        TimeEx(3, 14, 15, 92)
+        >>> DateTimeEx.from_microseconds(9877627613005897)
+        DateTimeEx(314, 1, 5, 9, 26, 53, 5897)
+        >>> DateTimeEx.from_microseconds(9877627613005897, tzinfo=DummyTZInfo())
+        DateTimeEx(314, 1, 5, 9, 26, 53, 5897, tzinfo=<DummyTZInfo>)
 
         # Test from_µs() in Python 3.x only
-        >>> not _PY3K or eval("TimeEx.from_µs(11655000092) == \
-            TimeEx(3, 14, 15, 92)")
+        >>> not _PY3K or eval("DateTimeEx.from_µs(9877627613005897) == \
+            DateTimeEx(314, 1, 5, 9, 26, 53, 5897)")
         True
 
         @type microseconds: numbers.Number
+        @type tzinfo: NoneType, tzinfo
 
-        @rtype: TimeEx
+        @rtype: DateTimeEx
         """
         assert isinstance(microseconds, numbers.Number), repr(microseconds)
+        assert tzinfo is None or isinstance(tzinfo, tzinfo_class), repr(tzinfo)
 
-        return cls.from_time(mus_to_t(microseconds))
+        return cls(*_mus_to_dt_fields(microseconds), tzinfo=tzinfo)
 
     if _PY3K:
         exec("from_µs = from_microseconds")
 
 
+def mus_to_datetimes(keys, tzinfo=None):
+    """
+    Convert the microseconds elapsed Anno Domini (e.g. the array
+    of the timestamps, see keys_mus()) to the list of DateTimeEx
+    objects in bulk.
+
+    The calendar date is calculated only when the day changes
+    from the previous key; for the rest, only the time of day is.
+    So the sorted timestamps are converted faster.
+
+    >>> mus_to_datetimes([63435712166535897, 63435712166535898, 0])
+    [DateTimeEx(2011, 3, 14, 15, 9, 26, 535897), DateTimeEx(2011, 3, 14, 15, 9, 26, 535898), DateTimeEx(1, 1, 1, 0, 0)]
+    >>> mus_to_datetimes([63435712166535896.0])
+    [DateTimeEx(2011, 3, 14, 15, 9, 26, 535896)]
+
+    @type keys: collections.Iterable
+    @type tzinfo: NoneType, tzinfo
+    @rtype: list
+    """
+    assert tzinfo is None or isinstance(tzinfo, tzinfo_class), repr(tzinfo)
+
+    cls = DateTimeEx
+    result = []
+    append = result.append
+    last_days = None
+    for mus in keys:
+        days, day_mus = divmod(int(mus), MICROSECONDS_IN_DAY)
+        if days != last_days:
+            d = date.fromordinal(days + 1)
+            year, month, day = d.year, d.month, d.day
+            last_days = days
+        s, _ms = divmod(day_mus, MICROSECONDS_IN_SECOND)
+        m, _s = divmod(s, 60) # 60 seconds in a minute
+        _h, _m = divmod(m, 60) # 60 minutes in an hour
+        append(cls(year, month, day, _h, _m, _s, _ms, tzinfo))
+    return result
+
+
+'''
 ##    def __add__(self, td):
 #        """
 #        Add a datetime.timedelta to the TimeEx
@@ -0,0 +1,271 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+import numbers
+from collections import OrderedDict
+from datetime import timedelta
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
+
+from _common import td_to_mus, _monotonic_mus, _move_to_end
+from _timedeltaex import TimeDeltaEx
+
+
+
+class ExpiringDict(MutableMapping):
+    """
+    The dictionary whose items expire after their lifetime (TTL),
+    e.g. for caching the lookups.
+
+    The expiration instants are stored as the integer microseconds
+    on the clock (by default, the monotonic clock).
+    The expired items are never returned; they are evicted lazily
+    (when accessed), and also incrementally: the keys are grouped
+    into the buckets by their expiration instant (the same floor division
+    as TimeDeltaEx // timedelta does, with the resolution as a divisor),
+    and every operation drops the buckets which have entirely expired.
+    So the eviction is amortized O(1) per item, and the memory held
+    by the expired items is reclaimed within the resolution.
+
+    If max_size is given, the least recently used items are evicted
+    to fit into it (counted as the expirations if they have expired
+    already).
+
+    >>> now = [0]
+    >>> cache = ExpiringDict(TimeDeltaEx(seconds=10), max_size=2,
+    ...                      clock=lambda: now[0])
+    >>> cache["a"] = 1
+    >>> cache.set("b", 2, ttl=TimeDeltaEx(seconds=30))
+    >>> cache["a"], cache.get("c")
+    (1, None)
+    >>> now[0] += 10000000
+    >>> "a" in cache, cache["b"]
+    (False, 2)
+    >>> cache.ttl("b")
+    TimeDeltaEx(0, 20)
+    >>> cache["c"] = 3; cache["d"] = 4; cache["e"] = 5
+    >>> sorted(cache)
+    ['d', 'e']
+    >>> cache.hits, cache.misses, cache.expirations, cache.evictions
+    (2, 1, 1, 2)
+
+    >>> # The expired buckets are dropped without accessing the keys;
+    >>> # those expired at 15s exactly are in the bucket not yet finished.
+    >>> cache = ExpiringDict(clock=lambda: now[0])
+    >>> for i in range(1000):
+    ...     cache.set(i, i, ttl=TimeDeltaEx(seconds=i % 10 + 1))
+    >>> now[0] += 5000000; len(cache), cache.expirations
+    (600, 400)
+    """
+
+    def __init__(self, default_ttl=None, max_size=None,
+                 resolution=TimeDeltaEx(seconds=1), clock=_monotonic_mus):
+        """
+        @param default_ttl: the lifetime of the items, unless specified
+            explicitly (None means the items never expire).
+        @type default_ttl: NoneType, timedelta
+        @param max_size: the maximum number of items (None for unlimited).
+        @type max_size: NoneType, numbers.Integral
+        @param resolution: the granularity of the expiration buckets.
+        @type resolution: timedelta
+        @type clock: collections.Callable
+        """
+        assert default_ttl is None or isinstance(default_ttl, timedelta), \
+               repr(default_ttl)
+        assert max_size is None or \
+               (isinstance(max_size, numbers.Integral) and max_size > 0), \
+               repr(max_size)
+        assert isinstance(resolution, timedelta) and \
+               resolution > timedelta(0), \
+               repr(resolution)
+
+        self.default_ttl = None if default_ttl is None \
+                                else TimeDeltaEx.from_timedelta(default_ttl)
+        self.max_size = max_size
+        self.resolution = TimeDeltaEx.from_timedelta(resolution)
+        self._resolution_mus = td_to_mus(resolution)
+        self._default_ttl_mus = None if default_ttl is None \
+                                     else td_to_mus(default_ttl)
+        self._clock = clock
+        # {key: (value, expiration instant or None)}, in the LRU order.
+        self._data = OrderedDict()
+        # {bucket index: set of keys}
+        self._buckets = {}
+        # All the buckets before this one have been dropped.
+        self._next_bucket = None
+
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+
+
+    def __len__(self):
+        """
+        The number of items stored; it may include the items
+        expired within the last resolution interval.
+        """
+        self._purge(self._clock())
+        return len(self._data)
+
+
+    def __iter__(self):
+        now = self._clock()
+        self._purge(now)
+        return iter([key for key, (value, expires) in self._data.items()
+                         if expires is None or expires > now])
+
+
+    def __contains__(self, key):
+        """
+        Whether the key is present (and not expired); unlike the item
+        access, it neither counts as a hit/miss nor refreshes the LRU order.
+        """
+        try:
+            value, expires = self._data[key]
+        except KeyError:
+            return False
+        return expires is None or expires > self._clock()
+
+
+    def __getitem__(self, key):
+        now = self._clock()
+        self._purge(now)
+        try:
+            value, expires = self._data[key]
+        except KeyError:
+            self.misses += 1
+            raise
+        if expires is not None and expires <= now:
+            self._remove(key, expires)
+            self.expirations += 1
+            self.misses += 1
+            raise KeyError(key)
+        _move_to_end(self._data, key)
+        self.hits += 1
+        return value
+
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+
+    def __delitem__(self, key):
+        value, expires = self._data[key]
+        self._remove(key, expires)
+
+
+    def set(self, key, value, ttl=None):
+        """
+        Store the item, with the given lifetime (or default_ttl).
+
+        @type ttl: NoneType, timedelta
+        """
+        assert ttl is None or isinstance(ttl, timedelta), repr(ttl)
+
+        now = self._clock()
+        self._purge(now)
+        ttl_mus = self._default_ttl_mus if ttl is None else td_to_mus(ttl)
+        expires = None if ttl_mus is None else now + ttl_mus
+
+        data = self._data
+        try:
+            old_value, old_expires = data.pop(key)
+        except KeyError:
+            pass
+        else:
+            self._unbucket(key, old_expires)
+        data[key] = (value, expires)
+        if expires is not None:
+            bucket = expires // self._resolution_mus
+            try:
+                self._buckets[bucket].add(key)
+            except KeyError:
+                self._buckets[bucket] = set([key])
+                if self._next_bucket is None or bucket < self._next_bucket:
+                    self._next_bucket = bucket
+
+        if self.max_size is not None:
+            while len(data) > self.max_size:
+                k, (v, e) = data.popitem(last=False)
+                self._unbucket(k, e)
+                if e is not None and e <= now:
+                    self.expirations += 1
+                else:
+                    self.evictions += 1
+
+
+    def ttl(self, key):
+        """
+        The remaining lifetime of the item (None if it never expires).
+        Like the item access, it evicts the item if it has expired.
+
+        >>> now = [0]
+        >>> cache = ExpiringDict(clock=lambda: now[0])
+        >>> cache.set("a", 1, ttl=TimeDeltaEx(milliseconds=1500))
+        >>> now[0] += 1500000; cache.ttl("a")
+        Traceback (most recent call last):
+          ...
+        KeyError: 'a'
+        >>> len(cache._data), cache.expirations
+        (0, 1)
+
+        @rtype: NoneType, TimeDeltaEx
+        """
+        now = self._clock()
+        self._purge(now)
+        value, expires = self._data[key]
+        if expires is None:
+            return None
+        elif expires <= now:
+            self._remove(key, expires)
+            self.expirations += 1
+            raise KeyError(key)
+        else:
+            return TimeDeltaEx.from_microseconds(expires - now)
+
+
+    def _remove(self, key, expires):
+        del self._data[key]
+        self._unbucket(key, expires)
+
+
+    def _unbucket(self, key, expires):
+        if expires is not None:
+            bucket = expires // self._resolution_mus
+            keys = self._buckets[bucket]
+            keys.discard(key)
+            if not keys:
+                del self._buckets[bucket]
+
+
+    def _purge(self, now):
+        """
+        Drop all the buckets which have entirely expired by now.
+        """
+        current = now // self._resolution_mus
+        if self._next_bucket is None or self._next_bucket >= current:
+            return
+
+        buckets = self._buckets
+        if current - self._next_bucket <= len(buckets):
+            expired = range(self._next_bucket, current)
+        else:
+            # After a long pause, it is cheaper to scan the buckets present.
+            expired = [b for b in buckets if b < current]
+        for bucket in expired:
+            keys = buckets.pop(bucket, None)
+            if keys:
+                for key in keys:
+                    del self._data[key]
+                self.expirations += len(keys)
+        self._next_bucket = current if buckets else None
+
+
+# Run unittests, if executed directly.
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
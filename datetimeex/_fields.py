@@ -0,0 +1,245 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from array import array
+from datetime import date
+try:
+    from itertools import imap
+except ImportError:
+    # Python 3.x
+    imap = map
+
+from _common import (MICROSECONDS_IN_SECOND, MICROSECONDS_IN_MINUTE,
+                     MICROSECONDS_IN_HOUR, MICROSECONDS_IN_DAY,
+                     dt_to_mus, t_to_mus, _MUS_TYPECODE)
+from _datetimeex import DateTimeEx
+from _timeex import TimeEx
+
+
+
+# The typecodes of the compact arrays of the fields.
+_YEAR_TYPECODE = "h"
+_FIELD_TYPECODE = "b"
+_MICROSECOND_TYPECODE = "l"
+
+# The ordinal of 0000-03-01 (the day the civil-from-days algorithm
+# counts from, as the leap day is then the last one of the year) is -305.
+_MARCH_1_0000_ORDINAL = -305
+
+
+def _civil_from_ordinal(ordinal):
+    """
+    The (year, month, day) of the date ordinal (see date.toordinal()),
+    by the branch-free civil-from-days algorithm of Howard Hinnant
+    (http://howardhinnant.github.io/date_algorithms.html),
+    using only the integer arithmetic.
+
+    >>> _civil_from_ordinal(date(2012, 2, 29).toordinal())
+    (2012, 2, 29)
+    >>> _civil_from_ordinal(1), _civil_from_ordinal(date.max.toordinal())
+    ((1, 1, 1), (9999, 12, 31))
+
+    @type ordinal: numbers.Integral
+    @rtype: tuple
+    """
+    z = ordinal - _MARCH_1_0000_ORDINAL
+    era = z // 146097
+    doe = z - era * 146097                                  # [0, 146096]
+    yoe = (doe - doe // 1460 + doe // 36524 - doe // 146096) // 365
+    doy = doe - (365 * yoe + yoe // 4 - yoe // 100)         # [0, 365]
+    mp = (5 * doy + 2) // 153                               # [0, 11], from March
+    month = (mp + 2) % 12 + 1
+    return (yoe + era * 400 + (month <= 2),
+            month,
+            doy - (153 * mp + 2) // 5 + 1)
+
+
+def _ordinal_from_civil(year, month, day):
+    """
+    The date ordinal of (year, month, day), by the branch-free
+    days-from-civil algorithm (the inverse of _civil_from_ordinal()).
+
+    >>> _ordinal_from_civil(2012, 2, 29) == date(2012, 2, 29).toordinal()
+    True
+
+    @type year: numbers.Integral
+    @type month: numbers.Integral
+    @type day: numbers.Integral
+    @rtype: numbers.Integral
+    """
+    year -= month <= 2
+    era = year // 400
+    yoe = year - era * 400                                  # [0, 399]
+    doy = (153 * ((month + 9) % 12) + 2) // 5 + day - 1     # [0, 365]
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy           # [0, 146096]
+    return era * 146097 + doe + _MARCH_1_0000_ORDINAL
+
+
+def _isocalendar_from_ordinal(ordinal):
+    """
+    The ISO (year, week number, weekday) of the date ordinal,
+    like date.isocalendar(): the ISO week belongs to the year
+    its Thursday falls into.
+
+    >>> _isocalendar_from_ordinal(date(2010, 1, 3).toordinal())
+    (2009, 53, 7)
+
+    @type ordinal: numbers.Integral
+    @rtype: tuple
+    """
+    # date.fromordinal(1) is a Monday.
+    weekday = (ordinal - 1) % 7
+    thursday = ordinal - weekday + 3
+    year = _civil_from_ordinal(thursday)[0]
+    return (year,
+            (thursday - _ordinal_from_civil(year, 1, 1)) // 7 + 1,
+            weekday + 1)
+
+
+def _per_day(ordinals, kernel):
+    """
+    Apply the kernel to every distinct ordinal once, returning
+    the columns of its results (the tuples) for all the ordinals.
+
+    Every column is looked up in its own dictionary by the C code
+    (dict.__getitem__ mapped over the ordinals).
+    """
+    distinct = list(set(ordinals))
+    return [list(imap(dict(zip(distinct, column)).__getitem__, ordinals))
+                for column in zip(*[kernel(ordinal) for ordinal in distinct])]
+
+
+def ordinals_mus(keys):
+    """
+    The date ordinals (see date.toordinal()) of the microseconds
+    Anno Domini (see dt_to_mus()), in bulk.
+
+    >>> list(ordinals_mus([0, dt_to_mus(DateTimeEx(2011, 3, 14, 23, 59))]))
+    [1, 734210]
+
+    @type keys: collections.Iterable
+    @rtype: array
+    """
+    return array(_MUS_TYPECODE, [mus // MICROSECONDS_IN_DAY + 1 for mus in keys])
+
+
+def date_fields_ordinals(ordinals):
+    """
+    The years, months and days of the date ordinals in bulk,
+    as the compact integer arrays, without creating the date objects.
+
+    The fields are calculated by the integer civil-from-days algorithm,
+    once for every distinct day (e.g. the ordinals of the timestamps,
+    see ordinals_mus(), usually repeat a lot).
+
+    >>> ordinals = [date(2011, 3, 14).toordinal(), date(2012, 2, 29).toordinal()]
+    >>> [list(column) for column in date_fields_ordinals(ordinals)]
+    [[2011, 2012], [3, 2], [14, 29]]
+
+    @type ordinals: collections.Sequence
+    @return: the arrays of the years, the months and the days.
+    @rtype: tuple
+    """
+    if not len(ordinals):
+        return (array(_YEAR_TYPECODE),
+                array(_FIELD_TYPECODE), array(_FIELD_TYPECODE))
+    years, months, days = _per_day(ordinals, _civil_from_ordinal)
+    return (array(_YEAR_TYPECODE, years),
+            array(_FIELD_TYPECODE, months), array(_FIELD_TYPECODE, days))
+
+
+def ordinals_from_date_fields(years, months, days):
+    """
+    The date ordinals of the years, months and days in bulk,
+    by the integer days-from-civil algorithm
+    (the inverse of date_fields_ordinals()).
+
+    >>> list(ordinals_from_date_fields([2011, 2012], [3, 2], [14, 29]))
+    [734210, 734562]
+
+    @type years: collections.Iterable
+    @type months: collections.Iterable
+    @type days: collections.Iterable
+    @rtype: array
+    """
+    return array(_MUS_TYPECODE,
+                 [_ordinal_from_civil(year, month, day)
+                      for year, month, day in zip(years, months, days)])
+
+
+def weekdays_ordinals(ordinals):
+    """
+    The days of the week of the date ordinals in bulk,
+    Monday being 0 (like date.weekday()).
+
+    >>> list(weekdays_ordinals([date(2011, 3, 14).toordinal(),
+    ...                         date(2011, 3, 20).toordinal()]))
+    [0, 6]
+
+    @type ordinals: collections.Iterable
+    @rtype: array
+    """
+    # date.fromordinal(1) is a Monday.
+    return array(_FIELD_TYPECODE, [(ordinal - 1) % 7 for ordinal in ordinals])
+
+
+def isocalendar_ordinals(ordinals):
+    """
+    The ISO years, week numbers and weekdays of the date ordinals
+    in bulk (like date.isocalendar()), calculated once for every
+    distinct day.
+
+    >>> ordinals = [date(2010, 1, 3).toordinal(), date(2011, 3, 14).toordinal()]
+    >>> [list(column) for column in isocalendar_ordinals(ordinals)]
+    [[2009, 2011], [53, 11], [7, 1]]
+
+    @type ordinals: collections.Sequence
+    @return: the arrays of the ISO years, the weeks and the weekdays.
+    @rtype: tuple
+    """
+    if not len(ordinals):
+        return (array(_YEAR_TYPECODE),
+                array(_FIELD_TYPECODE), array(_FIELD_TYPECODE))
+    years, weeks, weekdays = _per_day(ordinals, _isocalendar_from_ordinal)
+    return (array(_YEAR_TYPECODE, years),
+            array(_FIELD_TYPECODE, weeks), array(_FIELD_TYPECODE, weekdays))
+
+
+def time_fields_mus(keys):
+    """
+    The hours, minutes, seconds and microseconds of the time of day
+    in bulk, as the compact integer arrays, by the same divmod chain
+    as mus_to_t() does (so the keys may be either the microseconds
+    since the midnight, see t_to_mus(), or the microseconds
+    Anno Domini, see dt_to_mus()).
+
+    >>> keys = [t_to_mus(TimeEx(3, 14, 15, 92)),
+    ...         dt_to_mus(DateTimeEx(2011, 3, 14, 23, 59, 59))]
+    >>> [list(column) for column in time_fields_mus(keys)]
+    [[3, 23], [14, 59], [15, 59], [92, 0]]
+
+    @type keys: collections.Iterable
+    @return: the arrays of the hours, the minutes, the seconds
+        and the microseconds.
+    @rtype: tuple
+    """
+    hours = array(_FIELD_TYPECODE)
+    minutes = array(_FIELD_TYPECODE)
+    seconds = array(_FIELD_TYPECODE)
+    microseconds = array(_MICROSECOND_TYPECODE)
+    for mus in keys:
+        s, _ms = divmod(mus, MICROSECONDS_IN_SECOND)
+        m, _s = divmod(s, 60) # 60 seconds in a minute
+        h, _m = divmod(m, 60) # 60 minutes in an hour
+        hours.append(h % 24) # 24 hours in a day
+        minutes.append(_m)
+        seconds.append(_s)
+        microseconds.append(_ms)
+    return hours, minutes, seconds, microseconds
+
+
+# Run unittests, if executed directly.
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,461 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+import math, numbers
+from array import array
+from datetime import timedelta
+
+from _common import td_to_mus, _MUS_TYPECODE
+from _timedeltaex import TimeDeltaEx
+
+
+
+class DurationHistogram(object):
+    """
+    The fixed-memory histogram of the durations, bucketed
+    like in the HDR Histogram.
+
+    The durations are recorded as the integer number of microseconds,
+    with the given number of significant decimal digits preserved
+    for any value up to the highest trackable one (by default,
+    the longest possible timedelta). Recording is O(1) and does not use
+    any floating point or Fraction arithmetic.
+    The negative durations cannot be recorded.
+
+    >>> histogram = DurationHistogram(significant_digits=3)
+    >>> for ms in range(1, 1001):
+    ...     histogram.record(TimeDeltaEx(milliseconds=ms))
+    >>> len(histogram)
+    1000
+    >>> histogram.quantiles([0.5, 0.99, 1])
+    [TimeDeltaEx(0, 0, 500223), TimeDeltaEx(0, 0, 990207), TimeDeltaEx(0, 1)]
+    >>> histogram.min, histogram.max
+    (TimeDeltaEx(0, 0, 1000), TimeDeltaEx(0, 1))
+    """
+
+    def __init__(self, significant_digits=3, highest=timedelta.max):
+        """
+        @param significant_digits: the number of the significant decimal
+            digits preserved for every recorded value, from 1 to 5.
+        @type significant_digits: numbers.Integral
+        @param highest: the highest duration which may be recorded.
+        @type highest: timedelta
+        """
+        assert isinstance(significant_digits, numbers.Integral) and \
+               1 <= significant_digits <= 5, \
+               repr(significant_digits)
+        assert isinstance(highest, timedelta) and highest > timedelta(0), \
+               repr(highest)
+
+        self.significant_digits = significant_digits
+        self._highest = td_to_mus(highest)
+
+        # Every value below this one is recorded with the unit precision.
+        single_unit_resolution = 2 * 10 ** significant_digits
+        self._sub_bucket_magnitude = (single_unit_resolution - 1).bit_length()
+        self._sub_bucket_half_magnitude = self._sub_bucket_magnitude - 1
+        self._sub_bucket_count = 1 << self._sub_bucket_magnitude
+        self._sub_bucket_half_count = self._sub_bucket_count >> 1
+        self._sub_bucket_mask = self._sub_bucket_count - 1
+
+        bucket_count = 1
+        smallest_untrackable = self._sub_bucket_count
+        while smallest_untrackable <= self._highest:
+            smallest_untrackable <<= 1
+            bucket_count += 1
+        self._counts = array(_MUS_TYPECODE,
+                             [0]) * ((bucket_count + 1) *
+                                     self._sub_bucket_half_count)
+        self._count = 0
+        self._min = None
+        self._max = None
+
+
+    def __len__(self):
+        """
+        The number of the durations recorded.
+        """
+        return self._count
+
+
+    def __repr__(self):
+        """
+        >>> DurationHistogram(2, highest=timedelta(hours=1))
+        <DurationHistogram(2, TimeDeltaEx(0, 3600)): 0 values>
+        """
+        return "<DurationHistogram({0:d}, {1!r}): {2:d} values>"\
+                   .format(self.significant_digits,
+                           TimeDeltaEx.from_microseconds(self._highest),
+                           self._count)
+
+
+    @property
+    def min(self):
+        """
+        The exact minimal duration recorded, or None if nothing was recorded.
+
+        @rtype: NoneType, TimeDeltaEx
+        """
+        return None if self._min is None \
+                    else TimeDeltaEx.from_microseconds(self._min)
+
+
+    @property
+    def max(self):
+        """
+        The exact maximal duration recorded, or None if nothing was recorded.
+
+        @rtype: NoneType, TimeDeltaEx
+        """
+        return None if self._max is None \
+                    else TimeDeltaEx.from_microseconds(self._max)
+
+
+    def record(self, td, count=1):
+        """
+        Record a datetime.timedelta (or TimeDeltaEx), count times.
+
+        >>> DurationHistogram(highest=timedelta(1)).record(timedelta(2))
+        Traceback (most recent call last):
+          ...
+        ValueError: Cannot record 172800000000 microseconds
+
+        @type td: timedelta
+        @type count: numbers.Integral
+        """
+        self.record_microseconds(td_to_mus(td), count)
+
+
+    def record_microseconds(self, microseconds, count=1):
+        """
+        Record a duration (as the integer number of microseconds),
+        count times.
+
+        @type microseconds: numbers.Integral
+        @type count: numbers.Integral
+        """
+        if not 0 <= microseconds <= self._highest:
+            raise ValueError("Cannot record {0:d} microseconds"
+                                 .format(microseconds))
+
+        self._counts[self._counts_index(microseconds)] += count
+        self._count += count
+        if self._min is None or microseconds < self._min:
+            self._min = microseconds
+        if self._max is None or microseconds > self._max:
+            self._max = microseconds
+
+
+    def merge(self, other):
+        """
+        Merge another histogram (e.g. collected by another process)
+        into this one.
+
+        Both histograms must have the same significant digits
+        and the highest trackable duration.
+
+        >>> histogram1, histogram2 = DurationHistogram(), DurationHistogram()
+        >>> histogram1.record(TimeDeltaEx(seconds=1))
+        >>> histogram2.record(TimeDeltaEx(seconds=3), 3)
+        >>> histogram1.merge(histogram2)
+        >>> len(histogram1), histogram1.quantile(0.5)
+        (4, TimeDeltaEx(0, 3))
+
+        @type other: DurationHistogram
+        """
+        assert isinstance(other, DurationHistogram), repr(other)
+        if (self.significant_digits, self._highest) != \
+           (other.significant_digits, other._highest):
+            raise ValueError("Cannot merge the incompatible histograms "
+                             "{0!r} and {1!r}".format(self, other))
+
+        counts = self._counts
+        for i, count in enumerate(other._counts):
+            if count:
+                counts[i] += count
+        self._count += other._count
+        if other._min is not None:
+            if self._min is None or other._min < self._min:
+                self._min = other._min
+            if self._max is None or other._max > self._max:
+                self._max = other._max
+
+
+    def quantile(self, q):
+        """
+        Get the q-quantile of the recorded durations (e.g. 0.99 for p99),
+        i.e. the highest duration equivalent to the value at that quantile
+        (but never above the exact maximum).
+
+        >>> DurationHistogram().quantile(0.5) is None
+        True
+
+        @type q: numbers.Real
+        @return: the quantile, or None if nothing was recorded.
+        @rtype: NoneType, TimeDeltaEx
+        """
+        return self.quantiles([q])[0]
+
+
+    def quantiles(self, qs):
+        """
+        Get several quantiles of the recorded durations, in a single pass
+        over the buckets.
+
+        @type qs: collections.Iterable
+        @rtype: list
+        """
+        qs = list(qs)
+        assert all(0 <= q <= 1 for q in qs), repr(qs)
+        if not self._count:
+            return [None] * len(qs)
+
+        # The (count at quantile, position in qs) pairs,
+        # in the increasing order.
+        targets = sorted((max(1, int(math.ceil(q * self._count))), i)
+                             for i, q in enumerate(qs))
+        results = [None] * len(qs)
+        t = 0
+        cumulative = 0
+        for index, count in enumerate(self._counts):
+            if not count:
+                continue
+            cumulative += count
+            while t < len(targets) and targets[t][0] <= cumulative:
+                value = self._highest_equivalent(self._value_from_index(index))
+                results[targets[t][1]] = TimeDeltaEx.from_microseconds(
+                                             min(value, self._max))
+                t += 1
+            if t == len(targets):
+                break
+        return results
+
+
+    def buckets(self):
+        """
+        Iterate over the non-empty buckets, as the
+        (lowest duration, highest duration, count) tuples
+        in the increasing order.
+
+        >>> histogram = DurationHistogram(1)
+        >>> histogram.record(TimeDeltaEx(microseconds=5))
+        >>> histogram.record(TimeDeltaEx(microseconds=1000), 2)
+        >>> list(histogram.buckets())
+        [(TimeDeltaEx(0, 0, 5), TimeDeltaEx(0, 0, 5), 1), (TimeDeltaEx(0, 0, 992), TimeDeltaEx(0, 0, 1023), 2)]
+
+        @rtype: collections.Iterable
+        """
+        for index, count in enumerate(self._counts):
+            if count:
+                lowest = self._value_from_index(index)
+                yield (TimeDeltaEx.from_microseconds(lowest),
+                       TimeDeltaEx.from_microseconds(
+                           self._highest_equivalent(lowest)),
+                       count)
+
+
+    def to_bytes(self):
+        """
+        Serialize the histogram to the compact binary encoding.
+
+        The header contains the format version, the significant digits,
+        the highest trackable value, the minimum, the maximum
+        and the total count (to detect the truncated data);
+        then the counts follow, with the runs of zeros collapsed.
+        All the integers are stored as the variable-length integers.
+
+        >>> histogram = DurationHistogram()
+        >>> for ms in range(1, 1001):
+        ...     histogram.record(TimeDeltaEx(milliseconds=ms))
+        >>> data = histogram.to_bytes()
+        >>> len(data) < 2048
+        True
+        >>> restored = DurationHistogram.from_bytes(data)
+        >>> (len(restored), restored.min, restored.max)
+        (1000, TimeDeltaEx(0, 0, 1000), TimeDeltaEx(0, 1))
+        >>> list(restored.buckets()) == list(histogram.buckets())
+        True
+
+        @rtype: bytes
+        """
+        data = bytearray(_MAGIC)
+        _write_varint(data, _VERSION)
+        _write_varint(data, self.significant_digits)
+        _write_varint(data, self._highest)
+        # 0 stands for None.
+        _write_varint(data, 0 if self._min is None else self._min + 1)
+        _write_varint(data, 0 if self._max is None else self._max + 1)
+        _write_varint(data, self._count)
+
+        # A non-zero count is stored as (count << 1),
+        # a run of zeros is stored as (run length << 1 | 1);
+        # the trailing zeros are omitted.
+        zeros = 0
+        for count in self._counts:
+            if count:
+                if zeros:
+                    _write_varint(data, zeros << 1 | 1)
+                    zeros = 0
+                _write_varint(data, count << 1)
+            else:
+                zeros += 1
+        return bytes(data)
+
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Deserialize the histogram from the binary encoding
+        created by to_bytes().
+
+        >>> DurationHistogram.from_bytes(b"garbage")
+        Traceback (most recent call last):
+          ...
+        ValueError: Not a serialized DurationHistogram
+
+        >>> histogram = DurationHistogram(highest=timedelta(seconds=1))
+        >>> histogram.record(TimeDeltaEx(milliseconds=5))
+        >>> data = bytearray(histogram.to_bytes())
+        >>> DurationHistogram.from_bytes(data[:-1])
+        Traceback (most recent call last):
+          ...
+        ValueError: Corrupted DurationHistogram: 0 values instead of 1
+        >>> _write_varint(data, 1000000 << 1 | 1); _write_varint(data, 1 << 1)
+        >>> DurationHistogram.from_bytes(data)
+        Traceback (most recent call last):
+          ...
+        ValueError: Corrupted DurationHistogram: the counts exceed its range
+
+        @type data: bytes
+        @rtype: DurationHistogram
+        """
+        data = bytearray(data)
+        if data[:len(_MAGIC)] != _MAGIC:
+            raise ValueError("Not a serialized DurationHistogram")
+        values = _read_varints(data, len(_MAGIC))
+
+        try:
+            version = next(values)
+            if version != _VERSION:
+                raise ValueError("Unsupported DurationHistogram format version "
+                                 "{0:d}".format(version))
+            significant_digits, highest, _min, _max, total = \
+                [next(values) for i in range(5)]
+        except StopIteration:
+            raise ValueError("Corrupted DurationHistogram: truncated header")
+        histogram = cls(significant_digits,
+                        TimeDeltaEx.from_microseconds(highest))
+        histogram._min = None if not _min else _min - 1
+        histogram._max = None if not _max else _max - 1
+
+        counts = histogram._counts
+        i = 0
+        for value in values:
+            if value & 1:
+                i += value >> 1
+            elif i < len(counts):
+                counts[i] = value >> 1
+                histogram._count += value >> 1
+                i += 1
+            else:
+                raise ValueError("Corrupted DurationHistogram: "
+                                 "the counts exceed its range")
+        if histogram._count != total:
+            raise ValueError("Corrupted DurationHistogram: "
+                             "{0:d} values instead of {1:d}"
+                                 .format(histogram._count, total))
+        return histogram
+
+
+    def _counts_index(self, value):
+        """
+        The index in the counts array, for the value (in microseconds).
+
+        @rtype: numbers.Integral
+        """
+        bucket_index = ((value | self._sub_bucket_mask).bit_length() -
+                        self._sub_bucket_magnitude)
+        sub_bucket_index = value >> bucket_index
+        return (((bucket_index + 1) << self._sub_bucket_half_magnitude) +
+                sub_bucket_index - self._sub_bucket_half_count)
+
+
+    def _value_from_index(self, index):
+        """
+        The lowest value (in microseconds) recorded to the counts array
+        at the index.
+
+        @rtype: numbers.Integral
+        """
+        bucket_index = (index >> self._sub_bucket_half_magnitude) - 1
+        sub_bucket_index = ((index & (self._sub_bucket_half_count - 1)) +
+                            self._sub_bucket_half_count)
+        if bucket_index < 0:
+            sub_bucket_index -= self._sub_bucket_half_count
+            bucket_index = 0
+        return sub_bucket_index << bucket_index
+
+
+    def _highest_equivalent(self, value):
+        """
+        The highest value (in microseconds) recorded to the same counts
+        array item as the value.
+
+        @rtype: numbers.Integral
+        """
+        bucket_index = ((value | self._sub_bucket_mask).bit_length() -
+                        self._sub_bucket_magnitude)
+        lowest = (value >> bucket_index) << bucket_index
+        return lowest + (1 << bucket_index) - 1
+
+
+_MAGIC = bytearray(b"DTXH")
+_VERSION = 2
+
+
+def _write_varint(data, value):
+    """
+    Append the non-negative integer to the bytearray,
+    as the LEB128 variable-length integer.
+
+    @type data: bytearray
+    @type value: numbers.Integral
+    """
+    while value > 0x7F:
+        data.append(value & 0x7F | 0x80)
+        value >>= 7
+    data.append(value)
+
+
+def _read_varints(data, start):
+    """
+    Iterate over the LEB128 variable-length integers in the bytearray,
+    beginning from the start position.
+
+    >>> data = bytearray()
+    >>> for value in (0, 127, 128, 2 ** 70):
+    ...     _write_varint(data, value)
+    >>> list(_read_varints(data, 0)) == [0, 127, 128, 2 ** 70]
+    True
+
+    @type data: bytearray
+    @type start: numbers.Integral
+    @rtype: collections.Iterable
+    """
+    value = shift = 0
+    for byte in data[start:]:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            yield value
+            value = shift = 0
+    if shift:
+        raise ValueError("Truncated variable-length integer")
+
+
+# Run unittests, if executed directly.
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
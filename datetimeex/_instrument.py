@@ -0,0 +1,186 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from __future__ import division, print_function
+import numbers, sys
+from collections import namedtuple
+from datetime import timedelta
+from fractions import Fraction
+
+from _stopwatch import _perf_counter_ns
+from _timeex import TimeEx
+from _timedeltaex import TimeDeltaEx
+
+
+
+# The binary operators which may be instrumented
+# (only those defined by the class itself are).
+_OPERATORS = ("__add__", "__radd__", "__sub__", "__rsub__",
+              "__mul__", "__rmul__",
+              "__div__", "__rdiv__", "__truediv__", "__rtruediv__",
+              "__floordiv__", "__rfloordiv__",
+              "__mod__", "__rmod__", "__divmod__", "__rdivmod__")
+
+_INSTRUMENTED_CLASSES = (TimeDeltaEx, TimeEx)
+
+# {(class, operator name): the original function}, while enabled.
+_originals = {}
+# {(class name, operator name, operand type name): [calls, nanoseconds]}
+_counts = {}
+
+
+class OperatorStats(namedtuple("OperatorStats",
+                               "cls operator operand calls total lossy")):
+    """
+    The statistics of calling a single operator with a single operand type.
+
+    The lossy flag marks the operators which (for this operand type)
+    compute the result through the float arithmetic, so that
+    the sub-microsecond precision may be lost.
+    """
+    __slots__ = ()
+
+
+def _is_lossy(operator, operand_type):
+    """
+    Whether the operator of TimeDeltaEx with the operand of this type
+    goes through the float arithmetic.
+
+    >>> _is_lossy("__mul__", float), _is_lossy("__mul__", int)
+    (True, False)
+    >>> _is_lossy("__truediv__", Fraction), _is_lossy("__truediv__", timedelta)
+    (False, False)
+
+    @type operator: str
+    @type operand_type: type
+    @rtype: bool
+    """
+    # The rational numbers are handled exactly.
+    return operator in ("__mul__", "__rmul__",
+                        "__div__", "__truediv__", "__floordiv__") and \
+           issubclass(operand_type, numbers.Number) and \
+           not issubclass(operand_type, numbers.Rational)
+
+
+def _instrumented(cls_name, operator, func):
+    """
+    Wrap the operator function, counting the calls and the time spent.
+    """
+    def wrapper(self, other):
+        start = _perf_counter_ns()
+        try:
+            return func(self, other)
+        finally:
+            elapsed = _perf_counter_ns() - start
+            key = (cls_name, operator, type(other))
+            try:
+                c = _counts[key]
+            except KeyError:
+                _counts[key] = [1, elapsed]
+            else:
+                c[0] += 1
+                c[1] += elapsed
+
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+
+def instrumentation_enabled():
+    """
+    @rtype: bool
+    """
+    return bool(_originals)
+
+
+def enable_instrumentation():
+    """
+    Start counting the calls of the TimeDeltaEx and TimeEx operators,
+    and the time spent in them, per operand type.
+
+    The operator methods are replaced with the instrumented ones,
+    so that while the instrumentation is disabled,
+    there is no overhead at all.
+
+    >>> enable_instrumentation()
+    >>> TimeDeltaEx(seconds=5) * 2, TimeDeltaEx(seconds=1) * 0.5
+    (TimeDeltaEx(0, 10), TimeDeltaEx(0, 0, 500000))
+    >>> TimeEx(23) + TimeDeltaEx(hours=2)
+    TimeEx(1, 0)
+    >>> disable_instrumentation()
+    >>> TimeDeltaEx(seconds=5) * 3
+    TimeDeltaEx(0, 15)
+    >>> sorted((s.cls, s.operator, s.operand, s.calls, s.lossy)
+    ...            for s in instrumentation_report())
+    [('TimeDeltaEx', '__mul__', 'float', 1, True), ('TimeDeltaEx', '__mul__', 'int', 1, False), ('TimeEx', '__add__', 'TimeDeltaEx', 1, False)]
+    >>> reset_instrumentation(); instrumentation_report()
+    []
+    """
+    if _originals:
+        return
+    for cls in _INSTRUMENTED_CLASSES:
+        for operator in _OPERATORS:
+            func = cls.__dict__.get(operator)
+            if func is not None:
+                _originals[(cls, operator)] = func
+                setattr(cls, operator,
+                        _instrumented(cls.__name__, operator, func))
+
+
+def disable_instrumentation():
+    """
+    Restore the original operator methods; the counts are kept.
+    """
+    for (cls, operator), func in _originals.items():
+        setattr(cls, operator, func)
+    _originals.clear()
+
+
+def reset_instrumentation():
+    """
+    Forget all the counts.
+    """
+    _counts.clear()
+
+
+def instrumentation_report():
+    """
+    The statistics of every operator and operand type called,
+    the most time-consuming first.
+
+    @rtype: list
+    """
+    report = [OperatorStats(cls_name, operator, operand_type.__name__,
+                            calls, TimeDeltaEx.from_microseconds(ns // 1000),
+                            cls_name == "TimeDeltaEx" and
+                                _is_lossy(operator, operand_type))
+                  for (cls_name, operator, operand_type), (calls, ns)
+                      in list(_counts.items())]
+    report.sort(key=lambda s: s.total, reverse=True)
+    return report
+
+
+def print_instrumentation_report(file=None):
+    """
+    Print the instrumentation report as a table.
+
+    @param file: the file to print to (by default, sys.stdout).
+    """
+    if file is None:
+        file = sys.stdout
+    print("{0:<12s} {1:<14s} {2:<14s} {3:>10s} {4:>14s} {5:>10s}"
+              .format("class", "operator", "operand",
+                      "calls", "total, mus", "per call"),
+          file=file)
+    for s in instrumentation_report():
+        total_mus = s.total.in_microseconds
+        print("{0:<12s} {1:<14s} {2:<14s} {3:>10d} {4:>14d} {5:>10.3f}{6:s}"
+                  .format(s.cls, s.operator, s.operand, s.calls, total_mus,
+                          total_mus / s.calls, " lossy" if s.lossy else ""),
+              file=file)
+
+
+# Run unittests, if executed directly.
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
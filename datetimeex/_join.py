@@ -0,0 +1,317 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+import heapq
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import time, timedelta
+
+from _common import td_to_mus, MICROSECONDS_IN_DAY, _MUS_TYPECODE
+from _datetimeex import DateTimeEx
+from _timeex import TimeEx
+from _timedeltaex import TimeDeltaEx
+from _sorting import _KEYS, _time_key, keys_mus
+
+
+
+def asof_join(left, right, tolerance=None, allow_exact_matches=True):
+    """
+    The streaming as-of join: for every (timestamp, payload) pair
+    of the left stream, find the latest pair of the right stream
+    which is not later than it (e.g. the most recent quote
+    for every trade).
+
+    Both streams must be sorted by the timestamp; the timestamps
+    may be anything mus_key() accepts (e.g. DateTimeEx).
+    The join is done in a single pass, holding just a single
+    pair of the right stream in memory.
+
+    Yields the (left pair, right pair) tuples, for every left pair;
+    the right pair is None if there is no match (no right pair
+    earlier than the left one, or the latest one is further than
+    the tolerance away).
+
+    >>> quotes = [(DateTimeEx(2011, 3, 14, 10, 0), "q1"),
+    ...           (DateTimeEx(2011, 3, 14, 10, 5), "q2"),
+    ...           (DateTimeEx(2011, 3, 14, 11, 0), "q3")]
+    >>> trades = [(DateTimeEx(2011, 3, 14, 9, 59), "t1"),
+    ...           (DateTimeEx(2011, 3, 14, 10, 5), "t2"),
+    ...           (DateTimeEx(2011, 3, 14, 10, 30), "t3")]
+    >>> [(t[1], q and q[1]) for t, q in asof_join(trades, quotes)]
+    [('t1', None), ('t2', 'q2'), ('t3', 'q2')]
+    >>> [(t[1], q and q[1])
+    ...      for t, q in asof_join(trades, quotes,
+    ...                            tolerance=TimeDeltaEx(minutes=10),
+    ...                            allow_exact_matches=False)]
+    [('t1', None), ('t2', 'q1'), ('t3', None)]
+
+    @type left: collections.Iterable
+    @type right: collections.Iterable
+    @param tolerance: the maximum distance to the matching right pair.
+    @type tolerance: NoneType, timedelta
+    @param allow_exact_matches: whether the right pair with the same
+        timestamp as the left one matches (otherwise, only the strictly
+        earlier ones do).
+    @type allow_exact_matches: bool
+    @rtype: collections.Iterator
+    """
+    assert tolerance is None or isinstance(tolerance, timedelta), \
+           repr(tolerance)
+
+    tolerance_mus = None if tolerance is None else td_to_mus(tolerance)
+    keys = _KEYS
+    right = iter(right)
+
+    # The latest right pair matching so far, and the next one.
+    match = match_key = None
+    pending = next(right, None)
+    pending_key = None if pending is None \
+                       else keys[type(pending[0])](pending[0])
+
+    for pair in left:
+        key = keys[type(pair[0])](pair[0])
+        while pending is not None and \
+              (pending_key < key or
+               (allow_exact_matches and pending_key == key)):
+            match, match_key = pending, pending_key
+            pending = next(right, None)
+            if pending is not None:
+                pending_key = keys[type(pending[0])](pending[0])
+
+        if match is None or \
+           (tolerance_mus is not None and key - match_key > tolerance_mus):
+            yield (pair, None)
+        else:
+            yield (pair, match)
+
+
+def asof_indices_mus(left_keys, right_keys, tolerance=None,
+                     allow_exact_matches=True):
+    """
+    The bulk as-of join on the integer keys (e.g. the arrays
+    of microseconds, see keys_mus()): for every left key,
+    find the index of the latest right key not later than it,
+    using the binary search.
+
+    The right keys must be sorted; the left ones need not.
+
+    >>> right = keys_mus([DateTimeEx(2011, 3, 14, 10, 0),
+    ...                   DateTimeEx(2011, 3, 14, 10, 5),
+    ...                   DateTimeEx(2011, 3, 14, 11, 0)])
+    >>> left = keys_mus([DateTimeEx(2011, 3, 14, 9, 59),
+    ...                  DateTimeEx(2011, 3, 14, 10, 5),
+    ...                  DateTimeEx(2011, 3, 14, 10, 30)])
+    >>> list(asof_indices_mus(left, right))
+    [-1, 1, 1]
+    >>> list(asof_indices_mus(left, right, tolerance=TimeDeltaEx(minutes=10),
+    ...                       allow_exact_matches=False))
+    [-1, 0, -1]
+    >>> list(asof_indices_mus(iter(left), right, tolerance=TimeDeltaEx(minutes=10),
+    ...                       allow_exact_matches=False))
+    [-1, 0, -1]
+
+    @type left_keys: collections.Iterable
+    @type right_keys: collections.Sequence
+    @type tolerance: NoneType, timedelta
+    @type allow_exact_matches: bool
+    @return: the array of indices into right_keys, -1 for no match.
+    @rtype: array
+    """
+    assert tolerance is None or isinstance(tolerance, timedelta), \
+           repr(tolerance)
+
+    bisect = bisect_right if allow_exact_matches else bisect_left
+    if tolerance is None:
+        return array(_MUS_TYPECODE,
+                     [bisect(right_keys, key) - 1 for key in left_keys])
+
+    # The left keys are passed over just once, as they may be an iterator.
+    tolerance_mus = td_to_mus(tolerance)
+    indices = array(_MUS_TYPECODE)
+    for key in left_keys:
+        index = bisect(right_keys, key) - 1
+        if index >= 0 and key - right_keys[index] > tolerance_mus:
+            index = -1
+        indices.append(index)
+    return indices
+
+
+def _sweep(keyed, absolute, daily):
+    """
+    The sweep-line over the sorted (key, item) pairs, finding
+    the windows active at every key.
+
+    The absolute windows are the (start, end, index) tuples sorted
+    by the start; the daily ones are the (start offset since
+    the midnight, length, index) tuples sorted by the offset.
+    Every window is pushed to the heap (keyed by its end) once
+    the sweep reaches its start, and popped once it reaches its end;
+    the daily windows are pushed once for every day.
+
+    Yields the (item, sorted list of the active window indices) pairs,
+    for the items within any window.
+    """
+    heap = []
+    heappush, heappop = heapq.heappush, heapq.heappop
+    absolute_pos, absolute_len = 0, len(absolute)
+    daily_pos, daily_len = 0, len(daily)
+    day = previous = None
+
+    for key, item in keyed:
+        if previous is not None and key < previous:
+            raise ValueError("The events are not sorted")
+        previous = key
+
+        while absolute_pos < absolute_len and \
+              absolute[absolute_pos][0] <= key:
+            start, end, index = absolute[absolute_pos]
+            heappush(heap, (end, index))
+            absolute_pos += 1
+
+        if daily_len:
+            # The windows started before the previous day
+            # have certainly ended.
+            first_day = key // MICROSECONDS_IN_DAY - 1
+            if day is None or day < first_day:
+                day, daily_pos = first_day, 0
+            while True:
+                offset, length, index = daily[daily_pos]
+                start = day * MICROSECONDS_IN_DAY + offset
+                if start > key:
+                    break
+                heappush(heap, (start + length, index))
+                daily_pos += 1
+                if daily_pos == daily_len:
+                    day, daily_pos = day + 1, 0
+
+        while heap and heap[0][0] <= key:
+            heappop(heap)
+        if heap:
+            yield (item, sorted(index for end, index in heap))
+
+
+def window_join(events, windows):
+    """
+    The streaming interval join: for every (timestamp, payload) pair
+    of the events stream, find all the windows active at its timestamp
+    (e.g. the shifts or the maintenance windows).
+
+    The events must be sorted by the timestamp (anything mus_key()
+    accepts, e.g. DateTimeEx); they are processed in a single pass,
+    never held in memory. The windows are the sequences whose first
+    two items are the start and the end of the half-open interval
+    (the rest, e.g. the label, is up to the caller); they are either
+    absolute (datetime.datetime ends, e.g. DateTimeEx),
+    or recurring daily (datetime.time ends, e.g. TimeEx).
+    The daily window whose end is not later than the start wraps
+    past the midnight, the same way TimeEx + timedelta does
+    (so the equal ends make the whole day).
+    The aware timestamps and times are normalized to UTC.
+
+    The sweep-line keeps the active windows in a heap keyed by their
+    end, so the join takes O((n + m) log m) time (plus the output,
+    and plus a heap push of every daily window for every day
+    the events span).
+
+    Yields the (event pair, window) tuples for every match,
+    in the order of the events, and then in the order of the windows.
+
+    >>> windows = [(TimeEx(22), TimeEx(6), "night shift"),
+    ...            (TimeEx(6), TimeEx(22), "day shift"),
+    ...            (DateTimeEx(2011, 3, 14, 23), DateTimeEx(2011, 3, 15, 1),
+    ...             "maintenance")]
+    >>> events = [(DateTimeEx(2011, 3, 14, 5, 59), "e1"),
+    ...           (DateTimeEx(2011, 3, 14, 6, 0), "e2"),
+    ...           (DateTimeEx(2011, 3, 14, 23, 30), "e3"),
+    ...           (DateTimeEx(2011, 3, 17, 0, 30), "e4")]
+    >>> for event, window in window_join(events, windows):
+    ...     print("{0} {1}".format(event[1], window[2]))
+    e1 night shift
+    e2 day shift
+    e3 night shift
+    e3 maintenance
+    e4 night shift
+
+    @type events: collections.Iterable
+    @type windows: collections.Sequence
+    @rtype: collections.Iterator
+    """
+    windows = list(windows)
+    absolute, daily = _prepare_windows(windows)
+    keys = _KEYS
+    for event, indices in _sweep(((keys[type(event[0])](event[0]), event)
+                                      for event in events),
+                                 absolute, daily):
+        for index in indices:
+            yield (event, windows[index])
+
+
+def _prepare_windows(windows):
+    """
+    Split the windows to the absolute and the daily ones,
+    as _sweep() expects them.
+
+    >>> _prepare_windows([(TimeEx(22), TimeEx(6)), (TimeEx(6), TimeEx(6)),
+    ...                   (5, 10), (DateTimeEx(1, 1, 1), DateTimeEx(1, 1, 1))])
+    ([(5, 10, 2)], [(21600000000, 86400000000, 1), (79200000000, 28800000000, 0)])
+    """
+    absolute = []
+    daily = []
+    for index, window in enumerate(windows):
+        start, end = window[0], window[1]
+        if isinstance(start, time):
+            assert isinstance(end, time), repr(window)
+            offset = _time_key(start) % MICROSECONDS_IN_DAY
+            length = (_time_key(end) - offset) % MICROSECONDS_IN_DAY
+            daily.append((offset, length or MICROSECONDS_IN_DAY, index))
+        else:
+            start = _KEYS[type(start)](start)
+            end = _KEYS[type(end)](end)
+            # The empty windows never match.
+            if start < end:
+                absolute.append((start, end, index))
+    absolute.sort()
+    daily.sort()
+    return absolute, daily
+
+
+def window_indices_mus(keys, starts, ends):
+    """
+    The bulk interval join on the integer keys (e.g. the arrays
+    of microseconds, see keys_mus()): for every key, find the indices
+    of the half-open [start, end) windows containing it,
+    with the same sweep-line as window_join() uses.
+
+    The keys must be sorted; the windows need not.
+
+    >>> events, windows = window_indices_mus(array(_MUS_TYPECODE, [1, 5, 7, 20]),
+    ...                                      [0, 5, 30], [6, 8, 40])
+    >>> list(events), list(windows)
+    ([0, 1, 1, 2], [0, 0, 1, 1])
+
+    @type keys: collections.Iterable
+    @type starts: collections.Sequence
+    @type ends: collections.Sequence
+    @return: the arrays of the key indices and the window indices,
+        for every match.
+    @rtype: tuple
+    """
+    assert len(starts) == len(ends), (len(starts), len(ends))
+
+    absolute = sorted((start, end, index)
+                          for index, (start, end) in enumerate(zip(starts, ends))
+                          if start < end)
+    key_indices = array(_MUS_TYPECODE)
+    window_indices = array(_MUS_TYPECODE)
+    for i, indices in _sweep(((key, i) for i, key in enumerate(keys)),
+                             absolute, []):
+        key_indices.extend([i] * len(indices))
+        window_indices.extend(indices)
+    return key_indices, window_indices
+
+
+# Run unittests, if executed directly.
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,331 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+import numbers, threading
+from collections import deque
+from datetime import timedelta
+
+from _common import td_to_mus, _monotonic_mus
+from _timedeltaex import TimeDeltaEx
+
+
+
+class TokenBucket(object):
+    """
+    The token bucket rate limiter, for any number of independent keys.
+
+    The bucket of every key holds up to capacity tokens, and is refilled
+    by rate tokens per the given duration. The refill is calculated lazily,
+    whenever the key is accessed, using the exact integer arithmetic:
+    the tokens are stored scaled by the refill duration in microseconds,
+    so that no rounding (and no drift) ever happens.
+    The state of every key is just two integers (the scaled tokens
+    and the time of the last access).
+
+    The clock is a function returning the current time as the integer
+    microseconds (by default, the monotonic clock).
+
+    >>> now = [0]
+    >>> bucket = TokenBucket(3, TimeDeltaEx(seconds=1), clock=lambda: now[0])
+    >>> [bucket.acquire("alice") for i in range(4)]
+    [True, True, True, False]
+    >>> bucket.acquire("bob")
+    True
+    >>> bucket.retry_after("alice")
+    TimeDeltaEx(0, 0, 333334)
+    >>> now[0] += 333333; bucket.acquire("alice")
+    False
+    >>> now[0] += 1; bucket.acquire("alice")
+    True
+    >>> bucket.tokens("alice")
+    Fraction(1, 500000)
+    """
+
+    def __init__(self, rate, per, capacity=None, clock=_monotonic_mus,
+                 thread_safe=False):
+        """
+        @param rate: the number of tokens added to the bucket per the duration.
+        @type rate: numbers.Integral
+        @type per: timedelta
+        @param capacity: the maximum number of tokens in the bucket
+            (by default, equal to rate).
+        @type capacity: NoneType, numbers.Integral
+        @type clock: collections.Callable
+        @param thread_safe: whether the limiter may be used from several
+            threads simultaneously.
+        @type thread_safe: bool
+        """
+        assert isinstance(rate, numbers.Integral) and rate > 0, repr(rate)
+        assert isinstance(per, timedelta) and per > timedelta(0), repr(per)
+        assert capacity is None or \
+               (isinstance(capacity, numbers.Integral) and capacity > 0), \
+               repr(capacity)
+
+        self.rate = rate
+        self.per = TimeDeltaEx.from_timedelta(per)
+        self.capacity = rate if capacity is None else capacity
+        self._clock = clock
+        self._lock = threading.Lock() if thread_safe else None
+        # A single token is per_mus units; rate units are refilled
+        # per microsecond.
+        self._token_units = td_to_mus(per)
+        self._capacity_units = self.capacity * self._token_units
+        # {key: (units, last access time)}
+        self._state = {}
+
+
+    def __len__(self):
+        """
+        The number of keys tracked.
+        """
+        return len(self._state)
+
+
+    def acquire(self, key, tokens=1):
+        """
+        Try to take the tokens from the bucket of the key.
+
+        @type tokens: numbers.Integral
+        @return: whether the tokens have been taken.
+        @rtype: bool
+        """
+        if self._lock is None:
+            return self._acquire(key, tokens)
+        else:
+            with self._lock:
+                return self._acquire(key, tokens)
+
+
+    def _acquire(self, key, tokens):
+        now = self._clock()
+        units = self._refill(key, now)
+        cost = tokens * self._token_units
+        if units >= cost:
+            self._state[key] = (units - cost, now)
+            return True
+        else:
+            self._state[key] = (units, now)
+            return False
+
+
+    def retry_after(self, key, tokens=1):
+        """
+        Find how long to wait until the tokens become available
+        (rounded up to the whole microseconds).
+
+        @type tokens: numbers.Integral
+        @rtype: TimeDeltaEx
+        """
+        assert tokens <= self.capacity, repr(tokens)
+
+        deficit = tokens * self._token_units - self._refill(key, self._clock())
+        if deficit <= 0:
+            return TimeDeltaEx(0)
+        wait, remainder = divmod(deficit, self.rate)
+        return TimeDeltaEx.from_microseconds(wait + 1 if remainder else wait)
+
+
+    def tokens(self, key):
+        """
+        The exact number of the tokens currently in the bucket of the key.
+
+        @rtype: numbers.Rational
+        """
+        return TimeDeltaEx.from_microseconds(self._refill(key, self._clock())) / \
+               self.per
+
+
+    def prune(self):
+        """
+        Forget the keys whose buckets are full (these are equivalent
+        to the keys never seen), to reclaim the memory.
+
+        @return: the number of the keys forgotten.
+        @rtype: numbers.Integral
+        """
+        now = self._clock()
+        full = [key for key in self._state
+                    if self._refill(key, now) >= self._capacity_units]
+        for key in full:
+            del self._state[key]
+        return len(full)
+
+
+    def _refill(self, key, now):
+        """
+        The scaled number of the tokens in the bucket of the key
+        at the moment now.
+
+        @rtype: numbers.Integral
+        """
+        try:
+            units, last = self._state[key]
+        except KeyError:
+            return self._capacity_units
+        units += (now - last) * self.rate
+        return units if units < self._capacity_units else self._capacity_units
+
+
+class SlidingLogRateLimiter(object):
+    """
+    The sliding log rate limiter, for any number of independent keys:
+    no more than limit events are allowed within any window
+    of the given duration.
+
+    Unlike TokenBucket, this limiter is exact for any window,
+    but it keeps the times of up to limit events per key.
+
+    >>> now = [0]
+    >>> limiter = SlidingLogRateLimiter(2, TimeDeltaEx(seconds=1), clock=lambda: now[0])
+    >>> limiter.acquire("alice"), limiter.acquire("alice"), limiter.acquire("alice")
+    (True, True, False)
+    >>> limiter.retry_after("alice")
+    TimeDeltaEx(0, 1)
+    >>> now[0] += 1000000; limiter.acquire("alice")
+    True
+    """
+
+    def __init__(self, limit, window, clock=_monotonic_mus, thread_safe=False):
+        """
+        @type limit: numbers.Integral
+        @type window: timedelta
+        @type clock: collections.Callable
+        @type thread_safe: bool
+        """
+        assert isinstance(limit, numbers.Integral) and limit > 0, repr(limit)
+        assert isinstance(window, timedelta) and window > timedelta(0), \
+               repr(window)
+
+        self.limit = limit
+        self.window = TimeDeltaEx.from_timedelta(window)
+        self._window_mus = td_to_mus(window)
+        self._clock = clock
+        self._lock = threading.Lock() if thread_safe else None
+        # {key: deque of the event times}
+        self._logs = {}
+
+
+    def __len__(self):
+        """
+        The number of keys tracked.
+        """
+        return len(self._logs)
+
+
+    def acquire(self, key):
+        """
+        Try to register an event for the key.
+
+        @return: whether the event is allowed.
+        @rtype: bool
+        """
+        if self._lock is None:
+            return self._acquire(key)
+        else:
+            with self._lock:
+                return self._acquire(key)
+
+
+    def _acquire(self, key):
+        now = self._clock()
+        log = self._logs.get(key)
+        if log is None:
+            self._logs[key] = deque([now])
+            return True
+        self._expire(log, now)
+        if len(log) < self.limit:
+            log.append(now)
+            return True
+        else:
+            return False
+
+
+    def retry_after(self, key):
+        """
+        Find how long to wait until the next event is allowed.
+
+        >>> now = [0]
+        >>> limiter = SlidingLogRateLimiter(1, TimeDeltaEx(seconds=1), clock=lambda: now[0])
+        >>> limiter.retry_after("bob"), len(limiter)
+        (TimeDeltaEx(0), 0)
+
+        @rtype: TimeDeltaEx
+        """
+        if self._lock is None:
+            return self._retry_after(key)
+        else:
+            with self._lock:
+                return self._retry_after(key)
+
+
+    def _retry_after(self, key):
+        now = self._clock()
+        log = self._logs.get(key)
+        if log is None:
+            return TimeDeltaEx(0)
+        self._expire(log, now)
+        if not log:
+            del self._logs[key]
+        if len(log) < self.limit:
+            return TimeDeltaEx(0)
+        else:
+            return TimeDeltaEx.from_microseconds(log[0] + self._window_mus - now)
+
+
+    def prune(self, now=None):
+        """
+        Forget the keys with no events left within the window
+        (these are equivalent to the keys never seen), to reclaim the memory.
+
+        >>> now = [0]
+        >>> limiter = SlidingLogRateLimiter(2, TimeDeltaEx(seconds=1), clock=lambda: now[0])
+        >>> limiter.acquire("alice"), limiter.acquire("bob")
+        (True, True)
+        >>> now[0] += 500000; limiter.acquire("bob")
+        True
+        >>> now[0] += 500000; limiter.prune(), len(limiter)
+        (1, 1)
+
+        @param now: the current time, in the microseconds of the clock
+            (by default, the clock is read).
+        @type now: NoneType, numbers.Integral
+        @return: the number of the keys forgotten.
+        @rtype: numbers.Integral
+        """
+        if self._lock is None:
+            return self._prune(now)
+        else:
+            with self._lock:
+                return self._prune(now)
+
+
+    def _prune(self, now):
+        if now is None:
+            now = self._clock()
+        expire = self._expire
+        empty = [key for key, log in self._logs.items()
+                     if not expire(log, now)]
+        for key in empty:
+            del self._logs[key]
+        return len(empty)
+
+
+    def _expire(self, log, now):
+        """
+        Remove the events out of the window from the log.
+
+        @type log: deque
+        @return: the log.
+        @rtype: deque
+        """
+        threshold = now - self._window_mus
+        while log and log[0] <= threshold:
+            log.popleft()
+        return log
+
+
+# Run unittests, if executed directly.
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,178 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from datetime import datetime, time, timedelta
+
+from _common import (MICROSECONDS_IN_DAY,
+                     t_to_mus, td_to_mus, dt_to_mus)
+from _datetimeex import DateTimeEx
+from _timeex import TimeEx
+from _timedeltaex import TimeDeltaEx
+
+
+
+class IntervalRule(object):
+    """
+    The recurrence rule "every N (minutes, seconds, etc) between
+    the start and the end time of every day".
+
+    The rule fires at start, start + every, start + 2 * every, etc,
+    as long as the time is before the end (the end itself is excluded).
+    The daily window may wrap past midnight (if end is earlier than start);
+    if start and end are equal, the window is the whole day.
+    Either way, the firing sequence restarts at the start time every day.
+
+    The next and the previous occurrences are calculated arithmetically,
+    without iterating over the intermediate ones.
+    The instants are interpreted by their wall clock readings;
+    the tzinfo of the instant is preserved in the result.
+
+    >>> rule = IntervalRule(TimeDeltaEx(minutes=15), TimeEx(8), TimeEx(20))
+    >>> rule
+    IntervalRule(TimeDeltaEx(0, 900), TimeEx(8, 0), TimeEx(20, 0))
+    >>> rule.next_after(DateTimeEx(2011, 3, 14, 3, 0))
+    DateTimeEx(2011, 3, 14, 8, 0)
+    >>> rule.next_after(DateTimeEx(2011, 3, 14, 9, 7))
+    DateTimeEx(2011, 3, 14, 9, 15)
+    >>> rule.next_after(DateTimeEx(2011, 3, 14, 9, 15))
+    DateTimeEx(2011, 3, 14, 9, 30)
+    >>> rule.next_after(DateTimeEx(2011, 3, 14, 19, 45))
+    DateTimeEx(2011, 3, 15, 8, 0)
+    >>> rule.previous_before(DateTimeEx(2011, 3, 15, 8, 0))
+    DateTimeEx(2011, 3, 14, 19, 45)
+
+    >>> night_rule = IntervalRule(TimeDeltaEx(hours=1), TimeEx(22), TimeEx(2))
+    >>> night_rule.next_after(DateTimeEx(2011, 3, 14, 23, 30))
+    DateTimeEx(2011, 3, 15, 0, 0)
+    >>> night_rule.next_after(DateTimeEx(2011, 3, 15, 1, 30))
+    DateTimeEx(2011, 3, 15, 22, 0)
+    >>> night_rule.previous_before(DateTimeEx(2011, 3, 15, 12, 0))
+    DateTimeEx(2011, 3, 15, 1, 0)
+    """
+    __slots__ = ("every", "start", "end",
+                 "_every_mus", "_start_mus", "_length_mus", "_last_mus")
+
+
+    def __init__(self, every, start=TimeEx(0), end=TimeEx(0)):
+        """
+        @type every: timedelta
+        @type start: time
+        @type end: time
+        """
+        assert isinstance(every, timedelta) and every > timedelta(0), \
+               repr(every)
+        assert isinstance(start, time), repr(start)
+        assert isinstance(end, time), repr(end)
+
+        self.every = TimeDeltaEx.from_timedelta(every)
+        self.start = TimeEx.from_time(start)
+        self.end = TimeEx.from_time(end)
+
+        self._every_mus = td_to_mus(every)
+        self._start_mus = t_to_mus(start)
+        self._length_mus = (t_to_mus(end) - self._start_mus) % MICROSECONDS_IN_DAY \
+                               or MICROSECONDS_IN_DAY
+        # The offset of the last occurrence from the window start.
+        self._last_mus = (self._length_mus - 1) // self._every_mus * self._every_mus
+
+
+    def __repr__(self):
+        return "IntervalRule({0!r}, {1!r}, {2!r})"\
+                   .format(self.every, self.start, self.end)
+
+
+    def next_after(self, instant):
+        """
+        Find the earliest occurrence strictly after the instant.
+
+        @type instant: datetime
+        @rtype: DateTimeEx
+        """
+        assert isinstance(instant, datetime), repr(instant)
+
+        return DateTimeEx.from_microseconds(self.next_after_mus(dt_to_mus(instant)),
+                                            tzinfo=instant.tzinfo)
+
+
+    def previous_before(self, instant):
+        """
+        Find the latest occurrence strictly before the instant.
+
+        @type instant: datetime
+        @rtype: DateTimeEx
+        """
+        assert isinstance(instant, datetime), repr(instant)
+
+        return DateTimeEx.from_microseconds(self.previous_before_mus(dt_to_mus(instant)),
+                                            tzinfo=instant.tzinfo)
+
+
+    def next_after_mus(self, microseconds):
+        """
+        Find the earliest occurrence strictly after the instant,
+        with both given in microseconds elapsed Anno Domini.
+
+        >>> IntervalRule(TimeDeltaEx(hours=5)).next_after_mus(0)
+        18000000000
+
+        @type microseconds: numbers.Integral
+        @rtype: numbers.Integral
+        """
+        # The window containing (or preceding) the instant starts at
+        # window_start; the instant is offset from it.
+        day, offset = divmod(microseconds - self._start_mus, MICROSECONDS_IN_DAY)
+        window_start = day * MICROSECONDS_IN_DAY + self._start_mus
+        if offset < self._last_mus:
+            return window_start + (offset // self._every_mus + 1) * self._every_mus
+        else:
+            return window_start + MICROSECONDS_IN_DAY
+
+
+    def previous_before_mus(self, microseconds):
+        """
+        Find the latest occurrence strictly before the instant,
+        with both given in microseconds elapsed Anno Domini.
+
+        >>> IntervalRule(TimeDeltaEx(hours=5)).previous_before_mus(18000000000)
+        0
+
+        @type microseconds: numbers.Integral
+        @rtype: numbers.Integral
+        """
+        day, offset = divmod(microseconds - 1 - self._start_mus,
+                             MICROSECONDS_IN_DAY)
+        window_start = day * MICROSECONDS_IN_DAY + self._start_mus
+        if offset < self._last_mus:
+            return window_start + offset // self._every_mus * self._every_mus
+        else:
+            return window_start + self._last_mus
+
+
+def next_fire_times(rules, instant):
+    """
+    Find the earliest occurrence strictly after the instant
+    for every rule.
+
+    >>> rules = [IntervalRule(TimeDeltaEx(minutes=15), TimeEx(8), TimeEx(20)),
+    ...          IntervalRule(TimeDeltaEx(hours=1), TimeEx(22), TimeEx(2))]
+    >>> next_fire_times(rules, DateTimeEx(2011, 3, 14, 21, 0))
+    [DateTimeEx(2011, 3, 15, 8, 0), DateTimeEx(2011, 3, 14, 22, 0)]
+
+    @type rules: collections.Iterable
+    @type instant: datetime
+    @rtype: list
+    """
+    assert isinstance(instant, datetime), repr(instant)
+
+    microseconds = dt_to_mus(instant)
+    tzinfo = instant.tzinfo
+    return [DateTimeEx.from_microseconds(rule.next_after_mus(microseconds),
+                                         tzinfo=tzinfo)
+                for rule in rules]
+
+
+# Run unittests, if executed directly.
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
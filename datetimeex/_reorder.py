@@ -0,0 +1,208 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+import heapq, numbers
+from datetime import timedelta
+
+from _common import td_to_mus
+from _datetimeex import DateTimeEx
+from _timedeltaex import TimeDeltaEx
+from _sorting import _KEYS
+from _tzinfo import fixed_offset
+
+
+
+class ReorderBuffer(object):
+    """
+    The buffer restoring the timestamp order of the slightly
+    out-of-order stream of the (datetime.datetime, payload) events.
+
+    The watermark trails the latest timestamp seen by max_lateness:
+    no event earlier than the watermark is expected any more, so all
+    the buffered events up to it are released in the timestamp order
+    (those with equal timestamps, in the order of arrival).
+    The events arriving behind the watermark are late: they are
+    dropped (and counted), or passed to on_late callback, if given.
+
+    The events are held in a heap keyed by the integer microseconds
+    (see mus_key(); the aware timestamps are normalized to UTC),
+    so pushing an event is O(log n). If max_size is given and the buffer
+    overflows, the earliest event is released before its time,
+    advancing the watermark to it; so the memory is bounded
+    even if the timestamps jump backwards.
+
+    >>> buf = ReorderBuffer(TimeDeltaEx(seconds=5))
+    >>> buf.push(DateTimeEx(2011, 3, 14, 12, 0, 3), "a")
+    []
+    >>> buf.push(DateTimeEx(2011, 3, 14, 12, 0, 1), "b")
+    []
+    >>> [p for dt, p in buf.push(DateTimeEx(2011, 3, 14, 12, 0, 7), "c")]
+    ['b']
+    >>> buf.watermark
+    DateTimeEx(2011, 3, 14, 12, 0, 2)
+    >>> buf.push(DateTimeEx(2011, 3, 14, 12, 0, 0), "too late")
+    []
+    >>> [p for dt, p in buf.flush()], buf.late, len(buf)
+    (['a', 'c'], 1, 0)
+
+    >>> late = []
+    >>> buf = ReorderBuffer(TimeDeltaEx(seconds=5), max_size=2,
+    ...                     on_late=lambda dt, p: late.append(p))
+    >>> for second, p in [(10, "a"), (9, "b"), (8, "c"), (7, "d")]:
+    ...     print([p for dt, p in buf.push(DateTimeEx(2011, 3, 14, 12, 0, second), p)])
+    []
+    []
+    ['c']
+    []
+    >>> late, buf.forced
+    (['d'], 1)
+    """
+
+    def __init__(self, max_lateness, max_size=None, on_late=None):
+        """
+        @param max_lateness: how far behind the latest timestamp seen
+            the events are still accepted.
+        @type max_lateness: timedelta
+        @param max_size: the maximum number of the buffered events
+            (None for unlimited).
+        @type max_size: NoneType, numbers.Integral
+        @param on_late: the callable to call with the timestamp
+            and the payload of every late event (None to drop them).
+        @type on_late: NoneType, collections.Callable
+        """
+        assert isinstance(max_lateness, timedelta) and \
+               max_lateness >= timedelta(0), \
+               repr(max_lateness)
+        assert max_size is None or \
+               (isinstance(max_size, numbers.Integral) and max_size > 0), \
+               repr(max_size)
+
+        self.max_lateness = TimeDeltaEx.from_timedelta(max_lateness)
+        self.max_size = max_size
+        self.on_late = on_late
+        self._max_lateness_mus = td_to_mus(max_lateness)
+        # [(microseconds, sequence number, timestamp, payload)]
+        self._heap = []
+        self._seq = 0
+        # The watermark, in microseconds; None until the first event.
+        self._watermark_mus = None
+        # Whether the keys are in UTC (i.e. the timestamps are aware).
+        self._aware = False
+
+        self.late = 0
+        self.forced = 0
+
+
+    def __len__(self):
+        """
+        The number of the buffered events.
+        """
+        return len(self._heap)
+
+
+    @property
+    def watermark(self):
+        """
+        The watermark: the events earlier than it are late
+        (None until the first event).
+        For the aware timestamps, it is in UTC.
+
+        @rtype: NoneType, DateTimeEx
+        """
+        if self._watermark_mus is None:
+            return None
+        return DateTimeEx.from_microseconds(
+                   self._watermark_mus,
+                   tzinfo=fixed_offset(timedelta(0)) if self._aware else None)
+
+
+    def push(self, dt, payload=None):
+        """
+        Add the event, and release the events which the watermark
+        has passed.
+
+        @type dt: datetime
+        @return: the list of the released (timestamp, payload) pairs,
+            in the timestamp order.
+        @rtype: list
+        """
+        mus = _KEYS[type(dt)](dt)
+        watermark = self._watermark_mus
+        if watermark is None:
+            self._aware = dt.utcoffset() is not None
+        elif mus < watermark:
+            self.late += 1
+            if self.on_late is not None:
+                self.on_late(dt, payload)
+            return []
+
+        heap = self._heap
+        heapq.heappush(heap, (mus, self._seq, dt, payload))
+        self._seq += 1
+
+        candidate = mus - self._max_lateness_mus
+        if watermark is None or candidate > watermark:
+            self._watermark_mus = watermark = candidate
+
+        released = []
+        while heap and heap[0][0] <= watermark:
+            mus, seq, dt, payload = heapq.heappop(heap)
+            released.append((dt, payload))
+
+        if self.max_size is not None and len(heap) > self.max_size:
+            mus, seq, dt, payload = heapq.heappop(heap)
+            released.append((dt, payload))
+            self._watermark_mus = mus
+            self.forced += 1
+        return released
+
+
+    def flush(self):
+        """
+        Release all the buffered events (e.g. at the end of the stream);
+        the watermark is kept, so the events behind it are still late.
+
+        @return: the list of the (timestamp, payload) pairs,
+            in the timestamp order.
+        @rtype: list
+        """
+        heap = self._heap
+        released = [heapq.heappop(heap)[2:] for i in range(len(heap))]
+        if released:
+            last = released[-1][0]
+            self._watermark_mus = max(self._watermark_mus,
+                                      _KEYS[type(last)](last))
+        return released
+
+
+def reorder(events, max_lateness, max_size=None, on_late=None):
+    """
+    Restore the timestamp order of the slightly out-of-order stream
+    of the (datetime.datetime, payload) events lazily, using
+    the ReorderBuffer; the buffered events are released
+    in the end of the stream.
+
+    >>> events = [(DateTimeEx(2011, 3, 14, 12, 0, s), s) for s in (3, 1, 2, 9, 0, 8)]
+    >>> [p for dt, p in reorder(events, TimeDeltaEx(seconds=2))]
+    [1, 2, 3, 8, 9]
+
+    @type events: collections.Iterable
+    @type max_lateness: timedelta
+    @type max_size: NoneType, numbers.Integral
+    @type on_late: NoneType, collections.Callable
+    @rtype: collections.Iterator
+    """
+    buf = ReorderBuffer(max_lateness, max_size, on_late)
+    push = buf.push
+    for dt, payload in events:
+        for event in push(dt, payload):
+            yield event
+    for event in buf.flush():
+        yield event
+
+
+# Run unittests, if executed directly.
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
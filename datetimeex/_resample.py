@@ -0,0 +1,183 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from array import array
+from datetime import datetime, timedelta
+from itertools import chain, groupby
+
+from _common import td_to_mus, dt_to_mus, _MUS_TYPECODE
+from _datetimeex import DateTimeEx
+from _timedeltaex import TimeDeltaEx
+
+
+
+def _last(values):
+    return values[-1]
+
+
+def _first(values):
+    return values[0]
+
+
+def _mean(values):
+    return sum(values) / len(values)
+
+
+# The aggregations of the values falling into a single grid slot.
+_AGGREGATIONS = {"last": _last,
+                 "first": _first,
+                 "sum": sum,
+                 "count": len,
+                 "mean": _mean,
+                 "min": min,
+                 "max": max}
+
+# The values of the empty slots, for the aggregations
+# which have a natural one.
+_EMPTY_VALUES = {"sum": 0, "count": 0}
+
+_FILLS = (None, "ffill", "interpolate")
+
+
+def resample(samples, every, how="last", fill=None, origin=None):
+    """
+    Resample the irregular time series to the grid of the given step,
+    lazily.
+
+    The samples are the (timestamp, value) pairs sorted
+    by the datetime.datetime timestamp (interpreted by its wall clock
+    readings; the tzinfo of the first sample is preserved in the result).
+    Every sample falls into the grid slot found by the integer
+    floor division of the microseconds; the values of each slot
+    are aggregated (how is one of "last", "first", "sum", "count",
+    "mean", "min", "max").
+
+    Yields the (slot start, aggregated value) pairs, for every slot
+    from the first sample to the last one. The value of the empty slot
+    is 0 for "sum" and "count", and otherwise None, unless fill is
+    "ffill" (the value of the previous non-empty slot is repeated)
+    or "interpolate" (linearly interpolated between the neighbouring
+    non-empty slots; the empty slots are held until the next sample).
+
+    >>> samples = [(DateTimeEx(2011, 3, 14, 12, 0, 3), 1.0),
+    ...            (DateTimeEx(2011, 3, 14, 12, 0, 9), 3.0),
+    ...            (DateTimeEx(2011, 3, 14, 12, 0, 47), 7.0)]
+    >>> for slot, value in resample(samples, TimeDeltaEx(seconds=15), "mean"):
+    ...     print("{0} {1}".format(slot.time(), value))
+    12:00:00 2.0
+    12:00:15 None
+    12:00:30 None
+    12:00:45 7.0
+    >>> [value for slot, value in resample(samples, TimeDeltaEx(seconds=15),
+    ...                                    "mean", fill="ffill")]
+    [2.0, 2.0, 2.0, 7.0]
+    >>> [value for slot, value in resample(samples, TimeDeltaEx(seconds=15),
+    ...                                    "mean", fill="interpolate")]
+    [2.0, 3.666666666666667, 5.333333333333334, 7.0]
+    >>> [value for slot, value in resample(samples, TimeDeltaEx(seconds=15),
+    ...                                    "count")]
+    [2, 0, 0, 1]
+
+    @type samples: collections.Iterable
+    @param every: the step of the grid.
+    @type every: timedelta
+    @type how: str
+    @type fill: NoneType, str
+    @param origin: the instant the grid is aligned to (by default,
+        0001-01-01 00:00:00, so that e.g. the minute-long slots
+        start at the whole minutes).
+    @type origin: NoneType, datetime
+    @rtype: collections.Iterator
+    """
+    assert isinstance(every, timedelta) and every > timedelta(0), repr(every)
+    assert origin is None or isinstance(origin, datetime), repr(origin)
+
+    samples = iter(samples)
+    for first in samples:
+        break
+    else:
+        return
+
+    tzinfo = first[0].tzinfo
+    pairs_mus = ((dt_to_mus(dt), value)
+                     for dt, value in chain([first], samples))
+    for slot_mus, value in _resample_mus(pairs_mus, td_to_mus(every),
+                                         0 if origin is None
+                                           else dt_to_mus(origin),
+                                         how, fill):
+        yield (DateTimeEx.from_microseconds(slot_mus, tzinfo=tzinfo), value)
+
+
+def resample_mus(keys, values, every, how="last", fill=None, origin=0):
+    """
+    Resample the columnar time series (the sorted integer keys,
+    e.g. the microseconds, and the values) to the grid
+    of the given step; see resample().
+
+    >>> keys = array(_MUS_TYPECODE, [3000000, 9000000, 47000000])
+    >>> slots, means = resample_mus(keys, [1.0, 3.0, 7.0],
+    ...                             TimeDeltaEx(seconds=15), "mean")
+    >>> list(slots), means
+    ([0, 15000000, 30000000, 45000000], [2.0, None, None, 7.0])
+
+    @type keys: collections.Sequence
+    @type values: collections.Sequence
+    @type every: timedelta
+    @type how: str
+    @type fill: NoneType, str
+    @param origin: the key the grid is aligned to.
+    @type origin: numbers.Integral
+    @return: the array of the slot starts, and the list of the values.
+    @rtype: tuple
+    """
+    assert isinstance(every, timedelta) and every > timedelta(0), repr(every)
+    assert len(keys) == len(values), (len(keys), len(values))
+
+    slots = array(_MUS_TYPECODE)
+    result = []
+    for slot_mus, value in _resample_mus(zip(keys, values), td_to_mus(every),
+                                         origin, how, fill):
+        slots.append(slot_mus)
+        result.append(value)
+    return slots, result
+
+
+def _resample_mus(pairs_mus, every_mus, origin_mus, how, fill):
+    """
+    Resample the (microseconds, value) pairs, yielding
+    the (slot start in microseconds, aggregated value) pairs.
+    """
+    assert how in _AGGREGATIONS, repr(how)
+    assert fill in _FILLS, repr(fill)
+
+    aggregate = _AGGREGATIONS[how]
+    empty_value = _EMPTY_VALUES.get(how)
+
+    previous_slot = previous_value = None
+    for slot, group in groupby(pairs_mus,
+                               lambda pair: (pair[0] - origin_mus) // every_mus):
+        value = aggregate([v for mus, v in group])
+        if previous_slot is not None:
+            if slot <= previous_slot:
+                raise ValueError("The samples are not sorted")
+            gap = slot - previous_slot
+            for i in range(1, gap):
+                if empty_value is not None:
+                    filled = empty_value
+                elif fill == "ffill":
+                    filled = previous_value
+                elif fill == "interpolate":
+                    filled = previous_value + \
+                             (value - previous_value) * i / gap
+                else:
+                    filled = None
+                yield (origin_mus + (previous_slot + i) * every_mus, filled)
+        yield (origin_mus + slot * every_mus, value)
+        previous_slot, previous_value = slot, value
+
+
+# Run unittests, if executed directly.
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
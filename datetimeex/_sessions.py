@@ -0,0 +1,195 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+import operator
+from array import array
+from collections import namedtuple, OrderedDict
+from datetime import timedelta
+from itertools import compress, islice, repeat
+try:
+    from itertools import imap
+except ImportError:
+    # Python 3.x
+    imap = map
+
+from _common import td_to_mus, _MUS_TYPECODE, _move_to_end
+from _datetimeex import DateTimeEx
+from _timedeltaex import TimeDeltaEx
+
+
+
+class Session(namedtuple("Session", "start end count duration")):
+    """
+    The session of activity: the timestamps of its first and last events
+    (the very objects given), the number of the events,
+    and the duration (end - start).
+    """
+    __slots__ = ()
+
+
+_ZERO = timedelta(0)
+
+
+def _session(start, end, count):
+    return Session(start, end, count, TimeDeltaEx.from_timedelta(end - start))
+
+
+def sessionize(timestamps, gap):
+    """
+    Split the sorted stream of datetime.datetime timestamps into
+    the sessions, by the inactivity gap: whenever the time between
+    the consecutive events exceeds the gap, the new session starts.
+
+    The sessions are yielded as soon as they end, in a single pass.
+    The timestamps are compared by the datetime subtraction
+    (implemented in C), so the aware ones are normalized to UTC.
+
+    >>> clicks = [DateTimeEx(2011, 3, 14, 10, 0), DateTimeEx(2011, 3, 14, 10, 20),
+    ...           DateTimeEx(2011, 3, 14, 11, 30), DateTimeEx(2011, 3, 14, 11, 59)]
+    >>> for session in sessionize(clicks, TimeDeltaEx(minutes=30)):
+    ...     print(session)
+    Session(start=DateTimeEx(2011, 3, 14, 10, 0), end=DateTimeEx(2011, 3, 14, 10, 20), count=2, duration=TimeDeltaEx(0, 1200))
+    Session(start=DateTimeEx(2011, 3, 14, 11, 30), end=DateTimeEx(2011, 3, 14, 11, 59), count=2, duration=TimeDeltaEx(0, 1740))
+
+    @type timestamps: collections.Iterable
+    @type gap: timedelta
+    @rtype: collections.Iterator
+    """
+    assert isinstance(gap, timedelta) and gap >= timedelta(0), repr(gap)
+
+    start = last = None
+    count = 0
+    for dt in timestamps:
+        if start is None:
+            start = dt
+        else:
+            diff = dt - last
+            if diff > gap:
+                yield _session(start, last, count)
+                start, count = dt, 0
+            elif diff < _ZERO:
+                raise ValueError("The timestamps are not sorted")
+        last = dt
+        count += 1
+    if start is not None:
+        yield _session(start, last, count)
+
+
+def sessionize_by_key(events, gap):
+    """
+    Split the stream of the (key, datetime.datetime) events,
+    sorted by the timestamp, into the sessions of every key
+    (like sessionize() does for a single key).
+
+    The session is yielded (as a (key, Session) pair) as soon as
+    it is known to have ended, i.e. when any later event comes
+    after the gap; the sessions open at the end of the stream
+    are yielded in the end. The keys idle for the longest
+    time are found in amortized O(1), so the memory is bounded
+    by the number of the keys active within the gap.
+
+    >>> events = [("alice", DateTimeEx(2011, 3, 14, 10, 0)),
+    ...           ("bob", DateTimeEx(2011, 3, 14, 10, 5)),
+    ...           ("alice", DateTimeEx(2011, 3, 14, 10, 10)),
+    ...           ("bob", DateTimeEx(2011, 3, 14, 11, 0))]
+    >>> for key, session in sessionize_by_key(events, TimeDeltaEx(minutes=30)):
+    ...     print("{0} {1} {2}".format(key, session.start.time(), session.count))
+    bob 10:05:00 1
+    alice 10:00:00 2
+    bob 11:00:00 1
+
+    @type events: collections.Iterable
+    @type gap: timedelta
+    @rtype: collections.Iterator
+    """
+    assert isinstance(gap, timedelta) and gap >= timedelta(0), repr(gap)
+
+    # {key: [start, last, count]}, the least recently active first.
+    sessions = OrderedDict()
+    for key, dt in events:
+        threshold = dt - gap
+
+        # Close the sessions of all the keys idle for longer than the gap.
+        while sessions:
+            idle_key = next(iter(sessions))
+            start, last, count = sessions[idle_key]
+            if last >= threshold:
+                break
+            del sessions[idle_key]
+            yield (idle_key, _session(start, last, count))
+
+        try:
+            session = sessions[key]
+        except KeyError:
+            sessions[key] = [dt, dt, 1]
+        else:
+            if dt < session[1]:
+                raise ValueError("The events are not sorted")
+            session[1] = dt
+            session[2] += 1
+            _move_to_end(sessions, key)
+
+    for key, (start, last, count) in sessions.items():
+        yield (key, _session(start, last, count))
+
+
+def session_starts_mus(keys, gap):
+    """
+    Find the indices of the first events of the sessions
+    in the sorted integer keys (e.g. the array of microseconds):
+    the session starts wherever the difference between the consecutive
+    keys exceeds the gap.
+
+    The differences are compared by the iterators implemented in C,
+    so no Python code runs per event.
+
+    >>> keys = array(_MUS_TYPECODE, [0, 10, 20, 100, 105, 300])
+    >>> list(session_starts_mus(keys, timedelta(microseconds=50)))
+    [0, 3, 5]
+
+    @type keys: collections.Sequence
+    @type gap: timedelta
+    @rtype: array
+    """
+    assert isinstance(gap, timedelta) and gap >= timedelta(0), repr(gap)
+
+    if not len(keys):
+        return array(_MUS_TYPECODE)
+    diffs = imap(operator.sub, islice(keys, 1, None), keys)
+    breaks = imap(operator.gt, diffs, repeat(td_to_mus(gap)))
+    starts = array(_MUS_TYPECODE, [0])
+    starts.extend(compress(range(1, len(keys)), breaks))
+    return starts
+
+
+def sessions_mus(keys, gap):
+    """
+    Split the sorted integer keys (e.g. the array of microseconds)
+    into the sessions, see session_starts_mus().
+
+    >>> keys = array(_MUS_TYPECODE, [0, 10, 20, 100, 105, 300])
+    >>> starts, ends, counts, durations = sessions_mus(keys, timedelta(microseconds=50))
+    >>> list(starts), list(ends), list(counts), list(durations)
+    ([0, 100, 300], [20, 105, 300], [3, 2, 1], [20, 5, 0])
+
+    @type keys: collections.Sequence
+    @type gap: timedelta
+    @return: the arrays of the session starts, ends, event counts
+        and durations (end - start).
+    @rtype: tuple
+    """
+    indices = session_starts_mus(keys, gap)
+    bounds = list(indices)
+    bounds.append(len(keys))
+    starts = array(_MUS_TYPECODE, [keys[i] for i in indices])
+    ends = array(_MUS_TYPECODE, [keys[i - 1] for i in bounds[1:]])
+    counts = array(_MUS_TYPECODE, imap(operator.sub, bounds[1:], bounds))
+    durations = array(_MUS_TYPECODE, imap(operator.sub, ends, starts))
+    return starts, ends, counts, durations
+
+
+# Run unittests, if executed directly.
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
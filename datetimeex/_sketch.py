@@ -0,0 +1,364 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+import math, numbers
+
+from _common import td_to_mus
+from _timedeltaex import TimeDeltaEx
+
+
+
+class DurationSketch(object):
+    """
+    The mergeable streaming quantile sketch for the durations
+    (in the spirit of DDSketch).
+
+    The durations are stored in the logarithmically sized bins
+    (on the integer number of microseconds), so that any quantile
+    is estimated with the given relative accuracy, using
+    the bounded memory, and each value is added in O(1) time.
+    The negative durations are supported as well.
+
+    If the number of bins exceeds max_bins, the bins of the lowest values
+    are collapsed together (the negative ones of the largest magnitudes
+    first, then the positive ones of the smallest magnitudes),
+    so that the accuracy is lost only for the lowest quantiles.
+
+    >>> sketch = DurationSketch()
+    >>> for ms in range(1, 1001):
+    ...     sketch.add(TimeDeltaEx(milliseconds=ms))
+    >>> len(sketch)
+    1000
+    >>> p50, p99 = sketch.quantiles([0.5, 0.99])
+    >>> abs(p50 / TimeDeltaEx(milliseconds=500) - 1) <= 0.01
+    True
+    >>> abs(p99 / TimeDeltaEx(milliseconds=990) - 1) <= 0.01
+    True
+    >>> sketch.quantile(0), sketch.quantile(1)
+    (TimeDeltaEx(0, 0, 1000), TimeDeltaEx(0, 1))
+
+    >>> sketch = DurationSketch(max_bins=100)
+    >>> for ms in range(1, 1001):
+    ...     sketch.add(TimeDeltaEx(milliseconds=ms))
+    ...     sketch.add(TimeDeltaEx(milliseconds=-ms))
+    >>> p75, p99 = sketch.quantiles([0.75, 0.99])
+    >>> abs(p75 / TimeDeltaEx(milliseconds=500) - 1) <= 0.01
+    True
+    >>> abs(p99 / TimeDeltaEx(milliseconds=980) - 1) <= 0.01
+    True
+    """
+
+    def __init__(self, relative_accuracy=0.01, max_bins=2048):
+        """
+        @type relative_accuracy: numbers.Real
+        @type max_bins: numbers.Integral
+        """
+        assert 0 < relative_accuracy < 1, repr(relative_accuracy)
+        assert isinstance(max_bins, numbers.Integral) and max_bins > 0, \
+               repr(max_bins)
+
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._multiplier = 1 / math.log(self._gamma)
+        # The bins for the positive and the negative durations,
+        # as {bin index: count} (the negative ones by the magnitude).
+        self._positive = {}
+        self._negative = {}
+        # The lowest positive bin index, below which the bins have been
+        # collapsed, and the highest negative one, above which they have.
+        self._positive_floor = None
+        self._negative_ceiling = None
+        self._zero_count = 0
+        self._count = 0
+        self._min = None
+        self._max = None
+
+
+    def __len__(self):
+        """
+        The number of the durations added to the sketch.
+        """
+        return self._count
+
+
+    def __repr__(self):
+        """
+        >>> DurationSketch(0.02)
+        <DurationSketch(0.02): 0 values in 0 bins>
+        """
+        return "<DurationSketch({0!r}): {1:d} values in {2:d} bins>"\
+                   .format(self.relative_accuracy, self._count,
+                           len(self._positive) + len(self._negative))
+
+
+    @property
+    def min(self):
+        """
+        The exact minimal duration added, or None if the sketch is empty.
+
+        @rtype: NoneType, TimeDeltaEx
+        """
+        return None if self._min is None \
+                    else TimeDeltaEx.from_microseconds(self._min)
+
+
+    @property
+    def max(self):
+        """
+        The exact maximal duration added, or None if the sketch is empty.
+
+        @rtype: NoneType, TimeDeltaEx
+        """
+        return None if self._max is None \
+                    else TimeDeltaEx.from_microseconds(self._max)
+
+
+    def add(self, td, count=1):
+        """
+        Add a datetime.timedelta (or TimeDeltaEx) to the sketch,
+        count times.
+
+        @type td: timedelta
+        @type count: numbers.Integral
+        """
+        self.add_microseconds(td_to_mus(td), count)
+
+
+    def add_microseconds(self, microseconds, count=1):
+        """
+        Add a duration (as the integer number of microseconds)
+        to the sketch, count times.
+
+        >>> sketch = DurationSketch()
+        >>> sketch.add_microseconds(-10, 2); sketch.add_microseconds(0)
+        >>> sketch.quantiles([0, 0.5, 1])
+        [TimeDeltaEx(-1, 86399, 999990), TimeDeltaEx(-1, 86399, 999990), TimeDeltaEx(0)]
+
+        @type microseconds: numbers.Integral
+        @type count: numbers.Integral
+        """
+        assert count > 0, repr(count)
+
+        if microseconds > 0:
+            bins = self._positive
+            index = int(math.ceil(math.log(microseconds) * self._multiplier))
+            floor = self._positive_floor
+            if floor is not None and index < floor:
+                index = floor
+        elif microseconds < 0:
+            bins = self._negative
+            index = int(math.ceil(math.log(-microseconds) * self._multiplier))
+            ceiling = self._negative_ceiling
+            if ceiling is not None and index > ceiling:
+                index = ceiling
+        else:
+            bins = None
+            self._zero_count += count
+
+        if bins is not None:
+            try:
+                bins[index] += count
+            except KeyError:
+                bins[index] = count
+                if len(self._positive) + len(self._negative) > self.max_bins:
+                    self._collapse()
+
+        self._count += count
+        if self._min is None or microseconds < self._min:
+            self._min = microseconds
+        if self._max is None or microseconds > self._max:
+            self._max = microseconds
+
+
+    def merge(self, other):
+        """
+        Merge another sketch (e.g. collected by another worker)
+        into this one.
+
+        Both sketches must have the same relative accuracy.
+
+        >>> sketch1, sketch2 = DurationSketch(), DurationSketch()
+        >>> for ms in range(1, 501):
+        ...     sketch1.add(TimeDeltaEx(milliseconds=ms))
+        ...     sketch2.add(TimeDeltaEx(milliseconds=ms + 500))
+        >>> sketch1.merge(sketch2)
+        >>> len(sketch1), sketch1.min, sketch1.max
+        (1000, TimeDeltaEx(0, 0, 1000), TimeDeltaEx(0, 1))
+        >>> abs(sketch1.quantile(0.5) / TimeDeltaEx(milliseconds=500) - 1) <= 0.01
+        True
+
+        @type other: DurationSketch
+        """
+        assert isinstance(other, DurationSketch), repr(other)
+        if self._gamma != other._gamma:
+            raise ValueError("Cannot merge the sketches with different "
+                             "relative accuracy: {0!r} and {1!r}"
+                                 .format(self, other))
+
+        for bins, other_bins in ((self._positive, other._positive),
+                                 (self._negative, other._negative)):
+            for index, count in other_bins.items():
+                bins[index] = bins.get(index, 0) + count
+        # The collapsed bins of the other sketch are the floor
+        # and the ceiling there; respect those of both sketches.
+        self._positive_floor = _tighter(max, self._positive_floor,
+                                        other._positive_floor)
+        self._negative_ceiling = _tighter(min, self._negative_ceiling,
+                                          other._negative_ceiling)
+        self._collapse()
+
+        self._zero_count += other._zero_count
+        self._count += other._count
+        if other._min is not None:
+            if self._min is None or other._min < self._min:
+                self._min = other._min
+            if self._max is None or other._max > self._max:
+                self._max = other._max
+
+
+    def quantile(self, q):
+        """
+        Estimate the q-quantile of the durations added.
+
+        >>> DurationSketch().quantile(0.5) is None
+        True
+
+        @type q: numbers.Real
+        @return: the estimated quantile, or None if the sketch is empty.
+        @rtype: NoneType, TimeDeltaEx
+        """
+        return self.quantiles([q])[0]
+
+
+    def quantiles(self, qs):
+        """
+        Estimate several quantiles of the durations added, in a single pass
+        over the bins.
+
+        @type qs: collections.Iterable
+        @rtype: list
+        """
+        qs = list(qs)
+        assert all(0 <= q <= 1 for q in qs), repr(qs)
+        if not self._count:
+            return [None] * len(qs)
+
+        results = [None] * len(qs)
+        # The extreme quantiles are known exactly.
+        for i, q in enumerate(qs):
+            if q == 0:
+                results[i] = TimeDeltaEx.from_microseconds(self._min)
+            elif q == 1:
+                results[i] = TimeDeltaEx.from_microseconds(self._max)
+        # The (rank, position in qs) pairs, in the increasing rank order.
+        ranks = sorted((q * (self._count - 1), i) for i, q in enumerate(qs)
+                           if results[i] is None)
+        r = 0
+        cumulative = 0
+        for value, count in self._bins_in_order():
+            cumulative += count
+            while r < len(ranks) and ranks[r][0] < cumulative:
+                results[ranks[r][1]] = self._clamp(value)
+                r += 1
+            if r == len(ranks):
+                break
+        # The floating point rounding may leave the highest ranks unmatched.
+        for rank, i in ranks[r:]:
+            results[i] = self._clamp(self._max)
+        return results
+
+
+    def _bins_in_order(self):
+        """
+        Iterate over the (representative value in microseconds, count)
+        for all the non-empty bins, in the increasing value order.
+
+        @rtype: collections.Iterable
+        """
+        for index in sorted(self._negative, reverse=True):
+            yield (-self._value(index), self._negative[index])
+        if self._zero_count:
+            yield (0, self._zero_count)
+        for index in sorted(self._positive):
+            yield (self._value(index), self._positive[index])
+
+
+    def _value(self, index):
+        """
+        The representative value for the bin, which is within
+        the relative accuracy from any value in the bin.
+
+        @rtype: numbers.Real
+        """
+        return 2 * self._gamma ** index / (self._gamma + 1)
+
+
+    def _clamp(self, value):
+        """
+        Convert the estimated value (in microseconds) to the TimeDeltaEx,
+        keeping it within the exact [min, max] range.
+
+        @rtype: TimeDeltaEx
+        """
+        value = min(max(int(math.floor(value + 0.5)), self._min), self._max)
+        return TimeDeltaEx.from_microseconds(value)
+
+
+    def _collapse(self):
+        """
+        Collapse the bins of the lowest values (the negative ones
+        of the largest magnitudes first, then the positive ones
+        of the smallest magnitudes), so that there are no more
+        than max_bins of them in total.
+
+        Some extra bins are collapsed as well, so that the collapsing
+        does not happen on every subsequent new bin.
+        """
+        positive, negative = self._positive, self._negative
+        floor, ceiling = self._positive_floor, self._negative_ceiling
+        if floor is not None:
+            for index in [i for i in positive if i < floor]:
+                positive[floor] = positive.get(floor, 0) + positive.pop(index)
+        if ceiling is not None:
+            for index in [i for i in negative if i > ceiling]:
+                negative[ceiling] = negative.get(ceiling, 0) + negative.pop(index)
+
+        excess = len(positive) + len(negative) - self.max_bins
+        if excess > 0:
+            excess += self.max_bins // 16
+            n = min(excess, len(negative) - 1)
+            if n > 0:
+                indices = sorted(negative, reverse=True)
+                ceiling = indices[n]
+                for index in indices[:n]:
+                    negative[ceiling] += negative.pop(index)
+                self._negative_ceiling = ceiling
+                excess -= n
+            n = min(excess, len(positive) - 1)
+            if n > 0:
+                indices = sorted(positive)
+                floor = indices[n]
+                for index in indices[:n]:
+                    positive[floor] += positive.pop(index)
+                self._positive_floor = floor
+
+
+def _tighter(choose, bound1, bound2):
+    """
+    The tighter of two collapse bounds (chosen by the choose function,
+    min or max), either of them may be None.
+    """
+    if bound1 is None:
+        return bound2
+    elif bound2 is None:
+        return bound1
+    else:
+        return choose(bound1, bound2)
+
+
+# Run unittests, if executed directly.
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,276 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+import heapq, numbers
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, time, timedelta
+
+from _common import (t_to_mus, td_to_mus, dt_to_mus,
+                     _MUS_TYPECODE, _TypeDispatch)
+from _datetimeex import DateTimeEx
+from _timeex import TimeEx
+from _timedeltaex import TimeDeltaEx
+from _tzinfo import fixed_offset, utcoffset_mus
+
+
+
+_MIN_DATETIME = datetime(1, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+try:
+    timedelta(1) // _MICROSECOND
+except TypeError:
+    # Python 2.x cannot divide timedelta by timedelta.
+    _naive_dt_to_mus = dt_to_mus
+else:
+    def _naive_dt_to_mus(dt):
+        # The same as dt_to_mus(), but calculated by the C code.
+        return (dt - _MIN_DATETIME) // _MICROSECOND
+
+
+def _datetime_key(dt):
+    offset = dt.utcoffset()
+    if offset is None:
+        return _naive_dt_to_mus(dt)
+    else:
+        return dt_to_mus(dt) - td_to_mus(offset)
+
+
+def _time_key(t):
+    offset = utcoffset_mus(t.tzinfo)
+    if offset is None:
+        return t_to_mus(t)
+    else:
+        return t_to_mus(t) - offset
+
+
+def _integral_key(n):
+    return n
+
+
+def _unsupported_key(value):
+    raise NotImplementedError("No sort key for {0!r}".format(value))
+
+
+_KEYS = _TypeDispatch([(datetime, _datetime_key),
+                       (time, _time_key),
+                       (timedelta, td_to_mus),
+                       (numbers.Integral, _integral_key)],
+                      _unsupported_key)
+
+
+def mus_key(value):
+    """
+    The integer sort key of the datetime.datetime, datetime.time
+    or datetime.timedelta (including their Ex subclasses),
+    in microseconds; the integers are returned as is.
+
+    The keys order the values the same way as the comparison
+    of the values does: the datetime is keyed by the microseconds
+    elapsed Anno Domini, the time by the microseconds since the midnight,
+    both normalized to UTC if they are aware.
+    Unlike the comparison, the keys of the naive and the aware values
+    may be mixed (the naive ones being treated as UTC).
+
+    >>> mus_key(DateTimeEx(2011, 3, 14, 15, 9, 26, 535897))
+    63435712166535897
+    >>> mus_key(DateTimeEx(2011, 3, 14, 16, 9, 26, 535897,
+    ...                    tzinfo=fixed_offset(timedelta(hours=1))))
+    63435712166535897
+    >>> mus_key(TimeEx(3, 14, 15, 92)), mus_key(TimeDeltaEx(3, 14, 15))
+    (11655000092, 259214000015)
+
+    @type value: datetime, time, timedelta, numbers.Integral
+    @rtype: numbers.Integral
+    """
+    return _KEYS[type(value)](value)
+
+
+def keys_mus(iterable):
+    """
+    The array of the integer sort keys (see mus_key()) of the values.
+
+    >>> list(keys_mus([TimeDeltaEx(seconds=2), timedelta(microseconds=1)]))
+    [2000000, 1]
+
+    @type iterable: collections.Iterable
+    @rtype: array
+    """
+    keys = _KEYS
+    return array(_MUS_TYPECODE, [keys[type(value)](value) for value in iterable])
+
+
+def sort_by_mus(iterable, reverse=False):
+    """
+    Sort the values by their integer sort keys (see mus_key()),
+    so that the sorting compares the plain integers rather than
+    the objects. The sort is stable.
+
+    This pays off for the aware values, whose every comparison
+    calls utcoffset() of both; the naive datetime objects
+    are compared by the C code, and sorted() on them directly is faster.
+
+    >>> sort_by_mus([TimeEx(12), TimeEx(3), TimeEx(7, 30)])
+    [TimeEx(3, 0), TimeEx(7, 30), TimeEx(12, 0)]
+
+    @type iterable: collections.Iterable
+    @type reverse: bool
+    @rtype: list
+    """
+    return sorted(iterable, key=mus_key, reverse=reverse)
+
+
+def radix_argsort_mus(keys, digit_bits=16):
+    """
+    The stable LSD radix sort of the integer keys (e.g. the array
+    of microseconds), returning the array of the indices
+    of the keys in the sorted order.
+
+    The keys are offset by their minimum, and only as many passes
+    are made as the span of the keys needs (e.g. 3 passes of 16 bits
+    for the timestamps within a single day).
+
+    >>> list(radix_argsort_mus(array(_MUS_TYPECODE, [30, -5, 10**15, 30, 0])))
+    [1, 4, 0, 3, 2]
+
+    @type keys: collections.Sequence
+    @type digit_bits: numbers.Integral
+    @rtype: array
+    """
+    if not keys:
+        return array(_MUS_TYPECODE)
+
+    lo = min(keys)
+    offsets = [key - lo for key in keys]
+    order = list(range(len(offsets)))
+    for shift in _radix_shifts(max(offsets), digit_bits):
+        buckets = [[] for i in range(1 << digit_bits)]
+        appends = [bucket.append for bucket in buckets]
+        mask = (1 << digit_bits) - 1
+        for i in order:
+            appends[(offsets[i] >> shift) & mask](i)
+        order = [i for bucket in buckets for i in bucket]
+    return array(_MUS_TYPECODE, order)
+
+
+def radix_sort_mus(keys, digit_bits=16):
+    """
+    The LSD radix sort of the integer keys (e.g. the array
+    of microseconds), see radix_argsort_mus().
+
+    Note that in CPython, sorted() on the plain integers is usually
+    faster (being implemented in C); the radix sort pays off
+    for the keys of a narrow span.
+
+    >>> list(radix_sort_mus(array(_MUS_TYPECODE, [30, -5, 10**15, 30, 0])))
+    [-5, 0, 30, 30, 1000000000000000]
+
+    @type keys: collections.Sequence
+    @type digit_bits: numbers.Integral
+    @rtype: array
+    """
+    if not keys:
+        return array(_MUS_TYPECODE)
+
+    lo = min(keys)
+    offsets = [key - lo for key in keys]
+    for shift in _radix_shifts(max(offsets), digit_bits):
+        buckets = [[] for i in range(1 << digit_bits)]
+        appends = [bucket.append for bucket in buckets]
+        mask = (1 << digit_bits) - 1
+        for offset in offsets:
+            appends[(offset >> shift) & mask](offset)
+        offsets = [offset for bucket in buckets for offset in bucket]
+    return array(_MUS_TYPECODE, [offset + lo for offset in offsets])
+
+
+def _radix_shifts(span, digit_bits):
+    """
+    The bit shifts of the radix sort passes, for the keys
+    from 0 to span.
+
+    >>> list(_radix_shifts(0, 16)), list(_radix_shifts(2 ** 37, 16))
+    ([], [0, 16, 32])
+    """
+    shift = 0
+    while span >> shift:
+        yield shift
+        shift += digit_bits
+
+
+def searchsorted_mus(sorted_keys, values, side="left"):
+    """
+    Find the indices where the values should be inserted
+    into the sorted integer keys to keep them sorted
+    (like numpy.searchsorted()).
+
+    The values may be the integers or anything mus_key() accepts.
+
+    >>> keys = keys_mus([DateTimeEx(2011, 3, day) for day in (1, 5, 5, 9)])
+    >>> list(searchsorted_mus(keys, [DateTimeEx(2011, 3, 5), DateTimeEx(2011, 3, 31)]))
+    [1, 4]
+    >>> list(searchsorted_mus(keys, [DateTimeEx(2011, 3, 5)], side="right"))
+    [3]
+
+    @type sorted_keys: collections.Sequence
+    @type values: collections.Iterable
+    @param side: "left" for the first suitable index, "right" for the last.
+    @type side: str
+    @rtype: array
+    """
+    assert side in ("left", "right"), repr(side)
+
+    bisect = bisect_left if side == "left" else bisect_right
+    keys = _KEYS
+    return array(_MUS_TYPECODE,
+                 [bisect(sorted_keys, keys[type(value)](value))
+                      for value in values])
+
+
+def merge_sorted(*iterables):
+    """
+    Merge the already sorted streams of values (anything mus_key()
+    accepts) into a single sorted stream, lazily.
+
+    The values are compared by their integer keys only; the values
+    with equal keys are yielded in the order of the streams.
+
+    >>> list(merge_sorted([DateTimeEx(2011, 3, 1), DateTimeEx(2011, 3, 9)],
+    ...                   [DateTimeEx(2011, 3, 5)],
+    ...                   []))
+    [DateTimeEx(2011, 3, 1, 0, 0), DateTimeEx(2011, 3, 5, 0, 0), DateTimeEx(2011, 3, 9, 0, 0)]
+
+    @rtype: collections.Iterator
+    """
+    keys = _KEYS
+    heap = []
+    for index, iterable in enumerate(iterables):
+        iterator = iter(iterable)
+        for value in iterator:
+            heap.append((keys[type(value)](value), index, value, iterator))
+            break
+    heapq.heapify(heap)
+
+    while len(heap) > 1:
+        key, index, value, iterator = heap[0]
+        yield value
+        for value in iterator:
+            heapq.heapreplace(heap,
+                              (keys[type(value)](value), index, value, iterator))
+            break
+        else:
+            heapq.heappop(heap)
+
+    if heap:
+        key, index, value, iterator = heap[0]
+        yield value
+        for value in iterator:
+            yield value
+
+
+# Run unittests, if executed directly.
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,307 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+import functools, threading, weakref
+from collections import namedtuple
+
+from _timedeltaex import TimeDeltaEx
+
+
+
+# The performance counter (in integer nanoseconds), for timing the code.
+# Python 2.x has neither perf_counter_ns() nor perf_counter(),
+# so the wall clock is used instead.
+try:
+    from time import perf_counter_ns as _perf_counter_ns
+except ImportError:
+    try:
+        from time import perf_counter as _perf_counter
+    except ImportError:
+        from time import time as _perf_counter
+
+    def _perf_counter_ns():
+        return int(_perf_counter() * 1000000000)
+
+
+class TimingStats(namedtuple("TimingStats", "count total min max")):
+    """
+    The aggregate statistics of the timings of a single label.
+
+    >>> stats = TimingStats(2, TimeDeltaEx(seconds=3), TimeDeltaEx(seconds=1),
+    ...                     TimeDeltaEx(seconds=2))
+    >>> stats.mean
+    TimeDeltaEx(0, 1, 500000)
+    """
+    __slots__ = ()
+
+
+    @property
+    def mean(self):
+        """
+        @rtype: TimeDeltaEx
+        """
+        return TimeDeltaEx.from_microseconds(self.total.in_microseconds //
+                                             self.count)
+
+
+class TimingRegistry(object):
+    """
+    The registry of the timings, aggregated per label.
+
+    Every thread accumulates its timings separately (with no locking
+    on the hot path), in the integer nanoseconds;
+    stats() merges them together, rounding down to the microseconds.
+    The stats() of the timings being recorded by the other threads
+    at the same moment may be slightly inconsistent.
+    The timings of the finished threads are folded into the shared total,
+    so the registry does not grow with every thread ever started.
+
+    >>> registry = TimingRegistry()
+    >>> registry.record("query", 1500000)
+    >>> registry.record("query", 500000)
+    >>> registry.stats()
+    {'query': TimingStats(count=2, total=TimeDeltaEx(0, 0, 2000), min=TimeDeltaEx(0, 0, 500), max=TimeDeltaEx(0, 0, 1500))}
+    >>> registry.reset(); registry.stats()
+    {}
+
+    >>> thread = threading.Thread(target=registry.record, args=("query", 1000))
+    >>> thread.start(); thread.join()
+    >>> registry.record("query", 3000)
+    >>> registry.stats()["query"].total, len(registry._per_thread)
+    (TimeDeltaEx(0, 0, 4), 1)
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # The (weak reference to the thread, {label: [count, total, min, max]})
+        # pairs of every running thread.
+        self._per_thread = []
+        # The {label: [count, total, min, max]} of the finished threads.
+        self._finished = {}
+
+
+    def record(self, label, nanoseconds):
+        """
+        Record a single timing.
+
+        @type nanoseconds: numbers.Integral
+        """
+        try:
+            stats = self._local.stats
+        except AttributeError:
+            stats = self._local.stats = {}
+            with self._lock:
+                self._fold_finished()
+                self._per_thread.append(
+                    (weakref.ref(threading.current_thread()), stats))
+        try:
+            s = stats[label]
+        except KeyError:
+            stats[label] = [1, nanoseconds, nanoseconds, nanoseconds]
+        else:
+            s[0] += 1
+            s[1] += nanoseconds
+            if nanoseconds < s[2]:
+                s[2] = nanoseconds
+            if nanoseconds > s[3]:
+                s[3] = nanoseconds
+
+
+    def stats(self):
+        """
+        The statistics of every label.
+
+        @rtype: dict
+        """
+        with self._lock:
+            self._fold_finished()
+            merged = dict((label, list(s))
+                              for label, s in self._finished.items())
+            per_thread = [stats for ref, stats in self._per_thread]
+
+        for stats in per_thread:
+            _merge(merged, stats)
+        return dict((label,
+                     TimingStats(count,
+                                 TimeDeltaEx.from_microseconds(total // 1000),
+                                 TimeDeltaEx.from_microseconds(lo // 1000),
+                                 TimeDeltaEx.from_microseconds(hi // 1000)))
+                        for label, (count, total, lo, hi) in merged.items())
+
+
+    def reset(self):
+        """
+        Forget all the timings.
+        """
+        with self._lock:
+            self._finished.clear()
+            for ref, stats in self._per_thread:
+                stats.clear()
+
+
+    def _fold_finished(self):
+        """
+        Fold the timings of the finished threads into the shared total,
+        and drop their dicts; must be called under the lock.
+        """
+        running = []
+        for ref, stats in self._per_thread:
+            thread = ref()
+            if thread is not None and thread.is_alive():
+                running.append((ref, stats))
+            else:
+                _merge(self._finished, stats)
+        self._per_thread = running
+
+
+def _merge(merged, stats):
+    """
+    Merge the {label: [count, total, min, max]} stats into the merged ones.
+
+    @type merged: dict
+    @type stats: dict
+    """
+    for label, (count, total, lo, hi) in list(stats.items()):
+        try:
+            m = merged[label]
+        except KeyError:
+            merged[label] = [count, total, lo, hi]
+        else:
+            m[0] += count
+            m[1] += total
+            m[2] = min(m[2], lo)
+            m[3] = max(m[3], hi)
+
+
+default_registry = TimingRegistry()
+
+
+class Stopwatch(object):
+    """
+    The stopwatch on the performance counter, usable as a context manager
+    (and, via timed(), as a decorator).
+
+    If the label is given, every measurement is recorded
+    to the registry (by default, default_registry).
+
+    >>> registry = TimingRegistry()
+    >>> with Stopwatch("block", registry) as sw:
+    ...     pass
+    >>> isinstance(sw.elapsed, TimeDeltaEx), sw.elapsed < TimeDeltaEx(seconds=1)
+    (True, True)
+    >>> registry.stats()["block"].count
+    1
+    """
+    __slots__ = ("label", "registry", "_start", "_stop")
+
+
+    def __init__(self, label=None, registry=None):
+        """
+        @type registry: NoneType, TimingRegistry
+        """
+        self.label = label
+        self.registry = default_registry if registry is None else registry
+        self._start = None
+        self._stop = None
+
+
+    def __enter__(self):
+        self.start()
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Unlike stop(), avoid creating the TimeDeltaEx result.
+        self._stop = _perf_counter_ns()
+        if self.label is not None:
+            self.registry.record(self.label, self._stop - self._start)
+
+
+    def __call__(self, func):
+        """
+        Decorate the function, so that every call of it is timed
+        (under the label, or the function name if there is no label).
+        """
+        label = self.label if self.label is not None else func.__name__
+        registry = self.registry
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = _perf_counter_ns()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                registry.record(label, _perf_counter_ns() - start)
+
+        return wrapper
+
+
+    def start(self):
+        self._start = _perf_counter_ns()
+        self._stop = None
+
+
+    def stop(self):
+        """
+        Stop the stopwatch, recording the measurement (if labelled).
+
+        @rtype: TimeDeltaEx
+        """
+        assert self._start is not None, "The stopwatch is not started"
+
+        self._stop = _perf_counter_ns()
+        if self.label is not None:
+            self.registry.record(self.label, self._stop - self._start)
+        return self.elapsed
+
+
+    @property
+    def elapsed_ns(self):
+        """
+        The time measured (so far, if still running), in nanoseconds.
+
+        @rtype: numbers.Integral
+        """
+        stop = self._stop if self._stop is not None else _perf_counter_ns()
+        return stop - self._start
+
+
+    @property
+    def elapsed(self):
+        """
+        The time measured (so far, if still running),
+        rounded down to the microseconds.
+
+        @rtype: TimeDeltaEx
+        """
+        return TimeDeltaEx.from_microseconds(self.elapsed_ns // 1000)
+
+
+def timed(label=None, registry=None):
+    """
+    Time the code block (as a context manager) or every call
+    of the function (as a decorator), recording to the registry.
+
+    >>> registry = TimingRegistry()
+    >>> @timed(registry=registry)
+    ... def work(n):
+    ...     return sum(range(n))
+    >>> work(10), work(20)
+    (45, 190)
+    >>> with timed("block", registry):
+    ...     pass
+    >>> sorted((label, stats.count) for label, stats in registry.stats().items())
+    [('block', 1), ('work', 2)]
+
+    @type registry: NoneType, TimingRegistry
+    @rtype: Stopwatch
+    """
+    return Stopwatch(label, registry)
+
+
+# Run unittests, if executed directly.
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
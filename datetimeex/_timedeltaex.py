@@ -4,12 +4,16 @@
 from __future__ import division
 import numbers
 from datetime import date, datetime, time, timedelta
+from array import array
 from fractions import Fraction
 
 from _common import (MICROSECONDS_IN_SECOND, MICROSECONDS_IN_MINUTE,
                      MICROSECONDS_IN_HOUR, MICROSECONDS_IN_DAY,
-                     t_to_mus, mus_to_t, td_to_mus, mus_to_td,
-                     _PY3K, DummyTZInfo)
+                     t_to_mus, mus_to_t, td_to_mus, mus_to_td, dt_to_mus,
+                     _PY3K, _MUS_TYPECODE, _TypeDispatch, _unsupported,
+                     DummyTZInfo)
+from _dateex import DateEx
+from _datetimeex import DateTimeEx
 from _timeex import TimeEx
 
 
@@ -154,20 +158,100 @@ class TimeDeltaEx(timedelta, numbers.Real):
         return Fraction(self.in_microseconds, 1000000)
 
 
+    @classmethod
+    def sum(cls, iterable):
+        """
+        Sum the iterable of datetime.timedelta objects (including TimeDeltaEx)
+        to a single TimeDeltaEx.
+
+        This is much faster than sum(iterable, TimeDeltaEx(0)), as the
+        values are accumulated as integers, and only the result is created.
+        If the iterable is an array (of the durations in microseconds),
+        it is summed directly.
+
+        >>> TimeDeltaEx.sum([TimeDeltaEx(3, 14, 15), timedelta(2, 71, 82)])
+        TimeDeltaEx(5, 85, 97)
+        >>> TimeDeltaEx.sum([])
+        TimeDeltaEx(0)
+        >>> TimeDeltaEx.sum(array(_MUS_TYPECODE, [259214000015, 172871000082]))
+        TimeDeltaEx(5, 85, 97)
+
+        @type iterable: collections.Iterable, array
+        @rtype: TimeDeltaEx
+        """
+        if isinstance(iterable, array):
+            return cls(microseconds=sum(iterable))
+        else:
+            return cls(microseconds=_sum_count_mus(iterable)[0])
+
+
+    @classmethod
+    def mean(cls, iterable, exact=False):
+        """
+        Calculate the arithmetic mean of the iterable of datetime.timedelta
+        objects (including TimeDeltaEx), in a single pass over the iterable.
+
+        By default, the mean is a TimeDeltaEx, rounded to the nearest
+        microsecond (the half-way cases are rounded to even,
+        like the datetime.timedelta division does).
+        If exact is True, the mean is the precise fractions.Fraction
+        number of microseconds.
+        If the iterable is an array (of the durations in microseconds),
+        it is used directly.
+
+        >>> TimeDeltaEx.mean([TimeDeltaEx(microseconds=1), timedelta(microseconds=4)])
+        TimeDeltaEx(0, 0, 2)
+        >>> TimeDeltaEx.mean([TimeDeltaEx(microseconds=1), timedelta(microseconds=4)],
+        ...                  exact=True)
+        Fraction(5, 2)
+        >>> TimeDeltaEx.mean(array(_MUS_TYPECODE, [1, 2, 4]))
+        TimeDeltaEx(0, 0, 2)
+        >>> TimeDeltaEx.mean([])
+        Traceback (most recent call last):
+          ...
+        ValueError: mean of an empty iterable
+
+        @type iterable: collections.Iterable, array
+        @type exact: bool
+        @rtype: TimeDeltaEx, numbers.Rational
+        """
+        if isinstance(iterable, array):
+            total, count = sum(iterable), len(iterable)
+        else:
+            total, count = _sum_count_mus(iterable)
+
+        if not count:
+            raise ValueError("mean of an empty iterable")
+        elif exact:
+            return Fraction(total, count)
+        else:
+            return cls(microseconds=_div_round_half_even(total, count))
+
+
     def __div__(self, divisor):
         """
         Divide TimeDeltaEx by some datetime.timedelta or a number.
 
         For dividing TimeDeltaEx by datetime.timedelta,
         the result will be a ratio.
-        For dividing TimeDeltaEx by a number, the result will be a TimeDeltaEx
-        (the precision may be lost though).
+        For dividing TimeDeltaEx by a number, the result will be a TimeDeltaEx.
+        If the number is rational (an integer or a fractions.Fraction),
+        the result is calculated exactly and rounded to the nearest
+        microsecond (the half-way cases are rounded to even);
+        otherwise, the float arithmetic is used, and the precision
+        may be lost.
 
         >>> TimeDeltaEx(seconds=5) / timedelta(seconds=2)
         Fraction(5, 2)
 
         >>> TimeDeltaEx(seconds=5) / 4
         TimeDeltaEx(0, 1, 250000)
+        >>> TimeDeltaEx(microseconds=10) / 4, TimeDeltaEx(microseconds=14) / 4
+        (TimeDeltaEx(0, 0, 2), TimeDeltaEx(0, 0, 4))
+        >>> TimeDeltaEx(days=999999, microseconds=999999) / 3
+        TimeDeltaEx(333333, 0, 333333)
+        >>> TimeDeltaEx(days=30) / Fraction(30, 7)
+        TimeDeltaEx(7)
 
         >>> TimeDeltaEx(microseconds=75) / 2.5
         TimeDeltaEx(0, 0, 30)
@@ -175,12 +259,7 @@ class TimeDeltaEx(timedelta, numbers.Real):
         @type divisor: timedelta, numbers.Number
         @rtype: TimeDeltaEx, numbers.Rational
         """
-        if isinstance(divisor, timedelta):
-            return Fraction(self.in_microseconds, td_to_mus(divisor))
-        elif isinstance(divisor, numbers.Number):
-            return TimeDeltaEx.from_microseconds(self.in_microseconds / divisor)
-        else:
-            raise NotImplementedError("{0!r} / {1!r}".format(self, divisor))
+        return _DIV[type(divisor)](self, divisor)
 
     __truediv__ = __div__
 
@@ -214,25 +293,22 @@ class TimeDeltaEx(timedelta, numbers.Real):
         For dividing TimeDeltaEx by datetime.timedelta,
         the result will be an integer number.
         For dividing TimeDeltaEx by a number, the result will be a TimeDeltaEx
-        (the precision may be lost though).
+        (exact for the integers and fractions.Fraction; for other numbers,
+        the precision may be lost though).
 
         >>> TimeDeltaEx(seconds=5) // timedelta(seconds=2)
         2
         >>> TimeDeltaEx(seconds=5) // 4
         TimeDeltaEx(0, 1, 250000)
+        >>> TimeDeltaEx(microseconds=75) // Fraction(5, 2)
+        TimeDeltaEx(0, 0, 30)
         >>> TimeDeltaEx(microseconds=75) // 2.6
         TimeDeltaEx(0, 0, 28)
 
         @type divisor: timedelta, numbers.Number
         @rtype: TimeDeltaEx, numbers.Number
         """
-        if isinstance(divisor, timedelta):
-            return self.in_microseconds // td_to_mus(divisor)
-        elif isinstance(divisor, numbers.Number):
-            return TimeDeltaEx.from_microseconds(self.in_microseconds //
-                                                 divisor)
-        else:
-            raise NotImplementedError("{0!r} // {1!r}!".format(self, divisor))
+        return _FLOORDIV[type(divisor)](self, divisor)
 
 
     def __rfloordiv__(self, dividend):
@@ -270,11 +346,7 @@ class TimeDeltaEx(timedelta, numbers.Real):
         @type divisor: timedelta
         @rtype: TimeDeltaEx
         """
-        if isinstance(divisor, timedelta):
-            return TimeDeltaEx.from_microseconds(self.in_microseconds %
-                                                 td_to_mus(divisor))
-        else:
-            raise NotImplementedError("{0!r} % {1!r}".format(self, divisor))
+        return _MOD[type(divisor)](self, divisor)
 
 
     def __rmod__(self, dividend):
@@ -313,12 +385,7 @@ class TimeDeltaEx(timedelta, numbers.Real):
         @type divisor: timedelta
         @rtype: tuple
         """
-        if isinstance(divisor, timedelta):
-            _d, _m = divmod(self.in_microseconds, td_to_mus(divisor))
-            return (_d, TimeDeltaEx.from_microseconds(_m))
-        else:
-            raise NotImplementedError("divmod({0!r}, {1!r})"
-                                          .format(self, divisor))
+        return _DIVMOD[type(divisor)](self, divisor)
 
 
     def __rdivmod__(self, dividend):
@@ -342,12 +409,20 @@ class TimeDeltaEx(timedelta, numbers.Real):
         """
         Multiplicate the TimeDeltaEx by a number.
 
-        The sub-microsecond precision may be lost.
+        If the number is rational (an integer or a fractions.Fraction),
+        the result is calculated exactly and rounded to the nearest
+        microsecond (the half-way cases are rounded to even);
+        otherwise, the float arithmetic is used, and the sub-microsecond
+        precision may be lost.
 
         >>> TimeDeltaEx(seconds=5) * 5
         TimeDeltaEx(0, 25)
         >>> 5 * TimeDeltaEx(seconds=5)
         TimeDeltaEx(0, 25)
+        >>> TimeDeltaEx(days=31) * Fraction(12, 31)
+        TimeDeltaEx(12)
+        >>> TimeDeltaEx(microseconds=5) * Fraction(1, 2)
+        TimeDeltaEx(0, 0, 2)
         >>> TimeDeltaEx(microseconds=50) * 0.77
         TimeDeltaEx(0, 0, 39)
         >>> 0.77 * TimeDeltaEx(microseconds=50)
@@ -356,10 +431,7 @@ class TimeDeltaEx(timedelta, numbers.Real):
         @type n: numbers.Number
         @rtype: TimeDeltaEx
         """
-        if isinstance(n, numbers.Number):
-            return TimeDeltaEx.from_microseconds(self.in_microseconds * n)
-        else:
-            raise NotImplementedError("{0!r} * {1!r}".format(self, n))
+        return _MUL[type(n)](self, n)
 
     __rmul__ = __mul__
 
@@ -406,25 +478,23 @@ class TimeDeltaEx(timedelta, numbers.Real):
         >>> timedelta(2, 71, 82, 81) + TimeDeltaEx(3, 14, 15, 92)
         TimeDeltaEx(5, 85, 173097)
 
+        >>> TimeDeltaEx(hours=3) + datetime(2011, 3, 14, 22, 30)
+        DateTimeEx(2011, 3, 15, 1, 30)
+        >>> TimeDeltaEx(hours=3) + DateTimeEx(2011, 3, 14, 22, 30, tzinfo=DummyTZInfo())
+        DateTimeEx(2011, 3, 15, 1, 30, tzinfo=<DummyTZInfo>)
+
+        >>> TimeDeltaEx(days=3, hours=23) + date(2011, 3, 14)
+        DateEx(2011, 3, 17)
+
+        >>> TimeDeltaEx(hours=3) + "3 hours"
+        Traceback (most recent call last):
+          ...
+        TypeError: unsupported operand type(s) for +: 'TimeDeltaEx' and 'str'
+
         @type summand: date, datetime, time, timedelta
         @rtype: TimeDeltaEx
         """
-        assert isinstance(summand, (date, datetime, time, timedelta)), \
-               repr(summand)
-
-        if isinstance(summand, date):
-            # TODO
-            raise NotImplementedError("Not yet implemented!")
-        elif isinstance(summand, datetime):
-            # TODO
-            raise NotImplementedError("Not yet implemented!")
-        elif isinstance(summand, time):
-            return TimeEx.from_microseconds(self.in_microseconds + t_to_mus(summand),
-                                            tzinfo=summand.tzinfo)
-        elif isinstance(summand, timedelta):
-            return TimeDeltaEx.from_microseconds(td_to_mus(self) + td_to_mus(summand))
-        else:
-            raise NotImplementedError("{0!r} + {1!r}".format(self, summand))
+        return _ADD[type(summand)](self, summand)
 
     __radd__ = __add__
 
@@ -441,11 +511,7 @@ class TimeDeltaEx(timedelta, numbers.Real):
         @type subtrahend: timedelta
         @rtype: TimeDeltaEx
         """
-        if isinstance(subtrahend, timedelta):
-            return TimeDeltaEx.from_microseconds(self.in_microseconds -
-                                                 td_to_mus(subtrahend))
-        else:
-            raise NotImplementedError("{0!r} - {1!r}".format(self, subtrahend))
+        return _SUB[type(subtrahend)](self, subtrahend)
 
 
     def __rsub__(self, minuend):
@@ -486,23 +552,203 @@ class TimeDeltaEx(timedelta, numbers.Real):
         >>> timedelta(2, 71, 82, 81) - TimeDeltaEx(3, 4, 15, 92)
         TimeDeltaEx(-1, 66, 989067)
 
+        >>> TimeDeltaEx(hours=3).__rsub__(datetime(2011, 3, 15, 1, 30))
+        DateTimeEx(2011, 3, 14, 22, 30)
+        >>> TimeDeltaEx(days=3).__rsub__(date(2011, 3, 17))
+        DateEx(2011, 3, 14)
+
         @type minuend: date, datetime, time, timedelta
         @rtype: date, datetime, time, timedelta
         """
-        if isinstance(minuend, date):
-            # TODO
-            raise NotImplementedError("Not yet implemented!")
-        elif isinstance(minuend, datetime):
-            # TODO
-            raise NotImplementedError("Not yet implemented!")
-        elif isinstance(minuend, time):
-            return TimeEx.from_microseconds(t_to_mus(minuend) - self.in_microseconds,
-                                            tzinfo=minuend.tzinfo)
-        elif isinstance(minuend, timedelta):
-            return TimeDeltaEx.from_microseconds(td_to_mus(minuend) -
-                                                 self.in_microseconds)
-        else:
-            raise NotImplementedError("{0!r} - {1!r}".format(minuend, self))
+        return _RSUB[type(minuend)](self, minuend)
+
+
+# The handlers of the TimeDeltaEx operators, per the operand type.
+# Every handler gets the TimeDeltaEx first, and the operand second.
+
+def _add_date(td, d):
+    # Only the whole days are added, as date + timedelta does.
+    return DateEx.fromordinal(d.toordinal() + td.days)
+
+
+def _add_datetime(td, dt):
+    return DateTimeEx.from_microseconds(dt_to_mus(dt) + td_to_mus(td),
+                                        tzinfo=dt.tzinfo)
+
+
+def _add_time(td, t):
+    return TimeEx.from_microseconds(td_to_mus(td) + t_to_mus(t),
+                                    tzinfo=t.tzinfo)
+
+
+def _add_timedelta(td, other):
+    return TimeDeltaEx.from_microseconds(td_to_mus(td) + td_to_mus(other))
+
+
+def _sub_timedelta(td, subtrahend):
+    return TimeDeltaEx.from_microseconds(td_to_mus(td) - td_to_mus(subtrahend))
+
+
+def _rsub_datetime(td, dt):
+    return DateTimeEx.from_microseconds(dt_to_mus(dt) - td_to_mus(td),
+                                        tzinfo=dt.tzinfo)
+
+
+def _rsub_date(td, d):
+    return DateEx.fromordinal(d.toordinal() - td.days)
+
+
+def _rsub_time(td, t):
+    return TimeEx.from_microseconds(t_to_mus(t) - td_to_mus(td),
+                                    tzinfo=t.tzinfo)
+
+
+def _rsub_timedelta(td, minuend):
+    return TimeDeltaEx.from_microseconds(td_to_mus(minuend) - td_to_mus(td))
+
+
+def _mul_integral(td, n):
+    return TimeDeltaEx(microseconds=td_to_mus(td) * n)
+
+
+def _mul_rational(td, n):
+    return TimeDeltaEx(microseconds=_div_round_half_even(td_to_mus(td) *
+                                                             n.numerator,
+                                                         n.denominator))
+
+
+def _mul_number(td, n):
+    return TimeDeltaEx.from_microseconds(td_to_mus(td) * n)
+
+
+def _div_timedelta(td, divisor):
+    return Fraction(td_to_mus(td), td_to_mus(divisor))
+
+
+def _div_integral(td, divisor):
+    return TimeDeltaEx(microseconds=_div_round_half_even(td_to_mus(td),
+                                                         divisor))
+
+
+def _div_rational(td, divisor):
+    return TimeDeltaEx(microseconds=_div_round_half_even(td_to_mus(td) *
+                                                             divisor.denominator,
+                                                         divisor.numerator))
+
+
+def _div_number(td, divisor):
+    return TimeDeltaEx.from_microseconds(td_to_mus(td) / divisor)
+
+
+def _floordiv_timedelta(td, divisor):
+    return td_to_mus(td) // td_to_mus(divisor)
+
+
+def _floordiv_integral(td, divisor):
+    return TimeDeltaEx(microseconds=td_to_mus(td) // divisor)
+
+
+def _floordiv_rational(td, divisor):
+    return TimeDeltaEx(microseconds=td_to_mus(td) * divisor.denominator //
+                                    divisor.numerator)
+
+
+def _floordiv_number(td, divisor):
+    return TimeDeltaEx.from_microseconds(td_to_mus(td) // divisor)
+
+
+def _mod_timedelta(td, divisor):
+    return TimeDeltaEx.from_microseconds(td_to_mus(td) % td_to_mus(divisor))
+
+
+def _divmod_timedelta(td, divisor):
+    _d, _m = divmod(td_to_mus(td), td_to_mus(divisor))
+    return (_d, TimeDeltaEx.from_microseconds(_m))
+
+
+# datetime.datetime is a subclass of datetime.date, so it goes first.
+_ADD = _TypeDispatch([(datetime, _add_datetime),
+                      (date, _add_date),
+                      (time, _add_time),
+                      (timedelta, _add_timedelta)],
+                     _unsupported)
+_SUB = _TypeDispatch([(timedelta, _sub_timedelta)],
+                     _unsupported)
+_RSUB = _TypeDispatch([(datetime, _rsub_datetime),
+                       (date, _rsub_date),
+                       (time, _rsub_time),
+                       (timedelta, _rsub_timedelta)],
+                      _unsupported)
+# The integers and the other rationals are handled exactly,
+# the remaining numbers (float, Decimal etc) through the float arithmetic.
+_MUL = _TypeDispatch([(numbers.Integral, _mul_integral),
+                      (numbers.Rational, _mul_rational),
+                      (numbers.Number, _mul_number)],
+                     _unsupported)
+_DIV = _TypeDispatch([(timedelta, _div_timedelta),
+                      (numbers.Integral, _div_integral),
+                      (numbers.Rational, _div_rational),
+                      (numbers.Number, _div_number)],
+                     _unsupported)
+_FLOORDIV = _TypeDispatch([(timedelta, _floordiv_timedelta),
+                           (numbers.Integral, _floordiv_integral),
+                           (numbers.Rational, _floordiv_rational),
+                           (numbers.Number, _floordiv_number)],
+                          _unsupported)
+_MOD = _TypeDispatch([(timedelta, _mod_timedelta)],
+                     _unsupported)
+_DIVMOD = _TypeDispatch([(timedelta, _divmod_timedelta)],
+                        _unsupported)
+
+
+def _sum_count_mus(iterable):
+    """
+    Sum the iterable of datetime.timedelta objects, in microseconds.
+
+    The days, seconds and microseconds are accumulated separately,
+    so that there is no multiplication per item.
+
+    >>> _sum_count_mus([timedelta(3, 14, 15), timedelta(-1, 1, 1)])
+    (172815000016, 2)
+
+    @type iterable: collections.Iterable
+    @return: the sum (in microseconds) and the number of items.
+    @rtype: tuple
+    """
+    days = seconds = microseconds = count = 0
+    for td in iterable:
+        days += td.days
+        seconds += td.seconds
+        microseconds += td.microseconds
+        count += 1
+    return (days * MICROSECONDS_IN_DAY +
+            seconds * MICROSECONDS_IN_SECOND +
+            microseconds,
+            count)
+
+
+def _div_round_half_even(dividend, divisor):
+    """
+    Divide the integers, rounding the result to the nearest integer
+    (the half-way cases are rounded to even).
+
+    >>> _div_round_half_even(5, 2), _div_round_half_even(7, 2)
+    (2, 4)
+    >>> _div_round_half_even(-5, 2), _div_round_half_even(-7, 2)
+    (-2, -4)
+    >>> _div_round_half_even(8, 3), _div_round_half_even(-8, 3)
+    (3, -3)
+
+    @type dividend: numbers.Integral
+    @type divisor: numbers.Integral
+    @rtype: numbers.Integral
+    """
+    q, r = divmod(dividend, divisor)
+    # The remainder has the sign of the divisor.
+    doubled_r = 2 * r if divisor > 0 else -2 * r
+    if doubled_r > abs(divisor) or (doubled_r == abs(divisor) and q % 2):
+        q += 1
+    return q
 
 
 # Run unittests, if executed directly.
@@ -4,12 +4,14 @@
 from __future__ import division
 import numbers
 from datetime import date, datetime, time, timedelta, tzinfo as tzinfo_class
+from array import array
 from fractions import Fraction
 
 from _common import (MICROSECONDS_IN_SECOND, MICROSECONDS_IN_MINUTE,
                      MICROSECONDS_IN_HOUR, MICROSECONDS_IN_DAY,
                      t_to_mus, mus_to_t, td_to_mus, mus_to_td,
-                     _PY3K, DummyTZInfo)
+                     _PY3K, _MUS_TYPECODE, DummyTZInfo)
+from _tzinfo import fixed_offset, utcoffset_mus
 
 
 
@@ -192,7 +194,13 @@ class TimeEx(time):
         from the TimeEx.
 
         Whenever the subtrahend is the datetime.time,
-        the result is a TimeDeltaEx.
+        the result is a TimeDeltaEx: the signed difference between
+        the two times of the same day (so for the naive times, or the times
+        with the same utcoffset(), it is always shorter than a day).
+        If both times are tz-aware, they are normalized by their utcoffset()
+        first, so the difference of the utcoffsets is added to the result,
+        which then is still less than three days long either way;
+        the naive and tz-aware times cannot be subtracted.
 
         Whenever the subtrahend is the datetime.timedelta,
         the result is a TimeEx.
@@ -204,13 +212,36 @@ class TimeEx(time):
         >>> TimeEx(3, 4, 15, 92, tzinfo=DummyTZInfo()) - timedelta(2, 71, 82, 81)
         TimeEx(3, 3, 3, 919010, tzinfo=<DummyTZInfo>)
 
+        >>> TimeEx(23, 44, 55) - time(3, 4, 55)
+        TimeDeltaEx(0, 74400)
+        >>> TimeEx(3, 4, 55) - TimeEx(23, 44, 55)
+        TimeDeltaEx(-1, 12000)
+        >>> TimeEx(12, 0, tzinfo=fixed_offset(timedelta(hours=3))) - \
+            time(12, 0, tzinfo=fixed_offset(timedelta(hours=1)))
+        TimeDeltaEx(-1, 79200)
+        >>> TimeEx(23, 0, tzinfo=fixed_offset(timedelta(hours=-10))) - \
+            time(1, 0, tzinfo=fixed_offset(timedelta(hours=10)))
+        TimeDeltaEx(1, 64800)
+        >>> TimeEx(23, 59, tzinfo=fixed_offset(-timedelta(hours=23, minutes=59))) - \
+            time(0, 0, tzinfo=fixed_offset(timedelta(hours=23, minutes=59)))
+        TimeDeltaEx(2, 86220)
+        >>> TimeEx(12, 0) - time(12, 0, tzinfo=fixed_offset(timedelta(hours=1)))
+        Traceback (most recent call last):
+          ...
+        TypeError: can't subtract offset-naive and offset-aware times
+
         @type subtrahend: time, timedelta
         @rtype: TimeEx, TimeDeltaEx
         """
-        # TODO: HOW TO SUBTRACT DATETIME.TIME, ESPECIALLY TZ-AWARE?
         if isinstance(subtrahend, timedelta):
             return TimeEx.from_microseconds(self.in_microseconds - td_to_mus(subtrahend),
                                             tzinfo=self.tzinfo)
+        elif isinstance(subtrahend, time):
+            # Imported here, as _timedeltaex imports this module.
+            from _timedeltaex import TimeDeltaEx
+            return TimeDeltaEx.from_microseconds(
+                       t_to_mus(self) - t_to_mus(subtrahend) -
+                       _offsets_diff_mus(self.tzinfo, subtrahend.tzinfo))
         else:
             raise NotImplementedError("{0!r} - {1!r}".format(self, subtrahend))
 
@@ -231,6 +262,65 @@ class TimeEx(time):
 #        return TimeEx.from_microseconds(self.in_microseconds - td_to_mus(other))
 
 
+def _offsets_diff_mus(minuend_tzinfo, subtrahend_tzinfo):
+    """
+    The difference (in microseconds) between the UTC offsets
+    of the minuend time and the subtrahend time, to be subtracted
+    from the difference of their wall clock readings.
+
+    @type minuend_tzinfo: NoneType, tzinfo
+    @type subtrahend_tzinfo: NoneType, tzinfo
+    @rtype: numbers.Integral
+    """
+    if minuend_tzinfo is subtrahend_tzinfo:
+        # Includes both naive; the same zone has the same offset anyway.
+        return 0
+    minuend_offset = utcoffset_mus(minuend_tzinfo)
+    subtrahend_offset = utcoffset_mus(subtrahend_tzinfo)
+    if minuend_offset is None and subtrahend_offset is None:
+        return 0
+    elif minuend_offset is None or subtrahend_offset is None:
+        raise TypeError("can't subtract offset-naive and offset-aware times")
+    else:
+        return minuend_offset - subtrahend_offset
+
+
+def sub_times_mus(minuends, subtrahends):
+    """
+    Subtract the datetime.time objects in bulk, getting the array
+    of the differences in microseconds, with the same semantics
+    as TimeEx - time, but without creating any intermediate objects.
+
+    The subtrahends may be either a single datetime.time (subtracted
+    from every minuend), or an iterable of datetime.time objects
+    (subtracted pairwise).
+
+    >>> list(sub_times_mus([time(3, 0), time(5, 30)], time(2, 0)))
+    [3600000000, 12600000000]
+    >>> list(sub_times_mus([time(3, 0), time(5, 30)], [time(2, 0), time(6, 0)]))
+    [3600000000, -1800000000]
+
+    @type minuends: collections.Iterable
+    @type subtrahends: time, collections.Iterable
+    @rtype: array
+    """
+    if isinstance(subtrahends, time):
+        subtrahend_mus = t_to_mus(subtrahends)
+        subtrahend_tzinfo = subtrahends.tzinfo
+        return array(_MUS_TYPECODE,
+                     [(t.hour * MICROSECONDS_IN_HOUR +
+                       t.minute * MICROSECONDS_IN_MINUTE +
+                       t.second * MICROSECONDS_IN_SECOND +
+                       t.microsecond) - subtrahend_mus -
+                      _offsets_diff_mus(t.tzinfo, subtrahend_tzinfo)
+                          for t in minuends])
+    else:
+        return array(_MUS_TYPECODE,
+                     [t_to_mus(t1) - t_to_mus(t2) -
+                      _offsets_diff_mus(t1.tzinfo, t2.tzinfo)
+                          for t1, t2 in zip(minuends, subtrahends)])
+
+
 # Run unittests, if executed directly.
 if __name__ == "__main__":
     import doctest
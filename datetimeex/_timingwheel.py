@@ -0,0 +1,259 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+import numbers
+from datetime import timedelta
+
+from _common import td_to_mus
+from _timedeltaex import TimeDeltaEx
+
+
+
+class TimerHandle(object):
+    """
+    The handle of a timer scheduled in the TimingWheel,
+    which may be used to cancel it.
+    """
+    __slots__ = ("expires", "callback", "args", "_seq", "_slot")
+
+
+    def __init__(self, expires, callback, args, seq):
+        self.expires = expires
+        self.callback = callback
+        self.args = args
+        self._seq = seq
+        # The set (wheel slot or overflow) the handle is stored in;
+        # None when it has fired or has been cancelled.
+        self._slot = None
+
+
+    def __repr__(self):
+        return "<TimerHandle at tick {0:d}: {1!r}{2:s}>"\
+                   .format(self.expires, self.callback,
+                           "" if self._slot is not None else " (inactive)")
+
+
+    @property
+    def active(self):
+        """
+        Whether the timer is still pending.
+
+        @rtype: bool
+        """
+        return self._slot is not None
+
+
+    def cancel(self):
+        """
+        Cancel the timer in O(1); does nothing if it has already fired
+        or has been cancelled.
+        """
+        if self._slot is not None:
+            self._slot.discard(self)
+            self._slot = None
+
+
+class TimingWheel(object):
+    """
+    The hierarchical timing wheel, for a large number of pending timeouts.
+
+    The time is measured in the ticks of the given duration; the delays
+    are rounded up to the whole ticks, using the integer arithmetic
+    on the microseconds (the same floor division and modulo semantics
+    as TimeDeltaEx // and % have).
+    Scheduling and cancelling the timer is O(1); advancing the wheel
+    by one tick is O(1) plus the cost of the callbacks fired
+    (and, once per a revolution of a lower level, re-distributing
+    a single slot of the higher level).
+
+    The timers are not fired by themselves; the wheel should be
+    advanced by the caller (or by the asyncio driver, see _aio module).
+    The timers expiring on the same tick are fired in the order
+    they have been scheduled.
+
+    >>> wheel = TimingWheel(tick=TimeDeltaEx(milliseconds=10), slots=4, levels=2)
+    >>> fired = []
+    >>> h1 = wheel.schedule(TimeDeltaEx(milliseconds=25), fired.append, "25ms")
+    >>> h2 = wheel.schedule(TimeDeltaEx(milliseconds=50), fired.append, "50ms")
+    >>> h3 = wheel.schedule(timedelta(seconds=1), fired.append, "1s")
+    >>> h4 = wheel.schedule(TimeDeltaEx(milliseconds=50), fired.append, "cancelled")
+    >>> h4.cancel()
+    >>> len(wheel)
+    3
+    >>> wheel.advance(2), fired
+    (0, [])
+    >>> wheel.advance(3), fired
+    (2, ['25ms', '50ms'])
+    >>> wheel.advance(95), fired
+    (1, ['25ms', '50ms', '1s'])
+    >>> wheel.elapsed, len(wheel)
+    (TimeDeltaEx(0, 1), 0)
+    """
+
+    def __init__(self, tick=TimeDeltaEx(milliseconds=1), slots=256, levels=4):
+        """
+        @param tick: the duration of a single tick.
+        @type tick: timedelta
+        @param slots: the number of slots on every level of the wheel.
+        @type slots: numbers.Integral
+        @param levels: the number of levels of the wheel; the timers beyond
+            slots ** levels ticks are kept aside until they come into range.
+        @type levels: numbers.Integral
+        """
+        assert isinstance(tick, timedelta) and tick > timedelta(0), repr(tick)
+        assert isinstance(slots, numbers.Integral) and slots > 1, repr(slots)
+        assert isinstance(levels, numbers.Integral) and levels > 0, \
+               repr(levels)
+
+        self.tick = TimeDeltaEx.from_timedelta(tick)
+        self._tick_mus = td_to_mus(tick)
+        self._slots = slots
+        # The number of ticks spanned by a single slot of every level.
+        self._spans = [slots ** level for level in range(levels + 1)]
+        self._wheels = [[set() for i in range(slots)] for level in range(levels)]
+        self._overflow = set()
+        self._ticks = 0
+        self._seq = 0
+
+
+    def __len__(self):
+        """
+        The number of the pending timers (the cancelled ones
+        are excluded).
+        """
+        return sum(len(slot) for wheel in self._wheels for slot in wheel) + \
+               len(self._overflow)
+
+
+    @property
+    def ticks(self):
+        """
+        The number of ticks the wheel has been advanced by.
+
+        @rtype: numbers.Integral
+        """
+        return self._ticks
+
+
+    @property
+    def elapsed(self):
+        """
+        The time the wheel has been advanced by.
+
+        @rtype: TimeDeltaEx
+        """
+        return TimeDeltaEx.from_microseconds(self._ticks * self._tick_mus)
+
+
+    def schedule(self, delay, callback, *args):
+        """
+        Schedule the callback to be called with the args
+        after the delay (rounded up to the whole ticks, but at least
+        one tick).
+
+        @type delay: timedelta
+        @type callback: collections.Callable
+        @rtype: TimerHandle
+        """
+        assert isinstance(delay, timedelta), repr(delay)
+
+        ticks, remainder = divmod(td_to_mus(delay), self._tick_mus)
+        if remainder:
+            ticks += 1
+        self._seq += 1
+        handle = TimerHandle(self._ticks + max(ticks, 1), callback, args,
+                             self._seq)
+        self._add(handle)
+        return handle
+
+
+    def cancel(self, handle):
+        """
+        Cancel the timer in O(1).
+
+        @type handle: TimerHandle
+        """
+        handle.cancel()
+
+
+    def advance(self, ticks=1):
+        """
+        Advance the wheel by the number of ticks, firing the expired timers.
+
+        @type ticks: numbers.Integral
+        @return: the number of the timers fired.
+        @rtype: numbers.Integral
+        """
+        fired = 0
+        slots = self._slots
+        spans = self._spans
+        for i in range(ticks):
+            self._ticks += 1
+            current = self._ticks
+            # On every revolution of a level, the current slot
+            # of the next level is re-distributed to the lower levels.
+            level = 1
+            while level < len(spans) and not current % spans[level]:
+                if level < len(self._wheels):
+                    self._cascade(self._wheels[level],
+                                  current // spans[level] % slots)
+                else:
+                    self._cascade_overflow()
+                level += 1
+
+            slot = self._wheels[0][current % slots]
+            if slot:
+                expired = sorted(slot, key=_seq_key)
+                slot.clear()
+                for handle in expired:
+                    handle._slot = None
+                    handle.callback(*handle.args)
+                fired += len(expired)
+        return fired
+
+
+    def _add(self, handle):
+        """
+        Put the timer handle to the appropriate slot.
+        """
+        diff = handle.expires - self._ticks
+        spans = self._spans
+        for level, wheel in enumerate(self._wheels):
+            if diff < spans[level + 1]:
+                slot = wheel[handle.expires // spans[level] % self._slots]
+                break
+        else:
+            slot = self._overflow
+        slot.add(handle)
+        handle._slot = slot
+
+
+    def _cascade(self, wheel, index):
+        """
+        Re-distribute the timers from the slot of a higher level.
+        """
+        handles = list(wheel[index])
+        wheel[index].clear()
+        for handle in handles:
+            self._add(handle)
+
+
+    def _cascade_overflow(self):
+        """
+        Re-distribute the timers which have come into the range of the wheel.
+        """
+        handles = list(self._overflow)
+        self._overflow.clear()
+        for handle in handles:
+            self._add(handle)
+
+
+def _seq_key(handle):
+    return handle._seq
+
+
+# Run unittests, if executed directly.
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
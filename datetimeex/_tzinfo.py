@@ -0,0 +1,268 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+from array import array
+from datetime import timedelta, tzinfo as tzinfo_class
+
+from _common import (MICROSECONDS_IN_MINUTE, MICROSECONDS_IN_DAY,
+                     td_to_mus, _PY3K)
+
+if _PY3K:
+    from datetime import timezone as _timezone_class
+else:
+    _timezone_class = None
+
+
+
+class FixedOffset(tzinfo_class):
+    """
+    The tzinfo with a fixed offset from UTC (and no DST).
+
+    Do not create the instances directly; use fixed_offset() instead,
+    so that there is exactly one FixedOffset object per offset.
+
+    >>> fixed_offset(timedelta(hours=5, minutes=30))
+    FixedOffset(330)
+    >>> fixed_offset(timedelta(hours=-3)).tzname(None)
+    'UTC-03:00'
+    """
+    __slots__ = ("_offset",)
+
+
+    def __init__(self, offset):
+        assert isinstance(offset, timedelta), repr(offset)
+        self._offset = offset
+
+    def __repr__(self):
+        return "FixedOffset({0:d})".format(td_to_mus(self._offset) //
+                                           MICROSECONDS_IN_MINUTE)
+
+    def __reduce__(self):
+        """
+        Unpickling a FixedOffset returns the interned instance.
+
+        >>> import pickle
+        >>> tz = fixed_offset(timedelta(hours=1))
+        >>> pickle.loads(pickle.dumps(tz)) is tz
+        True
+        """
+        return (fixed_offset, (self._offset,))
+
+    def utcoffset(self, dt):
+        return self._offset
+
+    def dst(self, dt):
+        return timedelta(0)
+
+    def tzname(self, dt):
+        sign = "-" if self._offset < timedelta(0) else "+"
+        minutes = abs(td_to_mus(self._offset)) // MICROSECONDS_IN_MINUTE
+        return "UTC{0:s}{1:02d}:{2:02d}".format(sign, *divmod(minutes, 60))
+
+
+# The interning registries; the values are never released.
+_FIXED_OFFSETS = {}
+_TIMEZONES = {}
+
+
+def fixed_offset(offset):
+    """
+    Get the FixedOffset tzinfo for the given offset from UTC.
+
+    The instances are interned: the same offset always results
+    in the same object, so the parsers may call this per parsed string
+    without creating a new tzinfo every time.
+
+    The offset must be a whole number of minutes, strictly within one day.
+
+    >>> fixed_offset(timedelta(minutes=90)) is fixed_offset(timedelta(hours=1.5))
+    True
+    >>> fixed_offset(timedelta(minutes=90)) is fixed_offset(timedelta(hours=2))
+    False
+
+    @type offset: timedelta
+    @rtype: FixedOffset
+    """
+    assert isinstance(offset, timedelta), repr(offset)
+
+    mus = td_to_mus(offset)
+    try:
+        return _FIXED_OFFSETS[mus]
+    except KeyError:
+        assert not mus % MICROSECONDS_IN_MINUTE, repr(offset)
+        assert -MICROSECONDS_IN_DAY < mus < MICROSECONDS_IN_DAY, repr(offset)
+        # setdefault() keeps the registry consistent if two threads race here.
+        return _FIXED_OFFSETS.setdefault(mus, FixedOffset(timedelta(microseconds=mus)))
+
+
+def intern_tzinfo(tzinfo):
+    """
+    Get the canonical instance for a fixed-offset tzinfo.
+
+    FixedOffset instances are mapped to the ones returned by fixed_offset();
+    under Python 3.x, datetime.timezone instances are mapped to a single
+    instance per (offset, name) pair.
+    Any other tzinfo (and None) is returned as is.
+
+    >>> intern_tzinfo(FixedOffset(timedelta(hours=2))) is \
+        fixed_offset(timedelta(hours=2))
+    True
+    >>> intern_tzinfo(None) is None
+    True
+
+    >>> # Test datetime.timezone in Python 3.x only
+    >>> not _PY3K or eval("intern_tzinfo(_timezone_class(timedelta(hours=2))) is "
+    ...                   "intern_tzinfo(_timezone_class(timedelta(hours=2)))")
+    True
+
+    @type tzinfo: NoneType, tzinfo
+    @rtype: NoneType, tzinfo
+    """
+    assert tzinfo is None or isinstance(tzinfo, tzinfo_class), repr(tzinfo)
+
+    if isinstance(tzinfo, FixedOffset):
+        return fixed_offset(tzinfo.utcoffset(None))
+    elif _timezone_class is not None and type(tzinfo) is _timezone_class:
+        # datetime.timezone instances are equal whenever their offsets are,
+        # so the name must be a part of the key.
+        return _TIMEZONES.setdefault((tzinfo.utcoffset(None),
+                                      tzinfo.tzname(None)),
+                                     tzinfo)
+    else:
+        return tzinfo
+
+
+# The memoized offsets of the tzinfo objects, for utcoffset_mus();
+# cleared as a whole whenever it grows too large.
+_UTCOFFSETS = {}
+_UTCOFFSETS_MAX_SIZE = 1024
+
+
+def utcoffset_mus(tzinfo):
+    """
+    Get the UTC offset (in microseconds) which the tzinfo provides
+    for the datetime.time objects, i.e. tzinfo.utcoffset(None);
+    or None if the time objects with this tzinfo are naive.
+
+    The result is memoized per tzinfo object, so the subsequent calls
+    for the same zone do not call utcoffset() again; thus the tzinfo
+    must always return the same offset for the time objects,
+    which is true for any sane implementation.
+
+    >>> utcoffset_mus(fixed_offset(timedelta(minutes=-90)))
+    -5400000000
+    >>> utcoffset_mus(None) is None
+    True
+
+    @type tzinfo: NoneType, tzinfo
+    @rtype: NoneType, numbers.Integral
+    """
+    try:
+        return _UTCOFFSETS[tzinfo]
+    except KeyError:
+        offset = None if tzinfo is None else tzinfo.utcoffset(None)
+        mus = None if offset is None else td_to_mus(offset)
+        if len(_UTCOFFSETS) >= _UTCOFFSETS_MAX_SIZE:
+            _UTCOFFSETS.clear()
+        _UTCOFFSETS[tzinfo] = mus
+        return mus
+
+
+class TZInfoTable(object):
+    """
+    The dictionary encoding for a column of tzinfo objects.
+
+    Each distinct tzinfo gets a small integer code; the column
+    is then stored as an array of the codes, while the tzinfo objects
+    themselves are stored in the table only once.
+    The code 0 always stands for None (the naive values).
+
+    >>> table = TZInfoTable()
+    >>> tz1, tz2 = fixed_offset(timedelta(hours=1)), fixed_offset(timedelta(hours=2))
+    >>> codes = table.encode([None, tz1, tz2, tz1, None])
+    >>> list(codes)
+    [0, 1, 2, 1, 0]
+    >>> table.decode(codes)
+    [None, FixedOffset(60), FixedOffset(120), FixedOffset(60), None]
+    >>> len(table)
+    3
+    """
+    __slots__ = ("_tzinfos", "_codes")
+
+    # The codes are stored as the unsigned shorts.
+    TYPECODE = "H"
+
+
+    def __init__(self, tzinfos=()):
+        self._tzinfos = [None]
+        # The codes are keyed by the identity of the interned tzinfo,
+        # as some tzinfo classes compare equal with different names.
+        self._codes = {id(None): 0}
+        for tzinfo in tzinfos:
+            self.code(tzinfo)
+
+    def __len__(self):
+        return len(self._tzinfos)
+
+    def __getitem__(self, code):
+        """
+        Get the tzinfo for the code.
+
+        >>> TZInfoTable([fixed_offset(timedelta(hours=3))])[1]
+        FixedOffset(180)
+
+        @type code: numbers.Integral
+        @rtype: NoneType, tzinfo
+        """
+        return self._tzinfos[code]
+
+    def code(self, tzinfo):
+        """
+        Get the code for the tzinfo, adding it to the table if needed.
+
+        >>> table = TZInfoTable()
+        >>> table.code(FixedOffset(timedelta(hours=3)))
+        1
+        >>> table.code(fixed_offset(timedelta(hours=3)))
+        1
+        >>> table.code(None)
+        0
+
+        @type tzinfo: NoneType, tzinfo
+        @rtype: numbers.Integral
+        """
+        tzinfo = intern_tzinfo(tzinfo)
+        key = id(tzinfo)
+        try:
+            return self._codes[key]
+        except KeyError:
+            code = len(self._tzinfos)
+            assert code < 1 << 16, "Too many distinct tzinfo objects"
+            self._tzinfos.append(tzinfo)
+            self._codes[key] = code
+            return code
+
+    def encode(self, tzinfos):
+        """
+        Encode an iterable of tzinfo objects (or None) to the array of codes.
+
+        @rtype: array
+        """
+        code = self.code
+        return array(self.TYPECODE, [code(tzinfo) for tzinfo in tzinfos])
+
+    def decode(self, codes):
+        """
+        Decode an iterable of codes back to the list of tzinfo objects.
+
+        @rtype: list
+        """
+        tzinfos = self._tzinfos
+        return [tzinfos[code] for code in codes]
+
+
+# Run unittests, if executed directly.
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()